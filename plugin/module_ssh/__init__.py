@@ -13,6 +13,8 @@ __version__ = '1.0.0'
 
 from plugin.module_ssh.core.ssh_client import SSHClient
 from plugin.module_ssh.core.ssh_operations import SSHOperations
+from plugin.module_ssh.core.ssh_executor import SSHExecutor, ssh_executor
+from plugin.module_ssh.core.async_ssh_client import AsyncSSHClient, AsyncSSHOperations
 
 # 方便直接导入常用类
-__all__ = ['SSHClient', 'SSHOperations'] 
\ No newline at end of file
+__all__ = ['SSHClient', 'SSHOperations', 'SSHExecutor', 'ssh_executor', 'AsyncSSHClient', 'AsyncSSHOperations'] 
\ No newline at end of file
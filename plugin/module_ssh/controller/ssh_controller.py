@@ -6,18 +6,80 @@
 # @File    : ssh_controller.py
 # @Software: PyCharm
 # @desc    : SSH操作控制器
-from fastapi import APIRouter, UploadFile, File, Form, Body, Depends
+import asyncio
+import codecs
+import json
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import APIRouter, UploadFile, File, Form, Body, Depends, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, Response
+from urllib.parse import quote
 from sqlalchemy.ext.asyncio import AsyncSession
+from utils.log_util import logger
 from utils.response_util import ResponseUtil
+from module_admin.entity.vo.user_vo import CurrentUserModel
 from module_admin.service.login_service import LoginService
-from utils.ssh_operation import ssh_operation
 from plugin.module_ssh.core.ssh_client import SSHClient
-from plugin.module_ssh.core.ssh_operations import SSHOperations
+from plugin.module_ssh.core.ssh_operations import (
+    SSHOperations, SYNC_MIN_BLOCK_SIZE, TEXT_READ_MAX_BYTES, TRANSFER_CHUNK_SIZE
+)
+from plugin.module_ssh.core.ssh_transfer import transfer_progress
+from plugin.module_ssh.core.ssh_executor import ssh_executor
+from plugin.module_ssh.core.ssh_index import list_path_indexes
+from plugin.module_ssh.core.ssh_follow import FollowSubscriber, log_followers
+from plugin.module_ssh.core.ssh_jobs import JOB_IO_KEY, JOB_RETENTION, SSHJob, ssh_jobs
+from plugin.module_ssh.core.ssh_result_cache import result_cache
+from plugin.module_ssh.core.ssh_shell import SHELL_COMMAND_MAX_BYTES, SHELL_IDLE_TIMEOUT, ShellSession, shell_sessions
+from plugin.module_ssh.core.ssh_backend import SSH_BACKEND
+from plugin.module_ssh.core.ssh_dispatcher import ssh_dispatcher
 from config.get_db import get_db
-from plugin.module_ssh.service.ssh_service import get_ssh_connection_details
+from plugin.module_ssh.service.ssh_service import (
+    get_ssh_connection_details, invalidate_ssh_connection_details, get_ssh_connection_cache_stats
+)
 
 # 创建路由器
 sshController = APIRouter(prefix="/ssh", dependencies=[Depends(LoginService.get_current_user)])
+# WebSocket接口无法使用基于请求头的认证依赖，连接时自行校验token，需与sshController一同注册
+sshWsController = APIRouter(prefix="/ssh")
+
+
+async def _authenticate_websocket(
+        websocket: WebSocket, token: Optional[str], query_db: AsyncSession
+) -> Optional[CurrentUserModel]:
+    """
+    校验WebSocket连接的令牌（浏览器无法为WebSocket设置请求头，令牌通过token参数传递），失败时关闭连接并返回None
+    """
+    token = token or websocket.headers.get('Authorization', '')
+    if token.startswith('Bearer '):
+        token = token[len('Bearer '):]
+    try:
+        return await LoginService.get_current_user(websocket, token, query_db)
+    except Exception as e:
+        logger.warning(f"WebSocket认证失败: {str(e)}")
+        await websocket.close(code=1008, reason="认证失败")
+        return None
+
+
+async def _command_output_lines(chunks: AsyncIterator[Tuple[str, Any]]) -> AsyncIterator[str]:
+    """
+    将命令输出块转换为NDJSON行：{"stream": "stdout"|"stderr", "data": ...}，最后一行为{"exit_code": ...}
+    """
+    decoders = {
+        'stdout': codecs.getincrementaldecoder('utf-8')(errors='replace'),
+        'stderr': codecs.getincrementaldecoder('utf-8')(errors='replace'),
+    }
+    try:
+        async for stream, data in chunks:
+            if stream in decoders:
+                text = decoders[stream].decode(data)
+                if text:
+                    yield json.dumps({"stream": stream, "data": text}, ensure_ascii=False) + "\n"
+            elif stream == 'truncated':
+                yield json.dumps({"truncated": data}) + "\n"
+            elif stream == 'exit':
+                yield json.dumps({"exit_code": data}) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
 
 
 @sshController.post("/connect/test")
@@ -33,13 +95,7 @@ async def test_ssh_connection(
         connection_details = await get_ssh_connection_details(query_db, ssh_id)
         if not connection_details:
             return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
-        host, username, password, port = connection_details
-        success, error = SSHClient.test_connection(
-            host=host,
-            username=username,
-            password=password,
-            port=port
-        )
+        success, error = await ssh_dispatcher.test_connection(connection_details)
         if success:
             return ResponseUtil.success(msg="连接成功")
         else:
@@ -53,6 +109,7 @@ async def execute_command(
         ssh_id: int = Body(..., description="SSH服务器ID"),
         command: str = Body(..., description="要执行的命令"),
         timeout: int = Body(60, description="命令超时时间(秒)"),
+        use_cache: bool = Body(False, description="是否使用结果缓存，仅对允许列表中的只读命令（如df、free、uptime）生效"),
         query_db: AsyncSession = Depends(get_db)
 ):
     """
@@ -64,17 +121,10 @@ async def execute_command(
         if not connection_details:
             return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
 
-        host, username, password, port = connection_details
-
-        ssh_ops = SSHOperations.from_credentials(
-            host=host,
-            username=username,
-            password=password,
-            port=port
+        output, error, exit_code = await ssh_dispatcher.call(
+            connection_details, 'execute_command', command, timeout, use_cache=use_cache
         )
 
-        output, error, exit_code = ssh_ops.execute_command(command, timeout)
-
         return ResponseUtil.success(
             data={
                 "output": output,
@@ -86,15 +136,94 @@ async def execute_command(
         return ResponseUtil.error(msg=f"执行命令失败: {str(e)}")
 
 
+@sshController.post("/command/stream")
+async def stream_command(
+        ssh_id: int = Body(..., description="SSH服务器ID"),
+        command: str = Body(..., description="要执行的命令"),
+        timeout: int = Body(60, description="命令超时时间(秒)"),
+        max_bytes: int = Body(None, description="输出字节数上限，超过后截断"),
+        query_db: AsyncSession = Depends(get_db)
+):
+    """
+    流式执行SSH命令，以NDJSON逐块返回输出
+    """
+    try:
+        # 获取SSH连接详情
+        connection_details = await get_ssh_connection_details(query_db, ssh_id)
+        if not connection_details:
+            return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
+
+        chunks = await ssh_dispatcher.stream(connection_details, 'stream_command', command, timeout, max_bytes)
+
+        return StreamingResponse(
+            _command_output_lines(chunks),
+            media_type="application/x-ndjson"
+        )
+    except Exception as e:
+        return ResponseUtil.error(msg=f"执行命令失败: {str(e)}")
+
+
+async def _batch_result_lines(missing: List[Dict[str, Any]], results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """
+    将批量执行结果转换为NDJSON行，每台主机一行
+    """
+    for result in missing:
+        yield json.dumps(result, ensure_ascii=False) + "\n"
+    try:
+        async for result in results:
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+
+
+@sshController.post("/command/batch")
+async def execute_batch_command(
+        ssh_ids: List[int] = Body(..., description="SSH服务器ID列表"),
+        command: str = Body(..., description="要执行的命令"),
+        timeout: int = Body(60, description="单台主机命令超时时间(秒)"),
+        parallelism: int = Body(20, description="最大并行主机数"),
+        fail_fast: bool = Body(False, description="任一主机失败时是否停止其余主机"),
+        query_db: AsyncSession = Depends(get_db)
+):
+    """
+    在多台服务器上批量执行SSH命令，按完成顺序以NDJSON逐台返回结果
+    """
+    try:
+        targets, missing = [], []
+        for ssh_id in dict.fromkeys(ssh_ids):
+            connection_details = await get_ssh_connection_details(query_db, ssh_id)
+            if not connection_details:
+                missing.append({
+                    "id": ssh_id, "host": None, "status": "error", "output": "",
+                    "error": f"未找到ID为{ssh_id}的SSH服务器信息", "exit_code": -1, "elapsed": 0
+                })
+                continue
+            host, username, password, port = connection_details
+            targets.append({"id": ssh_id, "host": host, "username": username, "password": password, "port": port})
+
+        results = ssh_dispatcher.batch(targets, command, timeout, parallelism, fail_fast)
+
+        return StreamingResponse(
+            _batch_result_lines(missing, results),
+            media_type="application/x-ndjson"
+        )
+    except Exception as e:
+        return ResponseUtil.error(msg=f"批量执行命令失败: {str(e)}")
+
+
 @sshController.post("/script/execute")
 async def execute_script(
         ssh_id: int = Body(..., description="SSH服务器ID"),
         script_content: str = Body(..., description="脚本内容"),
         timeout: int = Body(60, description="脚本超时时间(秒)"),
+        args: List[str] = Body(None, description="脚本参数"),
+        env: Dict[str, str] = Body(None, description="环境变量"),
+        interpreter: str = Body("bash", description="解释器: bash/sh/zsh/python3/python/perl"),
+        use_temp_file: bool = Body(False, description="是否写入远程临时文件后执行（脚本需要读取标准输入时使用）"),
         query_db: AsyncSession = Depends(get_db)
 ):
     """
-    执行SSH脚本
+    执行SSH脚本，默认通过标准输入传给解释器，一次往返完成
     """
     try:
         # 获取SSH连接详情
@@ -102,17 +231,11 @@ async def execute_script(
         if not connection_details:
             return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
 
-        host, username, password, port = connection_details
-
-        ssh_ops = SSHOperations.from_credentials(
-            host=host,
-            username=username,
-            password=password,
-            port=port
+        output, error, exit_code = await ssh_dispatcher.call(
+            connection_details, 'execute_script',
+            script_content, timeout, args=args, env=env, interpreter=interpreter, use_temp_file=use_temp_file
         )
 
-        output, error, exit_code = ssh_ops.execute_script(script_content, timeout)
-
         return ResponseUtil.success(
             data={
                 "output": output,
@@ -124,11 +247,78 @@ async def execute_script(
         return ResponseUtil.error(msg=f"执行脚本失败: {str(e)}")
 
 
+@sshController.post("/script/stream")
+async def stream_script(
+        ssh_id: int = Body(..., description="SSH服务器ID"),
+        script_content: str = Body(..., description="脚本内容"),
+        timeout: int = Body(60, description="脚本超时时间(秒)"),
+        args: List[str] = Body(None, description="脚本参数"),
+        env: Dict[str, str] = Body(None, description="环境变量"),
+        interpreter: str = Body("bash", description="解释器: bash/sh/zsh/python3/python/perl"),
+        max_bytes: int = Body(None, description="输出字节数上限，超过后截断"),
+        query_db: AsyncSession = Depends(get_db)
+):
+    """
+    流式执行SSH脚本，以NDJSON逐块返回输出
+    """
+    try:
+        # 获取SSH连接详情
+        connection_details = await get_ssh_connection_details(query_db, ssh_id)
+        if not connection_details:
+            return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
+
+        chunks = await ssh_dispatcher.stream(
+            connection_details, 'stream_script', script_content, args, env, interpreter, timeout, max_bytes
+        )
+
+        return StreamingResponse(
+            _command_output_lines(chunks),
+            media_type="application/x-ndjson"
+        )
+    except Exception as e:
+        return ResponseUtil.error(msg=f"执行脚本失败: {str(e)}")
+
+
+async def _pipe_upload(
+        host: str, ssh_ops: SSHOperations, remote_path: str, filename: str,
+        chunks: AsyncIterator[bytes], transfer_id: str = None, total: int = None
+) -> int:
+    """
+    将异步数据流逐块写入远程文件：上一块写完才读取下一块，内存占用与文件大小无关
+    :return: 已写入字节数
+    """
+    upload = await ssh_executor.run(host, ssh_ops.open_upload, remote_path, filename)
+    transfer_progress.start(transfer_id, upload.remote_path, total)
+    try:
+        async for chunk in chunks:
+            if chunk:
+                transferred = await ssh_executor.run(host, upload.write, chunk)
+                transfer_progress.update(transfer_id, transferred)
+        await ssh_executor.run(host, upload.close)
+    except BaseException as e:
+        transfer_progress.finish(transfer_id, error=str(e) or type(e).__name__)
+        await asyncio.shield(ssh_executor.run(host, upload.abort))
+        raise
+    transfer_progress.finish(transfer_id)
+    logger.info(f"文件已成功上传: {upload.remote_path}, 大小: {upload.transferred}")
+    return upload.transferred
+
+
+async def _read_upload_file(file: UploadFile, chunk_size: int = TRANSFER_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """按块读取上传的文件"""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
 @sshController.post("/file/upload")
 async def upload_file(
         ssh_id: int = Form(..., description="SSH服务器ID"),
         remote_path: str = Form(..., description="远程路径"),
         file: UploadFile = File(..., description="要上传的文件"),
+        transfer_id: str = Form(None, description="传输ID，用于查询上传进度"),
         query_db: AsyncSession = Depends(get_db)
 ):
     """
@@ -140,41 +330,62 @@ async def upload_file(
         if not connection_details:
             return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
 
-        host, username, password, port = connection_details
-
-        # 保存上传的文件到临时目录
-        import tempfile
-        import os
+        host = connection_details[0]
+        ssh_ops = await ssh_dispatcher.operations(connection_details)
 
-        temp_dir = tempfile.gettempdir()
-        temp_file_path = os.path.join(temp_dir, file.filename)
+        # 分块从上传流直接写入远程文件，不再整体读入内存或落地临时文件
+        size = await _pipe_upload(
+            host, ssh_ops, remote_path, file.filename,
+            _read_upload_file(file), transfer_id, getattr(file, 'size', None)
+        )
+        return ResponseUtil.success(msg="文件上传成功", data={"size": size})
+    except Exception as e:
+        return ResponseUtil.error(msg=f"文件上传失败: {str(e)}")
 
-        with open(temp_file_path, "wb") as temp_file:
-            content = await file.read()
-            temp_file.write(content)
 
-        # 使用旧接口上传文件
-        result = ssh_operation(
-            host=host,
-            username=username,
-            password=password,
-            operation="upload_file",
-            local_path=temp_file_path,
-            remote_path=remote_path,
-            port=port
-        )
+@sshController.post("/file/upload/stream")
+async def upload_file_stream(
+        request: Request,
+        ssh_id: int = Query(..., description="SSH服务器ID"),
+        remote_path: str = Query(..., description="远程文件路径"),
+        transfer_id: str = Query(None, description="传输ID，用于查询上传进度"),
+        query_db: AsyncSession = Depends(get_db)
+):
+    """
+    以原始请求体流式上传文件到远程服务器，请求体不经过表单解析和本地落盘
+    """
+    try:
+        # 获取SSH连接详情
+        connection_details = await get_ssh_connection_details(query_db, ssh_id)
+        if not connection_details:
+            return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
 
-        # 删除临时文件
-        os.unlink(temp_file_path)
+        host = connection_details[0]
+        ssh_ops = await ssh_dispatcher.operations(connection_details)
 
-        if result:
-            return ResponseUtil.success(msg="文件上传成功")
-        else:
-            return ResponseUtil.error(msg="文件上传失败")
+        content_length = request.headers.get('content-length')
+        size = await _pipe_upload(
+            host, ssh_ops, remote_path, None, request.stream(), transfer_id,
+            int(content_length) if content_length else None
+        )
+        return ResponseUtil.success(msg="文件上传成功", data={"size": size})
     except Exception as e:
         return ResponseUtil.error(msg=f"文件上传失败: {str(e)}")
 
 
+@sshController.post("/file/progress")
+async def get_transfer_progress(
+        transfer_id: str = Body(..., embed=True, description="传输ID")
+):
+    """
+    查询文件传输进度
+    """
+    progress = transfer_progress.get(transfer_id)
+    if progress is None:
+        return ResponseUtil.error(msg=f"未找到传输记录: {transfer_id}")
+    return ResponseUtil.success(data=progress)
+
+
 @sshController.post("/file/download")
 async def download_file(
         ssh_id: int = Body(..., description="SSH服务器ID"),
@@ -191,12 +402,6 @@ async def download_file(
         if not connection_details:
             return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
 
-        host, username, password, port = connection_details
-
-        # 检查远程文件是否存在
-        import os
-        from utils.log_util import logger
-
         logger.info(f"开始下载文件: 远程路径={remote_path}, 本地路径={local_path}")
 
         # 确保本地目录存在
@@ -210,15 +415,7 @@ async def download_file(
                 return ResponseUtil.error(msg=f"创建本地目录失败: {str(dir_err)}")
 
         # 执行下载
-        result = ssh_operation(
-            host=host,
-            username=username,
-            password=password,
-            operation="download_file",
-            local_path=local_path,
-            remote_path=remote_path,
-            port=port
-        )
+        result = await ssh_dispatcher.call(connection_details, 'download_file', remote_path, local_path)
 
         if result:
             logger.info(f"文件下载成功: {local_path}")
@@ -231,6 +428,123 @@ async def download_file(
         return ResponseUtil.error(msg=f"文件下载失败: {str(e)}")
 
 
+def _parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析HTTP Range请求头（只支持单个区间）
+    :param range_header: Range请求头
+    :param size: 文件大小
+    :return: (起始偏移, 结束偏移(含))，无Range时返回None；区间无效时抛出ValueError
+    """
+    if not range_header or not range_header.startswith('bytes=') or ',' in range_header:
+        return None
+    start_str, _, end_str = range_header[len('bytes='):].strip().partition('-')
+    if start_str:
+        start = int(start_str)
+        end = int(end_str) if end_str else size - 1
+    else:
+        # bytes=-N 表示最后N个字节
+        suffix = int(end_str)
+        if suffix <= 0:
+            raise ValueError(range_header)
+        start = max(size - suffix, 0)
+        end = size - 1
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError(range_header)
+    return start, end
+
+
+@sshController.get("/file/download/stream")
+async def download_file_stream(
+        request: Request,
+        ssh_id: int = Query(..., description="SSH服务器ID"),
+        remote_path: str = Query(..., description="远程文件路径"),
+        query_db: AsyncSession = Depends(get_db)
+):
+    """
+    流式下载远程文件，直接把SFTP读取结果写入HTTP响应，支持Range断点续传和分段并行下载
+    """
+    try:
+        # 获取SSH连接详情
+        connection_details = await get_ssh_connection_details(query_db, ssh_id)
+        if not connection_details:
+            return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
+
+        file_info = await ssh_dispatcher.call(connection_details, 'get_file_info', remote_path)
+        if not file_info or not file_info['is_file']:
+            return ResponseUtil.error(msg=f"远程文件不存在: {remote_path}")
+        size = file_info['size']
+
+        try:
+            byte_range = _parse_range(request.headers.get('range'), size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+        filename = quote(os.path.basename(remote_path))
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Disposition": f"attachment; filename*=UTF-8''{filename}",
+        }
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        else:
+            start, end = 0, size - 1
+            status_code = 200
+        headers["Content-Length"] = str(end - start + 1)
+
+        chunks = await ssh_dispatcher.stream(connection_details, 'iter_remote_file', remote_path, start, end - start + 1)
+        return StreamingResponse(
+            chunks,
+            status_code=status_code,
+            headers=headers,
+            media_type="application/octet-stream"
+        )
+    except Exception as e:
+        return ResponseUtil.error(msg=f"文件下载失败: {str(e)}")
+
+
+@sshController.get("/dir/download/stream")
+async def download_directory_stream(
+        ssh_id: int = Query(..., description="SSH服务器ID"),
+        remote_path: str = Query(..., description="远程目录路径"),
+        compression: str = Query("gzip", description="压缩方式: gzip/zstd/none"),
+        query_db: AsyncSession = Depends(get_db)
+):
+    """
+    将远程目录打包为tar流直接写入HTTP响应，API服务器不落地任何文件
+    """
+    try:
+        # 获取SSH连接详情
+        connection_details = await get_ssh_connection_details(query_db, ssh_id)
+        if not connection_details:
+            return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
+
+        if compression not in ('gzip', 'zstd', 'none'):
+            return ResponseUtil.error(msg=f"不支持的压缩方式: {compression}")
+        compression = None if compression == 'none' else compression
+
+        file_info = await ssh_dispatcher.call(connection_details, 'get_file_info', remote_path)
+        if not file_info or not file_info['is_dir']:
+            return ResponseUtil.error(msg=f"远程目录不存在: {remote_path}")
+
+        # 确认远程有tar和压缩命令（zstd不可用时退回gzip），没有tar时改为通过SFTP在本地打包
+        has_tar, compression = await ssh_dispatcher.call(connection_details, 'tar_compression', compression)
+        suffix = {'gzip': '.tar.gz', 'zstd': '.tar.zst', None: '.tar'}[compression]
+        filename = quote((os.path.basename(remote_path.rstrip('/')) or 'root') + suffix)
+        chunks = await ssh_dispatcher.stream(
+            connection_details, 'iter_dir_tar' if has_tar else 'iter_dir_tar_sftp', remote_path, compression
+        )
+        return StreamingResponse(
+            chunks,
+            headers={"Content-Disposition": f"attachment; filename*=UTF-8''{filename}"},
+            media_type="application/octet-stream"
+        )
+    except Exception as e:
+        return ResponseUtil.error(msg=f"目录下载失败: {str(e)}")
+
+
 @sshController.post("/text/write")
 async def write_text(
         ssh_id: int = Body(..., description="SSH服务器ID"),
@@ -247,17 +561,7 @@ async def write_text(
         if not connection_details:
             return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
 
-        host, username, password, port = connection_details
-
-        result = ssh_operation(
-            host=host,
-            username=username,
-            password=password,
-            operation="write_text",
-            remote_path=remote_path,
-            content=content,
-            port=port
-        )
+        result = await ssh_dispatcher.call(connection_details, 'write_text', remote_path, content)
 
         if result:
             return ResponseUtil.success(msg="文本写入成功")
@@ -271,10 +575,17 @@ async def write_text(
 async def read_text(
         ssh_id: int = Body(..., description="SSH服务器ID"),
         remote_path: str = Body(..., description="远程文件路径"),
+        offset: int = Body(0, description="按字节读取时的起始偏移"),
+        length: int = Body(TEXT_READ_MAX_BYTES, description="按字节读取时的字节数"),
+        tail_lines: int = Body(None, description="读取末尾的行数，类似tail -n"),
+        start_line: int = Body(None, description="按行分页读取时的起始行号（从1开始）"),
+        line_count: int = Body(200, description="按行分页读取时的行数"),
+        encoding: str = Body(None, description="文本编码，为空时自动识别"),
+        use_cache: bool = Body(False, description="按字节读取时是否使用结果缓存，文件修改后自动失效"),
         query_db: AsyncSession = Depends(get_db)
 ):
     """
-    读取远程文件文本内容
+    读取远程文件文本内容，支持按字节区间、末尾若干行和按行分页读取，单次返回的内容大小有上限
     """
     try:
         # 获取SSH连接详情
@@ -282,21 +593,19 @@ async def read_text(
         if not connection_details:
             return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
 
-        host, username, password, port = connection_details
-
-        content = ssh_operation(
-            host=host,
-            username=username,
-            password=password,
-            operation="read_text",
-            remote_path=remote_path,
-            port=port
-        )
-
-        if content is not None:
-            return ResponseUtil.success(data={"output": content})
+        if tail_lines is not None:
+            result = await ssh_dispatcher.call(connection_details, 'tail_text', remote_path, tail_lines, encoding)
+        elif start_line is not None:
+            result = await ssh_dispatcher.call(
+                connection_details, 'read_lines', remote_path, start_line, line_count, encoding
+            )
+            result['content'] = "\n".join(result['lines'])
         else:
-            return ResponseUtil.error(msg="读取文件内容失败")
+            result = await ssh_dispatcher.call(
+                connection_details, 'read_text_range', remote_path, offset, length, encoding, use_cache=use_cache
+            )
+
+        return ResponseUtil.success(data={"output": result.pop('content'), **result})
     except Exception as e:
         return ResponseUtil.error(msg=f"读取文件内容失败: {str(e)}")
 
@@ -316,17 +625,44 @@ async def list_directory(
         if not connection_details:
             return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
 
-        host, username, password, port = connection_details
+        files = await ssh_dispatcher.call(connection_details, 'list_dir', remote_path)
+        return ResponseUtil.success(data={"output": files})
+    except Exception as e:
+        return ResponseUtil.error(msg=f"列出目录内容失败: {str(e)}")
+
 
-        files = ssh_operation(
-            host=host,
-            username=username,
-            password=password,
-            operation="list_dir",
-            remote_path=remote_path,
-            port=port
+@sshController.post("/dir/list/attr")
+async def list_directory_attr(
+        ssh_id: int = Body(..., description="SSH服务器ID"),
+        remote_path: str = Body(..., description="远程目录路径"),
+        pattern: str = Body(None, description="文件名通配符，如*.log"),
+        sort: str = Body("name", description="排序字段: name/size/mtime/type"),
+        reverse: bool = Body(False, description="是否倒序"),
+        dirs_first: bool = Body(True, description="目录是否排在前面"),
+        cursor: str = Body(None, description="分页游标，取上一页返回的next_cursor"),
+        limit: int = Body(200, description="每页条目数"),
+        query_db: AsyncSession = Depends(get_db)
+):
+    """
+    分页列出远程目录内容及属性（名称、类型、大小、权限、修改时间）
+    """
+    try:
+        # 获取SSH连接详情
+        connection_details = await get_ssh_connection_details(query_db, ssh_id)
+        if not connection_details:
+            return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
+
+        page = await ssh_dispatcher.call(
+            connection_details, 'list_dir_attr',
+            remote_path,
+            pattern=pattern,
+            sort=sort,
+            reverse=reverse,
+            dirs_first=dirs_first,
+            cursor=cursor,
+            limit=limit
         )
-        return ResponseUtil.success(data={"output": files})
+        return ResponseUtil.success(data=page)
     except Exception as e:
         return ResponseUtil.error(msg=f"列出目录内容失败: {str(e)}")
 
@@ -346,16 +682,7 @@ async def make_directory(
         if not connection_details:
             return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
 
-        host, username, password, port = connection_details
-
-        result = ssh_operation(
-            host=host,
-            username=username,
-            password=password,
-            operation="make_dir",
-            remote_path=remote_path,
-            port=port
-        )
+        result = await ssh_dispatcher.call(connection_details, 'make_dir', remote_path)
 
         if result:
             return ResponseUtil.success(msg="目录创建成功")
@@ -380,16 +707,7 @@ async def remove_file(
         if not connection_details:
             return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
 
-        host, username, password, port = connection_details
-
-        result = ssh_operation(
-            host=host,
-            username=username,
-            password=password,
-            operation="remove_file",
-            remote_path=remote_path,
-            port=port
-        )
+        result = await ssh_dispatcher.call(connection_details, 'remove_file', remote_path)
 
         if result:
             return ResponseUtil.success(msg="文件删除成功")
@@ -404,6 +722,7 @@ async def remove_directory(
         ssh_id: int = Body(..., description="SSH服务器ID"),
         remote_path: str = Body(..., description="要删除的远程目录路径"),
         recursive: bool = Body(False, description="是否递归删除目录内容"),
+        fast: bool = Body(False, description="递归删除时是否使用服务端rm -rf"),
         query_db: AsyncSession = Depends(get_db)
 ):
     """
@@ -415,25 +734,13 @@ async def remove_directory(
         if not connection_details:
             return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
 
-        host, username, password, port = connection_details
-
         if recursive:
-            ssh_ops = SSHOperations.from_credentials(
-                host=host,
-                username=username,
-                password=password,
-                port=port
-            )
-            result = ssh_ops.remove_dir(remote_path, recursive=True)
-        else:
-            result = ssh_operation(
-                host=host,
-                username=username,
-                password=password,
-                operation="remove_dir",
-                remote_path=remote_path,
-                port=port
-            )
+            result = await ssh_dispatcher.call(connection_details, 'remove_tree', remote_path, fast=fast)
+            if result['failed']:
+                return ResponseUtil.error(msg=f"目录删除部分失败: {len(result['failed'])}个", data=result)
+            return ResponseUtil.success(msg="目录删除成功", data=result)
+
+        result = await ssh_dispatcher.call(connection_details, 'remove_dir', remote_path)
 
         if result:
             return ResponseUtil.success(msg="目录删除成功")
@@ -443,6 +750,45 @@ async def remove_directory(
         return ResponseUtil.error(msg=f"目录删除失败: {str(e)}")
 
 
+@sshController.post("/dir/sync")
+async def sync_directory(
+        ssh_id: int = Body(..., description="SSH服务器ID"),
+        local_path: str = Body(..., description="本地目录路径"),
+        remote_path: str = Body(..., description="远程目录路径"),
+        delete: bool = Body(False, description="是否删除远程多余的文件和目录"),
+        checksum: bool = Body(False, description="大小相同但修改时间不同时是否比对SHA256"),
+        block_size: int = Body(None, description=f"按块增量传输的块大小(字节)，为空时整文件上传，最小{SYNC_MIN_BLOCK_SIZE}"),
+        exclude: List[str] = Body(None, description="排除的文件名或相对路径通配符"),
+        dry_run: bool = Body(False, description="只返回同步计划，不做修改"),
+        query_db: AsyncSession = Depends(get_db)
+):
+    """
+    增量同步本地目录到远程目录
+    """
+    if block_size is not None and block_size < SYNC_MIN_BLOCK_SIZE:
+        return ResponseUtil.error(msg=f"块大小不能小于{SYNC_MIN_BLOCK_SIZE}字节")
+    try:
+        # 获取SSH连接详情
+        connection_details = await get_ssh_connection_details(query_db, ssh_id)
+        if not connection_details:
+            return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
+
+        result = await ssh_dispatcher.call(
+            connection_details, 'sync_dir', local_path, remote_path,
+            delete=delete,
+            checksum=checksum,
+            block_size=block_size,
+            exclude=exclude,
+            dry_run=dry_run
+        )
+
+        if result['failed']:
+            return ResponseUtil.error(msg=f"目录同步部分失败: {len(result['failed'])}个", data=result)
+        return ResponseUtil.success(msg="目录同步成功", data=result)
+    except Exception as e:
+        return ResponseUtil.error(msg=f"目录同步失败: {str(e)}")
+
+
 @sshController.post("/file/info")
 async def get_file_info(
         ssh_id: int = Body(..., description="SSH服务器ID"),
@@ -458,16 +804,7 @@ async def get_file_info(
         if not connection_details:
             return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
 
-        host, username, password, port = connection_details
-
-        ssh_ops = SSHOperations.from_credentials(
-            host=host,
-            username=username,
-            password=password,
-            port=port
-        )
-
-        file_info = ssh_ops.get_file_info(remote_path)
+        file_info = await ssh_dispatcher.call(connection_details, 'get_file_info', remote_path)
 
         if file_info:
             # 处理时间戳为字符串格式
@@ -481,3 +818,550 @@ async def get_file_info(
             return ResponseUtil.error(msg="获取文件信息失败")
     except Exception as e:
         return ResponseUtil.error(msg=f"获取文件信息失败: {str(e)}")
+
+
+async def _search_result_lines(results: AsyncIterator[Tuple[str, Any]]) -> AsyncIterator[str]:
+    """
+    将搜索结果转换为NDJSON行：每个匹配条目一行，错误行为{"error": ...}，最后一行为{"done": {...}}
+    """
+    try:
+        async for kind, data in results:
+            if kind == 'match':
+                yield json.dumps(data, ensure_ascii=False) + "\n"
+            else:
+                yield json.dumps({kind: data}, ensure_ascii=False) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+
+
+@sshController.post("/file/search")
+async def search_files(
+        ssh_id: int = Body(..., description="SSH服务器ID"),
+        root: str = Body(..., description="搜索的根目录"),
+        name: str = Body(None, description="文件名通配符，如*.log"),
+        ignore_case: bool = Body(False, description="文件名匹配是否忽略大小写"),
+        file_type: str = Body(None, description="类型: file/dir/link"),
+        min_size: int = Body(None, description="最小字节数"),
+        max_size: int = Body(None, description="最大字节数"),
+        modified_after: float = Body(None, description="修改时间晚于该时间戳"),
+        modified_before: float = Body(None, description="修改时间不晚于该时间戳"),
+        max_depth: int = Body(None, description="最大搜索深度"),
+        limit: int = Body(1000, description="最多返回的条目数"),
+        use_index: bool = Body(False, description="是否使用缓存的路径索引，适合同一目录的重复搜索"),
+        max_index_age: int = Body(60, description="路径索引超过该秒数后先增量刷新"),
+        timeout: int = Body(300, description="搜索超时时间(秒)"),
+        query_db: AsyncSession = Depends(get_db)
+):
+    """
+    在服务端执行find搜索远程文件，以NDJSON逐条返回匹配结果
+    """
+    try:
+        # 获取SSH连接详情
+        connection_details = await get_ssh_connection_details(query_db, ssh_id)
+        if not connection_details:
+            return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
+
+        results = await ssh_dispatcher.stream(
+            connection_details, 'search_files',
+            root,
+            name=name,
+            ignore_case=ignore_case,
+            file_type=file_type,
+            min_size=min_size,
+            max_size=max_size,
+            modified_after=modified_after,
+            modified_before=modified_before,
+            max_depth=max_depth,
+            limit=limit,
+            use_index=use_index,
+            max_index_age=max_index_age,
+            timeout=timeout
+        )
+
+        return StreamingResponse(
+            _search_result_lines(results),
+            media_type="application/x-ndjson"
+        )
+    except Exception as e:
+        return ResponseUtil.error(msg=f"搜索文件失败: {str(e)}")
+
+
+async def _pump_follow(
+        websocket: WebSocket, subscriber: FollowSubscriber, decoder: codecs.IncrementalDecoder, idle_timeout: int
+) -> None:
+    """
+    将订阅者队列中的消息推送到WebSocket，直到跟踪结束、客户端断开或超过idle_timeout秒没有任何消息
+    """
+    getter = receiver = None
+    try:
+        while True:
+            getter = getter or asyncio.ensure_future(subscriber.queue.get())
+            # 同时等待客户端消息，以便及时发现断开
+            receiver = receiver or asyncio.ensure_future(websocket.receive())
+            done, _ = await asyncio.wait({getter, receiver}, timeout=idle_timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                await websocket.send_json({"event": "idle", "timeout": idle_timeout})
+                return
+            if receiver in done:
+                if receiver.result()['type'] == 'websocket.disconnect':
+                    return
+                receiver = None
+            if getter in done:
+                kind, data = getter.result()
+                getter = None
+                if kind == 'data':
+                    text = decoder.decode(data)
+                    if text:
+                        await websocket.send_json({"data": text})
+                elif kind == 'dropped':
+                    await websocket.send_json({"dropped": data})
+                elif kind == 'event':
+                    await websocket.send_json({"event": "notice", "message": data})
+                elif kind == 'end':
+                    await websocket.send_json({"event": "end", "reason": data})
+                    return
+    finally:
+        for task in (getter, receiver):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+@sshWsController.websocket("/text/follow")
+async def follow_text(
+        websocket: WebSocket,
+        ssh_id: int = Query(..., description="SSH服务器ID"),
+        remote_path: str = Query(..., description="远程文件路径"),
+        lines: int = Query(100, description="开始跟踪前先返回的末尾行数"),
+        encoding: str = Query(None, description="文本编码，为空时根据末尾内容自动识别"),
+        idle_timeout: int = Query(600, description="超过该秒数没有新内容时断开"),
+        token: str = Query(None, description="登录令牌"),
+        query_db: AsyncSession = Depends(get_db)
+):
+    """
+    跟踪远程日志文件：先返回末尾若干行，之后只推送追加的内容；同一文件的多个查看者共享一个远程tail -F
+    """
+    if not await _authenticate_websocket(websocket, token, query_db):
+        return
+    await websocket.accept()
+    follower = subscriber = None
+    try:
+        # 获取SSH连接详情
+        connection_details = await get_ssh_connection_details(query_db, ssh_id)
+        if not connection_details:
+            await websocket.send_json({"event": "error", "message": f"未找到ID为{ssh_id}的SSH服务器信息"})
+            return
+
+        host = connection_details[0]
+        ssh_ops = await ssh_dispatcher.operations(connection_details)
+        subscriber = FollowSubscriber(asyncio.get_running_loop())
+        follower, position = await ssh_executor.run(host, log_followers.subscribe, ssh_ops, remote_path, subscriber)
+        if lines:
+            # 快照截止到订阅开始的位置，之后的内容全部来自跟踪通道，不会重复或遗漏
+            snapshot = await ssh_dispatcher.call(connection_details, 'tail_text', remote_path, lines, encoding, position)
+            encoding = encoding or snapshot['encoding']
+            await websocket.send_json({
+                "event": "snapshot", "data": snapshot['content'],
+                "offset": snapshot['offset'], "encoding": snapshot['encoding']
+            })
+        await websocket.send_json({"event": "following", "offset": position})
+
+        decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+        await _pump_follow(websocket, subscriber, decoder, idle_timeout)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"跟踪远程文件失败: {str(e)}")
+        try:
+            await websocket.send_json({"event": "error", "message": f"跟踪远程文件失败: {str(e)}"})
+        except Exception:
+            pass
+    finally:
+        if follower is not None:
+            follower.unsubscribe(subscriber)
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+
+@sshController.post("/job/submit")
+async def submit_job(
+        ssh_id: int = Body(..., description="SSH服务器ID"),
+        command: str = Body(None, description="要执行的命令，与script_content二选一"),
+        script_content: str = Body(None, description="脚本内容，与command二选一"),
+        args: List[str] = Body(None, description="脚本参数"),
+        env: Dict[str, str] = Body(None, description="脚本环境变量"),
+        interpreter: str = Body("bash", description="脚本解释器: bash/sh/zsh/python3/python/perl"),
+        timeout: int = Body(None, description="超时时间(秒)，为空时不限制，超时后终止远程进程组"),
+        retention: int = Body(JOB_RETENTION, description="结束后保留结果的秒数"),
+        query_db: AsyncSession = Depends(get_db)
+):
+    """
+    提交后台任务，立即返回任务ID；任务在后台调度执行，输出保存在API服务器本地
+    """
+    if bool(command) == bool(script_content):
+        return ResponseUtil.error(msg="command和script_content必须且只能提供一个")
+    try:
+        # 获取SSH连接详情
+        connection_details = await get_ssh_connection_details(query_db, ssh_id)
+        if not connection_details:
+            return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
+
+        # 任务记录和输出保存在本地磁盘，读写都放到执行层线程中，不阻塞事件循环
+        if command:
+            job = await ssh_executor.run(
+                JOB_IO_KEY, ssh_jobs.submit, connection_details, command, ssh_id, timeout=timeout, retention=retention
+            )
+        else:
+            if not script_content.endswith('\n'):
+                script_content += '\n'
+            job = await ssh_executor.run(
+                JOB_IO_KEY, ssh_jobs.submit,
+                connection_details, SSHOperations.build_script_command(interpreter, args, env), ssh_id,
+                kind='script', stdin=script_content.encode('utf-8'), timeout=timeout, retention=retention
+            )
+
+        return ResponseUtil.success(msg="任务已提交", data=job.to_dict())
+    except Exception as e:
+        return ResponseUtil.error(msg=f"提交任务失败: {str(e)}")
+
+
+@sshController.post("/job/status")
+async def get_job_status(
+        job_id: str = Body(..., description="任务ID"),
+        stdout_offset: int = Body(0, description="标准输出的起始偏移"),
+        stderr_offset: int = Body(0, description="标准错误的起始偏移"),
+        max_bytes: int = Body(65536, description="每个输出流最多返回的字节数"),
+):
+    """
+    查询任务状态并按偏移读取输出，返回的stdout_offset/stderr_offset用于下一次查询
+    """
+    job = await ssh_executor.run(JOB_IO_KEY, ssh_jobs.get, job_id)
+    if job is None:
+        return ResponseUtil.error(msg=f"任务不存在: {job_id}")
+    try:
+        data = job.to_dict()
+        for stream, offset in (('stdout', stdout_offset), ('stderr', stderr_offset)):
+            output = await ssh_executor.run(JOB_IO_KEY, ssh_jobs.read_output, job, stream, offset, max_bytes)
+            data[stream] = output.decode('utf-8', errors='replace')
+            data[f"{stream}_offset"] = offset + len(output)
+
+        return ResponseUtil.success(data=data)
+    except Exception as e:
+        return ResponseUtil.error(msg=f"查询任务失败: {str(e)}")
+
+
+async def _job_output_chunks(job: SSHJob, offsets: Dict[str, int]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    轮询任务已保存的输出，任务结束且输出读完后产出退出码
+    """
+    while True:
+        # 先取状态再读取，保证结束前写入的输出都已读到
+        finished = job.finished
+        for stream in ('stdout', 'stderr'):
+            while True:
+                data = await ssh_executor.run(JOB_IO_KEY, ssh_jobs.read_output, job, stream, offsets[stream])
+                if not data:
+                    break
+                offsets[stream] += len(data)
+                yield stream, data
+        if finished:
+            yield 'exit', job.exit_code
+            return
+        await asyncio.sleep(0.5)
+
+
+@sshController.post("/job/stream")
+async def stream_job(
+        job_id: str = Body(..., description="任务ID"),
+        stdout_offset: int = Body(0, description="标准输出的起始偏移"),
+        stderr_offset: int = Body(0, description="标准错误的起始偏移"),
+):
+    """
+    以NDJSON流式返回任务输出，直到任务结束；断开后可按已收到的字节数作为偏移重新获取
+    """
+    job = await ssh_executor.run(JOB_IO_KEY, ssh_jobs.get, job_id)
+    if job is None:
+        return ResponseUtil.error(msg=f"任务不存在: {job_id}")
+
+    return StreamingResponse(
+        _command_output_lines(_job_output_chunks(job, {'stdout': stdout_offset, 'stderr': stderr_offset})),
+        media_type="application/x-ndjson"
+    )
+
+
+@sshController.post("/job/cancel")
+async def cancel_job(
+        job_id: str = Body(..., embed=True, description="任务ID"),
+):
+    """
+    取消任务：排队中的任务直接取消，运行中的任务向远程进程组发送SIGTERM，宽限期后仍未退出则发送SIGKILL
+    """
+    job = await ssh_executor.run(JOB_IO_KEY, ssh_jobs.get, job_id)
+    if job is None:
+        return ResponseUtil.error(msg=f"任务不存在: {job_id}")
+    try:
+        host = job.target[0] if job.target else job.conn_key
+        job = await ssh_executor.run(host, ssh_jobs.cancel, job_id)
+
+        return ResponseUtil.success(msg="已请求取消任务", data=job.to_dict())
+    except Exception as e:
+        return ResponseUtil.error(msg=f"取消任务失败: {str(e)}")
+
+
+@sshController.post("/job/remove")
+async def remove_job(
+        job_id: str = Body(..., embed=True, description="任务ID"),
+):
+    """
+    删除已结束任务的记录和输出（未删除的结果在保留时间到期后自动清理）
+    """
+    try:
+        if not await ssh_executor.run(JOB_IO_KEY, ssh_jobs.remove, job_id):
+            return ResponseUtil.error(msg=f"任务不存在: {job_id}")
+
+        return ResponseUtil.success(msg="任务已删除")
+    except Exception as e:
+        return ResponseUtil.error(msg=f"删除任务失败: {str(e)}")
+
+
+@sshController.get("/job/list")
+async def list_jobs(
+        ssh_id: int = Query(None, description="只列出该服务器的任务"),
+        status: str = Query(None, description="只列出该状态的任务: queued/running/succeeded/failed/error/cancelled/timeout/interrupted"),
+):
+    """
+    列出后台任务，按提交时间倒序
+    """
+    return ResponseUtil.success(data=await ssh_executor.run(JOB_IO_KEY, ssh_jobs.list, ssh_id, status))
+
+
+@sshController.post("/shell/open")
+async def open_shell(
+        ssh_id: int = Body(..., description="SSH服务器ID"),
+        term: str = Body('xterm', description="终端类型"),
+        cols: int = Body(80, description="终端列数"),
+        rows: int = Body(24, description="终端行数"),
+        idle_timeout: int = Body(SHELL_IDLE_TIMEOUT, description="没有客户端附加时的空闲超时时间(秒)"),
+        query_db: AsyncSession = Depends(get_db),
+        current_user: CurrentUserModel = Depends(LoginService.get_current_user)
+):
+    """
+    创建持久化shell会话（PTY），返回会话ID，之后可通过WebSocket附加或顺序执行命令；会话只能由创建者访问
+    """
+    try:
+        # 获取SSH连接详情
+        connection_details = await get_ssh_connection_details(query_db, ssh_id)
+        if not connection_details:
+            return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
+
+        host = connection_details[0]
+        ssh_ops = await ssh_dispatcher.operations(connection_details)
+        session = await ssh_executor.run(
+            host, shell_sessions.create, ssh_ops, ssh_id, term, cols, rows, idle_timeout, current_user.user.user_id
+        )
+
+        return ResponseUtil.success(msg="会话创建成功", data=session.stats())
+    except Exception as e:
+        return ResponseUtil.error(msg=f"创建shell会话失败: {str(e)}")
+
+
+@sshController.post("/shell/command")
+async def execute_shell_command(
+        session_id: str = Body(..., description="会话ID"),
+        command: str = Body(..., description="要执行的命令"),
+        timeout: int = Body(60, description="命令超时时间(秒)，超时后发送Ctrl+C"),
+        max_bytes: int = Body(SHELL_COMMAND_MAX_BYTES, description="输出字节数上限，超过后截断"),
+        current_user: CurrentUserModel = Depends(LoginService.get_current_user)
+):
+    """
+    在shell会话中执行命令，工作目录和环境变量在命令之间保持；标准输出和标准错误合并返回
+    """
+    session = shell_sessions.get(session_id, current_user.user.user_id)
+    if session is None or session.closed:
+        return ResponseUtil.error(msg=f"shell会话不存在或已结束: {session_id}")
+    try:
+        result = await ssh_executor.run(session.ssh_client.host, session.run_command, command, timeout, max_bytes)
+
+        return ResponseUtil.success(data=result)
+    except Exception as e:
+        return ResponseUtil.error(msg=f"执行命令失败: {str(e)}")
+
+
+@sshController.post("/shell/close")
+async def close_shell(
+        session_id: str = Body(..., embed=True, description="会话ID"),
+        current_user: CurrentUserModel = Depends(LoginService.get_current_user)
+):
+    """
+    关闭shell会话
+    """
+    if not shell_sessions.close(session_id, current_user.user.user_id):
+        return ResponseUtil.error(msg=f"shell会话不存在: {session_id}")
+    return ResponseUtil.success(msg="会话已关闭")
+
+
+@sshController.get("/shell/list")
+async def list_shells(current_user: CurrentUserModel = Depends(LoginService.get_current_user)):
+    """
+    列出当前用户创建的shell会话
+    """
+    return ResponseUtil.success(data=shell_sessions.list(current_user.user.user_id))
+
+
+async def _pump_shell(
+        websocket: WebSocket, session: ShellSession, subscriber: FollowSubscriber,
+        decoder: codecs.IncrementalDecoder, offset: int
+) -> None:
+    """
+    在会话输出与WebSocket之间双向转发，直到会话结束或客户端断开；
+    每条输出消息带offset（已推送内容的结束偏移），客户端重新连接时以since=offset继续
+    """
+    getter = receiver = None
+    try:
+        while True:
+            getter = getter or asyncio.ensure_future(subscriber.queue.get())
+            receiver = receiver or asyncio.ensure_future(websocket.receive())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                message = receiver.result()
+                receiver = None
+                if message['type'] == 'websocket.disconnect':
+                    return
+                try:
+                    request = json.loads(message.get('text') or message.get('bytes') or '{}')
+                    if request.get('type') == 'input':
+                        session.write(str(request.get('data', '')).encode('utf-8'))
+                    elif request.get('type') == 'resize':
+                        await ssh_executor.run(
+                            session.ssh_client.host, session.resize, int(request['cols']), int(request['rows'])
+                        )
+                except Exception as e:
+                    await websocket.send_json({"event": "error", "message": str(e)})
+            if getter in done:
+                kind, data = getter.result()
+                getter = None
+                if kind == 'data':
+                    offset += len(data)
+                    text = decoder.decode(data)
+                    if text:
+                        await websocket.send_json({"data": text, "offset": offset})
+                elif kind == 'dropped':
+                    offset += data
+                    await websocket.send_json({"dropped": data, "offset": offset})
+                elif kind == 'end':
+                    await websocket.send_json({"event": "end", "reason": data})
+                    return
+    finally:
+        for task in (getter, receiver):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+@sshWsController.websocket("/shell/attach")
+async def attach_shell(
+        websocket: WebSocket,
+        session_id: str = Query(..., description="会话ID"),
+        since: int = Query(None, description="已收到输出的结束偏移，重新连接时传入以只回放之后的内容；为空时回放全部缓冲内容"),
+        encoding: str = Query('utf-8', description="终端编码"),
+        token: str = Query(None, description="登录令牌"),
+        query_db: AsyncSession = Depends(get_db)
+):
+    """
+    附加到shell会话（Web终端）：先回放缓冲区中的最近输出，之后双向转发；
+    客户端发送{"type": "input", "data": "..."}输入，{"type": "resize", "cols": 120, "rows": 40}调整大小；
+    断开连接不会关闭会话
+    """
+    current_user = await _authenticate_websocket(websocket, token, query_db)
+    if current_user is None:
+        return
+    await websocket.accept()
+    session = subscriber = None
+    try:
+        session = shell_sessions.get(session_id, current_user.user.user_id)
+        if session is None:
+            await websocket.send_json({"event": "error", "message": f"shell会话不存在: {session_id}"})
+            return
+
+        subscriber = FollowSubscriber(asyncio.get_running_loop())
+        start, replay = session.attach(subscriber, since)
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        offset = start + len(replay)
+        await websocket.send_json({
+            "event": "attached", "data": decoder.decode(replay), "start": start, "offset": offset,
+            "missed": max(0, start - since) if since is not None else 0
+        })
+        if session.closed:
+            await websocket.send_json({"event": "end", "reason": session.closed_reason})
+            return
+
+        await _pump_shell(websocket, session, subscriber, decoder, offset)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"附加shell会话失败: {str(e)}")
+        try:
+            await websocket.send_json({"event": "error", "message": f"附加shell会话失败: {str(e)}"})
+        except Exception:
+            pass
+    finally:
+        if session is not None and subscriber is not None:
+            session.detach(subscriber)
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+
+@sshController.get("/metrics")
+async def get_ssh_metrics():
+    """
+    获取SSH执行层运行指标
+    """
+    return ResponseUtil.success(
+        data={
+            "backend": SSH_BACKEND,
+            "executor": ssh_executor.stats(),
+            "operations": ssh_dispatcher.stats(),
+            "pool": SSHClient.pool_stats(),
+            "credentials": get_ssh_connection_cache_stats(),
+            "path_indexes": list_path_indexes(),
+            "followers": log_followers.stats(),
+            "shells": shell_sessions.stats(),
+            "jobs": ssh_jobs.stats(),
+            "result_cache": result_cache.stats()
+        }
+    )
+
+
+@sshController.post("/cache/invalidate")
+async def invalidate_connection_cache(
+        ssh_id: int = Body(None, embed=True, description="SSH服务器ID，为空时清空全部")
+):
+    """
+    使SSH连接详情缓存失效，服务器信息修改后调用
+    """
+    invalidate_ssh_connection_details(ssh_id)
+    return ResponseUtil.success(msg="缓存已失效")
+
+
+@sshController.post("/cache/result/invalidate")
+async def invalidate_result_cache(
+        ssh_id: int = Body(None, embed=True, description="SSH服务器ID，为空时清空全部"),
+        query_db: AsyncSession = Depends(get_db)
+):
+    """
+    清除命令和文本读取的结果缓存
+    """
+    try:
+        if ssh_id is None:
+            count = result_cache.invalidate()
+        else:
+            connection_details = await get_ssh_connection_details(query_db, ssh_id)
+            if not connection_details:
+                return ResponseUtil.error(msg=f"未找到ID为{ssh_id}的SSH服务器信息")
+            host, username, _, port = connection_details
+            count = result_cache.invalidate(f"{username}@{host}:{port}")
+        return ResponseUtil.success(msg="缓存已失效", data={"removed": count})
+    except Exception as e:
+        return ResponseUtil.error(msg=f"清除结果缓存失败: {str(e)}")
@@ -0,0 +1,650 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/16 11:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : async_ssh_client.py
+# @Software: PyCharm
+# @desc    : 基于asyncssh的原生异步SSH后端，接口与SSHClient/SSHOperations保持一致
+import asyncio
+import os
+import posixpath
+import stat as stat_module
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Callable, Any, Tuple
+from utils.log_util import logger
+from plugin.module_ssh.core.ssh_client import SSHClient
+from plugin.module_ssh.core.ssh_operations import SSHOperations, TEXT_READ_MAX_BYTES
+from plugin.module_ssh.core.ssh_result_cache import result_cache
+
+try:
+    import asyncssh
+except ImportError:  # pragma: no cover - 可选依赖
+    asyncssh = None
+
+
+class AsyncSSHClient:
+    """异步SSH客户端类，管理与远程服务器的连接"""
+
+    # 连接池 - 存储所有活跃的异步SSH连接
+    _connections: Dict[str, 'AsyncSSHClient'] = {}
+    _locks: Dict[str, asyncio.Lock] = {}
+
+    @classmethod
+    async def get_connection(
+            cls, host: str, username: str, password: str = None,
+            port: int = 22, timeout: int = 10
+    ) -> 'AsyncSSHClient':
+        """
+        获取或创建异步SSH连接
+        :param host: 主机地址
+        :param username: 用户名
+        :param password: 密码（可选）
+        :param port: SSH端口，默认22
+        :param timeout: 连接超时时间（秒）
+        :return: AsyncSSHClient实例
+        """
+        conn_key = f"{username}@{host}:{port}"
+        lock = cls._locks.setdefault(conn_key, asyncio.Lock())
+
+        async with lock:
+            conn = cls._connections.get(conn_key)
+            if conn is not None:
+                if conn.is_active():
+                    return conn
+                logger.info(f"连接已断开，重新创建: {conn_key}")
+                cls._connections.pop(conn_key, None)
+
+            conn = cls(host, username, password, port, timeout)
+            await conn._connect()
+            cls._connections[conn_key] = conn
+            return conn
+
+    def __init__(
+            self, host: str, username: str, password: str = None,
+            port: int = 22, timeout: int = 10
+    ):
+        """
+        初始化异步SSH客户端（需调用_connect建立连接）
+        :param host: 主机地址
+        :param username: 用户名
+        :param password: 密码（可选）
+        :param port: SSH端口，默认22
+        :param timeout: 连接超时时间（秒）
+        """
+        if asyncssh is None:
+            raise RuntimeError("未安装asyncssh，无法使用异步SSH后端")
+        self.host = host
+        self.username = username
+        self.password = password
+        self.port = port
+        self.timeout = timeout
+        self.client = None
+        self.sftp = None
+
+    async def _connect(self) -> None:
+        """建立SSH连接"""
+        try:
+            connect_kwargs = {
+                'port': self.port,
+                'username': self.username,
+                'known_hosts': None,
+                'agent_path': None,
+                'client_keys': None,
+                'connect_timeout': self.timeout
+            }
+
+            if self.password:
+                connect_kwargs['password'] = self.password
+
+            self.client = await asyncssh.connect(self.host, **connect_kwargs)
+            self.sftp = await self.client.start_sftp_client()
+            logger.info(f"成功连接到服务器 {self.username}@{self.host}:{self.port}")
+
+        except Exception as e:
+            logger.error(f"连接服务器失败: {str(e)}")
+            if self.client:
+                self.client.close()
+                self.client = None
+            raise
+
+    def is_active(self) -> bool:
+        """
+        检查连接是否活跃
+        :return: 如果连接活跃返回True，否则返回False
+        """
+        if not self.client:
+            return False
+        is_closed = getattr(self.client, 'is_closed', None)
+        if is_closed is not None:
+            return not is_closed()
+        return self.client._transport is not None
+
+    async def reconnect(self) -> bool:
+        """
+        重新连接到服务器
+        :return: 如果重连成功返回True，否则返回False
+        """
+        try:
+            # 只关闭底层连接，保留在连接注册表中
+            await self._disconnect()
+            await self._connect()
+            return True
+        except Exception as e:
+            logger.error(f"重新连接失败: {str(e)}")
+            return False
+
+    async def _disconnect(self) -> None:
+        """关闭SFTP会话和SSH连接"""
+        if self.sftp:
+            try:
+                self.sftp.exit()
+            except Exception as e:
+                logger.warning(f"关闭SFTP连接时出错: {str(e)}")
+            finally:
+                self.sftp = None
+
+        if self.client:
+            try:
+                self.client.close()
+                await self.client.wait_closed()
+            except Exception as e:
+                logger.warning(f"关闭SSH连接时出错: {str(e)}")
+            finally:
+                self.client = None
+
+    async def close(self) -> None:
+        """关闭连接"""
+        await self._disconnect()
+        # 从连接注册表中移除
+        conn_key = f"{self.username}@{self.host}:{self.port}"
+        if self._connections.get(conn_key) is self:
+            del self._connections[conn_key]
+
+        logger.info(f"已关闭与服务器 {self.username}@{self.host}:{self.port} 的连接")
+
+    async def execute_command(
+            self, command: str, timeout: int = 60
+    ) -> Tuple[str, str, int]:
+        """
+        执行远程命令
+        :param command: 要执行的命令
+        :param timeout: 命令超时时间（秒）
+        :return: 元组 (标准输出, 标准错误, 退出码)
+        """
+        if not self.is_active():
+            await self.reconnect()
+
+        try:
+            result = await self.client.run(command, timeout=timeout, check=False)
+            exit_status = result.exit_status if result.exit_status is not None else -1
+            output = result.stdout or ''
+            error = result.stderr or ''
+
+            if exit_status != 0:
+                logger.warning(f"命令执行返回非零状态: {exit_status}, 错误: {error}")
+            else:
+                logger.info(f"命令执行成功: '{command}'")
+
+            return output, error, exit_status
+
+        except Exception as e:
+            logger.error(f"执行命令失败: {str(e)}")
+            return "", str(e), -1
+
+    async def __aenter__(self):
+        """支持异步上下文管理器"""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """退出上下文时关闭连接"""
+        await self.close()
+
+    @classmethod
+    async def test_connection(
+            cls, host: str, username: str, password: str = None,
+            port: int = 22, timeout: int = 5
+    ) -> Tuple[bool, str]:
+        """
+        测试SSH连接是否可用
+        :param host: 主机地址
+        :param username: 用户名
+        :param password: 密码（可选）
+        :param port: SSH端口，默认22
+        :param timeout: 连接超时时间（秒）
+        :return: 元组 (是否成功, 错误信息)
+        """
+        if asyncssh is None:
+            return False, "连接失败: 未安装asyncssh"
+        conn = None
+        try:
+            connect_kwargs = {
+                'port': port,
+                'username': username,
+                'known_hosts': None,
+                'agent_path': None,
+                'client_keys': None,
+                'connect_timeout': timeout
+            }
+
+            if password:
+                connect_kwargs['password'] = password
+
+            conn = await asyncssh.connect(host, **connect_kwargs)
+
+            # 执行简单命令确认连接正常
+            result = await conn.run('echo "Connection Test"', timeout=timeout, check=False)
+
+            if result.exit_status == 0:
+                return True, ""
+            else:
+                return False, f"连接测试失败: {result.stderr}"
+
+        except Exception as e:
+            return False, f"连接失败: {str(e)}"
+
+        finally:
+            if conn:
+                conn.close()
+
+
+class AsyncSSHOperations:
+    """异步SSH操作类，方法与SSHOperations一一对应，均为协程"""
+
+    def __init__(self, ssh_client: AsyncSSHClient):
+        """
+        初始化异步SSH操作
+        :param ssh_client: AsyncSSHClient实例
+        """
+        self.ssh_client = ssh_client
+
+    @property
+    def conn_key(self) -> str:
+        """连接键（user@host:port）"""
+        return f"{self.ssh_client.username}@{self.ssh_client.host}:{self.ssh_client.port}"
+
+    @classmethod
+    async def from_credentials(
+            cls, host: str, username: str, password: str = None,
+            port: int = 22
+    ) -> 'AsyncSSHOperations':
+        """
+        从凭据创建异步SSH操作实例
+        :param host: 主机地址
+        :param username: 用户名
+        :param password: 密码（可选）
+        :param port: SSH端口，默认22
+        :return: AsyncSSHOperations实例
+        """
+        ssh_client = await AsyncSSHClient.get_connection(
+            host, username, password, port
+        )
+        return cls(ssh_client)
+
+    def _invalidate(self, path: str, recursive: bool = False) -> None:
+        """
+        写入后使同一服务器paramiko连接的元数据缓存失效：流式传输等操作仍经由paramiko连接，
+        其缓存的stat结果也是文本读取结果缓存键的一部分
+        :param path: 被修改的远程路径
+        :param recursive: 是否同时使路径下所有子项失效
+        """
+        SSHClient.invalidate_metadata(self.conn_key, path, recursive)
+
+    async def upload_file(
+            self, local_path: str, remote_path: str,
+            callback: Optional[Callable[[int, int], None]] = None
+    ) -> bool:
+        """
+        上传文件到远程服务器
+        :param local_path: 本地文件路径
+        :param remote_path: 远程文件路径
+        :param callback: 进度回调函数，参数为(已传输字节数, 总字节数)
+        :return: 成功返回True，失败返回False
+        """
+        try:
+            if not os.path.exists(local_path):
+                logger.error(f"本地文件不存在: {local_path}")
+                return False
+
+            if remote_path.endswith('/'):
+                full_remote_path = os.path.join(remote_path, os.path.basename(local_path))
+            else:
+                full_remote_path = remote_path
+
+            remote_dir = os.path.dirname(full_remote_path)
+            if remote_dir:
+                await self.ssh_client.sftp.makedirs(remote_dir, exist_ok=True)
+                self._invalidate(remote_dir)
+
+            try:
+                await self.ssh_client.sftp.put(
+                    local_path, full_remote_path,
+                    progress_handler=self._progress_handler(callback)
+                )
+            finally:
+                self._invalidate(full_remote_path)
+            logger.info(f"文件已成功上传: {local_path} -> {full_remote_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"上传文件失败: {str(e)}")
+            return False
+
+    async def download_file(
+            self, remote_path: str, local_path: str,
+            callback: Optional[Callable[[int, int], None]] = None
+    ) -> bool:
+        """
+        从远程服务器下载文件
+        :param remote_path: 远程文件路径
+        :param local_path: 本地文件路径
+        :param callback: 进度回调函数，参数为(已传输字节数, 总字节数)
+        :return: 成功返回True，失败返回False
+        """
+        try:
+            local_dir = os.path.dirname(local_path)
+            if local_dir and not os.path.exists(local_dir):
+                os.makedirs(local_dir)
+
+            await self.ssh_client.sftp.get(
+                remote_path, local_path,
+                progress_handler=self._progress_handler(callback)
+            )
+            logger.info(f"文件已成功下载: {remote_path} -> {local_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"下载文件失败: {str(e)}")
+            return False
+
+    @staticmethod
+    def _progress_handler(callback: Optional[Callable[[int, int], None]]):
+        """将(已传输字节数, 总字节数)回调转换为asyncssh的进度回调"""
+        if callback is None:
+            return None
+        return lambda src, dst, transferred, total: callback(transferred, total)
+
+    async def write_text(self, remote_path: str, content: str) -> bool:
+        """
+        写入文本到远程文件
+        :param remote_path: 远程文件路径
+        :param content: 要写入的文本内容
+        :return: 成功返回True，失败返回False
+        """
+        try:
+            remote_dir = os.path.dirname(remote_path)
+            if remote_dir:
+                await self.ssh_client.sftp.makedirs(remote_dir, exist_ok=True)
+                self._invalidate(remote_dir)
+
+            try:
+                async with self.ssh_client.sftp.open(remote_path, 'w') as f:
+                    await f.write(content)
+            finally:
+                self._invalidate(remote_path)
+
+            logger.info(f"文本已成功写入: {remote_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"写入文本失败: {str(e)}")
+            return False
+
+    async def read_text(
+            self, remote_path: str, max_bytes: int = TEXT_READ_MAX_BYTES, use_cache: bool = False
+    ) -> Optional[str]:
+        """
+        读取远程文件全部内容，超过max_bytes的文件需分段读取
+        :param remote_path: 远程文件路径
+        :param max_bytes: 允许整体读取的最大字节数
+        :param use_cache: 是否使用结果缓存，缓存键包含文件的修改时间和大小
+        :return: 文件内容或None（失败时）
+        """
+        try:
+            attrs = await self.ssh_client.sftp.stat(remote_path)
+            if use_cache:
+                key = (
+                    self.conn_key, 'text', posixpath.normpath(remote_path), attrs.mtime, attrs.size, 'all', max_bytes
+                )
+                return await result_cache.aload(key, result_cache.text_ttl, lambda: self.read_text(remote_path, max_bytes))
+            size = attrs.size
+            if size > max_bytes:
+                raise ValueError(f"文件大小{size}字节超过上限{max_bytes}字节，请分段读取")
+            async with self.ssh_client.sftp.open(remote_path, 'rb') as f:
+                content = await f.read()
+
+            logger.info(f"成功读取文件内容: {remote_path}")
+            return SSHOperations.decode_text(content)[0]
+
+        except Exception as e:
+            logger.error(f"读取文件失败: {str(e)}")
+            return None
+
+    async def list_dir(self, remote_path: str) -> List[str]:
+        """
+        列出远程目录内容
+        :param remote_path: 远程目录路径
+        :return: 文件和目录名列表
+        """
+        try:
+            files = await self.ssh_client.sftp.listdir(remote_path)
+            logger.info(f"列出目录内容: {remote_path}")
+            return [name for name in files if name not in ('.', '..')]
+        except Exception as e:
+            logger.error(f"列出目录失败: {str(e)}")
+            return []
+
+    async def list_dir_attr(
+            self, remote_path: str, pattern: Optional[str] = None, sort: str = 'name', reverse: bool = False,
+            dirs_first: bool = True, cursor: Optional[str] = None, limit: int = 200
+    ) -> Dict[str, Any]:
+        """
+        列出远程目录内容及属性，参数和返回值与SSHOperations.list_dir_attr相同
+        """
+        entries = []
+        for name in await self.ssh_client.sftp.readdir(remote_path):
+            if name.filename in ('.', '..'):
+                continue
+            attrs = name.attrs
+            stat = SimpleNamespace(
+                st_size=attrs.size, st_uid=attrs.uid, st_gid=attrs.gid,
+                st_mode=attrs.permissions, st_atime=attrs.atime, st_mtime=attrs.mtime
+            )
+            entries.append(SSHOperations.build_dir_entry(name.filename, stat))
+        page = SSHOperations.paginate_entries(entries, pattern, sort, reverse, dirs_first, cursor, limit)
+        page['path'] = remote_path
+        return page
+
+    async def get_file_info(self, remote_path: str) -> Optional[Dict[str, Any]]:
+        """
+        获取远程文件信息
+        :param remote_path: 远程文件路径
+        :return: 文件信息字典或None（失败时）
+        """
+        try:
+            attrs = await self.ssh_client.sftp.stat(remote_path)
+            stat = SimpleNamespace(
+                st_size=attrs.size, st_uid=attrs.uid, st_gid=attrs.gid,
+                st_mode=attrs.permissions, st_atime=attrs.atime, st_mtime=attrs.mtime
+            )
+            return SSHOperations.build_file_info(stat)
+
+        except Exception as e:
+            logger.error(f"获取文件信息失败: {str(e)}")
+            return None
+
+    async def make_dir(self, remote_path: str) -> bool:
+        """
+        创建远程目录
+        :param remote_path: 远程目录路径
+        :return: 成功返回True，失败返回False
+        """
+        try:
+            if await self.ssh_client.sftp.isdir(remote_path):
+                logger.info(f"目录已存在: {remote_path}")
+                return True
+            await self.ssh_client.sftp.mkdir(remote_path)
+            self._invalidate(remote_path)
+            logger.info(f"成功创建目录: {remote_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"创建目录失败: {str(e)}")
+            return False
+
+    async def remove_file(self, remote_path: str) -> bool:
+        """
+        删除远程文件
+        :param remote_path: 远程文件路径
+        :return: 成功返回True，失败返回False
+        """
+        try:
+            await self.ssh_client.sftp.remove(remote_path)
+            self._invalidate(remote_path)
+            logger.info(f"成功删除文件: {remote_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"删除文件失败: {str(e)}")
+            return False
+
+    async def remove_dir(self, remote_path: str, recursive: bool = False) -> bool:
+        """
+        删除远程目录
+        :param remote_path: 远程目录路径
+        :param recursive: 是否递归删除内容
+        :return: 成功返回True，失败返回False
+        """
+        try:
+            if recursive:
+                return not (await self.remove_tree(remote_path))['failed']
+            await self.ssh_client.sftp.rmdir(remote_path)
+            self._invalidate(remote_path, recursive=True)
+            logger.info(f"成功删除目录: {remote_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"删除目录失败: {str(e)}")
+            return False
+
+    async def remove_tree(
+            self, remote_path: str, fast: bool = False, parallelism: int = 64, timeout: int = 3600
+    ) -> Dict[str, Any]:
+        """
+        递归删除远程目录，SFTP删除请求在同一通道上并发发送；fast为True时直接在服务端执行rm -rf
+        :param remote_path: 远程目录路径
+        :param fast: 是否使用服务端rm -rf（只允许RM_ALLOWED_PATHS下的路径）
+        :param parallelism: 同时在途的SFTP删除请求数
+        :param timeout: rm -rf的超时时间（秒）
+        :return: 与SSHOperations.remove_tree相同
+        """
+        start = time.perf_counter()
+        path = SSHOperations.check_remove_path(remote_path, fast)
+        sftp = self.ssh_client.sftp
+
+        if fast:
+            SSHOperations.check_remove_path(await sftp.realpath(path), fast)
+            output, error, exit_code = await self.execute_command(SSHOperations.build_rm_command(path), timeout)
+            result = SSHOperations.parse_rm_result(output, error, exit_code)
+            result['method'] = 'rm'
+        else:
+            result = {'files': 0, 'dirs': 0, 'failed': [], 'method': 'sftp'}
+            semaphore = asyncio.Semaphore(parallelism)
+
+            async def remove(method: str, target: str, counter: str) -> None:
+                async with semaphore:
+                    try:
+                        await getattr(sftp, method)(target)
+                        result[counter] += 1
+                    except Exception as e:
+                        result['failed'].append({'path': target, 'error': str(e)})
+
+            files, levels, pending = [], {}, [path]
+            try:
+                while pending:
+                    directory = pending.pop()
+                    for entry in await sftp.readdir(directory):
+                        if entry.filename in ('.', '..'):
+                            continue
+                        child = posixpath.join(directory, entry.filename)
+                        if stat_module.S_ISDIR(entry.attrs.permissions or 0):
+                            levels.setdefault(child.count('/'), []).append(child)
+                            pending.append(child)
+                        else:
+                            files.append(child)
+            except Exception as e:
+                result['failed'].append({'path': directory, 'error': str(e)})
+
+            if not result['failed']:
+                # 先并发删除所有文件，再从最深层开始逐层删除目录
+                await asyncio.gather(*(remove('remove', target, 'files') for target in files))
+                for depth in sorted(levels, reverse=True):
+                    await asyncio.gather(*(remove('rmdir', target, 'dirs') for target in levels[depth]))
+                if not result['failed']:
+                    await remove('rmdir', path, 'dirs')
+
+        self._invalidate(path, recursive=True)
+        result['elapsed'] = round(time.perf_counter() - start, 3)
+        logger.info(
+            f"递归删除目录完成({result['method']}): {path}, 文件{result['files']}个, 目录{result['dirs']}个, "
+            f"失败{len(result['failed'])}个, 耗时{result['elapsed']}秒"
+        )
+        return result
+
+    async def execute_command(self, command: str, timeout: int = 60, use_cache: bool = False) -> Tuple[str, str, int]:
+        """
+        执行远程命令
+        :param command: 要执行的命令
+        :param timeout: 命令超时时间（秒）
+        :param use_cache: 是否使用结果缓存，仅对允许列表中的只读命令生效
+        :return: 元组 (标准输出, 标准错误, 退出码)
+        """
+        ttl = result_cache.command_ttl(command) if use_cache else None
+        if ttl is None:
+            return await self.ssh_client.execute_command(command, timeout)
+        return await result_cache.aload(
+            (self.conn_key, 'command', command.strip()), ttl,
+            lambda: self.ssh_client.execute_command(command, timeout),
+            cacheable=lambda result: result[2] == 0
+        )
+
+    async def execute_script(
+            self, script_content: str, timeout: int = 60, args: Optional[List[Any]] = None,
+            env: Optional[Dict[str, Any]] = None, interpreter: str = 'bash', use_temp_file: bool = False
+    ) -> Tuple[str, str, int]:
+        """
+        执行远程脚本，默认通过标准输入传入脚本
+        :param script_content: 脚本内容
+        :param timeout: 命令超时时间（秒）
+        :param args: 脚本参数
+        :param env: 环境变量
+        :param interpreter: 解释器，见SCRIPT_INTERPRETERS
+        :param use_temp_file: 是否先写入远程临时文件再执行，仅在脚本自身需要读取标准输入时使用
+        :return: 元组 (标准输出, 标准错误, 退出码)
+        """
+        if not self.ssh_client.is_active():
+            await self.ssh_client.reconnect()
+
+        remote_script_path = f"/tmp/temp_script_{os.urandom(4).hex()}.sh" if use_temp_file else None
+        try:
+            command = SSHOperations.build_script_command(interpreter, args, env, remote_script_path)
+            if remote_script_path:
+                if not await self.write_text(remote_script_path, script_content):
+                    return "", "无法创建临时脚本文件", -1
+                return await self.ssh_client.execute_command(command, timeout)
+
+            # 通过标准输入把脚本交给解释器执行，只需要一次往返
+            result = await self.ssh_client.client.run(
+                command, input=script_content, timeout=timeout, check=False
+            )
+            exit_status = result.exit_status if result.exit_status is not None else -1
+            return result.stdout or '', result.stderr or '', exit_status
+
+        except Exception as e:
+            logger.error(f"执行脚本失败: {str(e)}")
+            return "", str(e), -1
+
+        finally:
+            if remote_script_path:
+                await self.remove_file(remote_script_path)
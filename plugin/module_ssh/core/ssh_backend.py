@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/16 11:30
+# @Author  : 冉勇
+# @Site    :
+# @File    : ssh_backend.py
+# @Software: PyCharm
+# @desc    : SSH后端选择，通过环境变量SSH_BACKEND切换paramiko(默认)或asyncssh
+import os
+from typing import Tuple
+from plugin.module_ssh.core.ssh_client import SSHClient
+from plugin.module_ssh.core.ssh_executor import ssh_executor
+from plugin.module_ssh.core.async_ssh_client import AsyncSSHClient
+
+# 可选值: paramiko / asyncssh
+SSH_BACKEND = os.getenv('SSH_BACKEND', 'paramiko').lower()
+
+
+async def test_connection(host: str, username: str, password: str = None, port: int = 22) -> Tuple[bool, str]:
+    """
+    按当前后端测试SSH连接
+    :param host: 主机地址
+    :param username: 用户名
+    :param password: 密码（可选）
+    :param port: SSH端口，默认22
+    :return: 元组 (是否成功, 错误信息)
+    """
+    if SSH_BACKEND == 'asyncssh':
+        return await AsyncSSHClient.test_connection(host, username, password, port)
+    return await ssh_executor.run(
+        host, SSHClient.test_connection,
+        host=host,
+        username=username,
+        password=password,
+        port=port
+    )
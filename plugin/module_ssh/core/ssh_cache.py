@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/16 17:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : ssh_cache.py
+# @Software: PyCharm
+# @desc    : SSH模块通用缓存，带过期时间、容量上限（LRU淘汰）和命中率统计
+import errno
+import posixpath
+import stat as stat_module
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class TTLCache:
+    """线程安全的TTL+LRU缓存"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60):
+        """
+        初始化缓存
+        :param max_size: 最大条目数，超过后淘汰最久未使用的条目
+        :param ttl: 默认过期时间（秒）
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (过期时间, 值)，按最近使用顺序排列
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        获取缓存值
+        :param key: 缓存键
+        :param default: 未命中时返回的默认值
+        :return: 缓存值
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._stats['misses'] += 1
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        写入缓存
+        :param key: 缓存键
+        :param value: 缓存值
+        :param ttl: 过期时间（秒），默认使用构造时的ttl
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def delete(self, key: Hashable) -> bool:
+        """
+        删除缓存
+        :param key: 缓存键
+        :return: 存在并删除返回True
+        """
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        删除满足条件的缓存键
+        :param predicate: 判断函数，参数为缓存键
+        :return: 删除的条目数
+        """
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def purge_expired(self) -> int:
+        """
+        清理已过期的条目
+        :return: 清理的条目数
+        """
+        now = time.monotonic()
+        with self._lock:
+            keys = [key for key, (expires_at, _) in self._data.items() if expires_at <= now]
+            for key in keys:
+                del self._data[key]
+            self._stats['expired'] += len(keys)
+            return len(keys)
+
+    def items(self) -> List[tuple]:
+        """
+        获取所有未过期的条目（不影响LRU顺序和命中统计）
+        :return: [(key, value), ...]
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (expires_at, value) in self._data.items() if expires_at > now]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存指标
+        :return: 指标字典
+        """
+        with self._lock:
+            data = dict(self._stats)
+            data['size'] = len(self._data)
+        lookups = data['hits'] + data['misses']
+        data['hit_rate'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+        data['max_size'] = self.max_size
+        data['ttl'] = self.ttl
+        return data
+
+
+class RemoteMetadataCache:
+    """
+    远程文件元数据缓存，缓存stat和listdir_attr结果，每个连接各自维护一份；
+    通过本连接执行的写入、建目录、删除操作需调用invalidate使相关条目失效，其他途径的修改依赖较短的过期时间
+    """
+
+    # 缓存"路径不存在"的标记
+    _NOT_FOUND = object()
+
+    def __init__(self, max_size: int = 4096, ttl: float = 5):
+        """
+        初始化元数据缓存
+        :param max_size: 最大条目数
+        :param ttl: 过期时间（秒）
+        """
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        return posixpath.normpath(path) if path else path
+
+    def stat(self, sftp, path: str):
+        """
+        获取路径的stat结果，路径不存在时抛出FileNotFoundError（同样会被缓存）
+        :param sftp: SFTP会话
+        :param path: 远程路径
+        :return: SFTPAttributes
+        """
+        path = self._normalize(path)
+        attrs = self._cache.get(('stat', path))
+        if attrs is None:
+            try:
+                attrs = sftp.stat(path)
+            except FileNotFoundError:
+                attrs = self._NOT_FOUND
+            self._cache.set(('stat', path), attrs)
+        if attrs is self._NOT_FOUND:
+            raise FileNotFoundError(errno.ENOENT, "No such file", path)
+        return attrs
+
+    def is_dir(self, sftp, path: str) -> bool:
+        """
+        判断目录是否存在；已确认存在的目录单独记录，不会因为目录内容变化而失效，
+        批量上传时每个文件的父目录检查都可以直接命中
+        :param sftp: SFTP会话
+        :param path: 远程路径
+        :return: 是目录返回True
+        """
+        path = self._normalize(path)
+        if self._cache.get(('dir', path)):
+            return True
+        try:
+            attrs = self.stat(sftp, path)
+        except FileNotFoundError:
+            return False
+        if not stat_module.S_ISDIR(attrs.st_mode or 0):
+            return False
+        self._cache.set(('dir', path), True)
+        return True
+
+    def listdir_attr(self, sftp, path: str) -> List[Any]:
+        """
+        获取目录条目及属性，同时顺带缓存各子项（符号链接除外）的stat结果
+        :param sftp: SFTP会话
+        :param path: 远程目录路径
+        :return: SFTPAttributes列表
+        """
+        path = self._normalize(path)
+        entries = self._cache.get(('listdir', path))
+        if entries is None:
+            entries = sftp.listdir_attr(path)
+            self._cache.set(('listdir', path), entries)
+            for attr in entries:
+                if not stat_module.S_ISLNK(attr.st_mode or 0):
+                    self._cache.set(('stat', posixpath.join(path, attr.filename)), attr)
+        return list(entries)
+
+    def invalidate(self, path: str, recursive: bool = False) -> None:
+        """
+        路径被修改后使相关缓存失效：路径本身、其目录列表，以及父目录的stat和列表
+        :param path: 远程路径
+        :param recursive: 是否同时使路径下所有子项失效（目录整体被删除或替换时使用）
+        """
+        path = self._normalize(path)
+        parent = posixpath.dirname(path)
+        for key in (('stat', path), ('listdir', path), ('dir', path), ('stat', parent), ('listdir', parent)):
+            self._cache.delete(key)
+        if recursive:
+            prefix = path.rstrip('/') + '/'
+            self._cache.delete_where(lambda key: key[1].startswith(prefix))
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存指标
+        :return: 指标字典
+        """
+        return self._cache.stats()
@@ -6,18 +6,38 @@
 # @File    : ssh_client.py
 # @Software: PyCharm
 # @desc    : SSH客户端核心类
+import select
 import threading
+import time
 import paramiko
-from typing import Dict, Tuple
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Tuple
 from utils.log_util import logger
+from plugin.module_ssh.core.ssh_cache import RemoteMetadataCache
+from plugin.module_ssh.core.ssh_pool import SSHConnectionPool
 
 
 class SSHClient:
     """SSH客户端类，管理与远程服务器的连接"""
 
     # 连接池 - 存储所有活跃的SSH连接
-    _connections: Dict[str, 'SSHClient'] = {}
-    _lock = threading.Lock()
+    _pool = SSHConnectionPool()
+
+    # 单个连接上同时打开的最大通道数（SFTP会话与命令通道共用）
+    max_channels = 4
+    # 等待空闲通道的最长时间（秒）
+    channel_wait_timeout = 60
+
+    # 空闲超过该时间（秒）才会主动探测连接，否则只检查transport状态
+    health_check_interval = 30
+    # SSH keepalive发送间隔（秒），由transport在后台发送，用于及时发现断开的连接
+    keepalive_interval = 30
+    # 主动探测的超时时间（秒）
+    probe_timeout = 5
+
+    # 远程元数据（stat/目录列表）缓存的过期时间（秒）和容量
+    metadata_ttl = 5
+    metadata_cache_size = 4096
 
     @classmethod
     def get_connection(
@@ -34,21 +54,9 @@ class SSHClient:
         :return: SSHClient实例
         """
         conn_key = f"{username}@{host}:{port}"
-
-        with cls._lock:
-            if conn_key in cls._connections:
-                conn = cls._connections[conn_key]
-                if conn.is_active():
-                    return conn
-                else:
-                    # 连接断开，删除旧连接
-                    logger.info(f"连接已断开，重新创建: {conn_key}")
-                    del cls._connections[conn_key]
-
-            # 创建新连接
-            conn = cls(host, username, password, port, timeout)
-            cls._connections[conn_key] = conn
-            return conn
+        return cls._pool.acquire(
+            conn_key, lambda: cls(host, username, password, port, timeout)
+        )
 
     def __init__(
             self, host: str, username: str, password: str = None,
@@ -69,6 +77,18 @@ class SSHClient:
         self.timeout = timeout
         self.client = None
         self.sftp = None
+        self.last_used = 0.0
+        # 正在使用的通道数，连接池只会淘汰未使用的连接
+        self.in_use = 0
+        self._channel_slots = threading.BoundedSemaphore(self.max_channels)
+        self._channel_lock = threading.Lock()
+        # 重连互斥锁和已完成的重连次数，多个线程同时发现断开时只有一个执行重连
+        self._reconnect_lock = threading.Lock()
+        self._reconnects = 0
+        # 空闲的SFTP会话，多个并发请求各自借用一个，避免共享同一个SFTP句柄
+        self._idle_sftp: List[paramiko.SFTPClient] = []
+        # 本连接的远程元数据缓存
+        self.metadata = RemoteMetadataCache(self.metadata_cache_size, self.metadata_ttl)
         self._connect()
 
     def _connect(self) -> None:
@@ -90,7 +110,10 @@ class SSHClient:
                 connect_kwargs['password'] = self.password
 
             self.client.connect(**connect_kwargs)
+            self.client.get_transport().set_keepalive(self.keepalive_interval)
             self.sftp = self.client.open_sftp()
+            self._idle_sftp = [self.sftp]
+            self.mark_used()
             logger.info(f"成功连接到服务器 {self.username}@{self.host}:{self.port}")
 
         except Exception as e:
@@ -100,9 +123,119 @@ class SSHClient:
                 self.client = None
             raise
 
+    def mark_used(self) -> None:
+        """记录连接最近一次成功使用的时间"""
+        self.last_used = time.monotonic()
+
+    def is_alive(self) -> bool:
+        """
+        只根据transport状态判断连接是否存活，不产生网络交互
+        :return: 存活返回True，否则返回False
+        """
+        transport = self.client.get_transport() if self.client else None
+        return bool(transport and transport.is_active())
+
+    @contextmanager
+    def channel_slot(self, limited: bool = True):
+        """
+        占用一个通道名额，超过max_channels时等待
+        :param limited: 为False时不占用名额，只计入in_use防止连接被回收，用于tail -F等长时间保持的通道
+        """
+        if limited and not self._channel_slots.acquire(timeout=self.channel_wait_timeout):
+            raise TimeoutError(f"等待SSH通道超时: {self.username}@{self.host}:{self.port}")
+        with self._channel_lock:
+            self.in_use += 1
+        try:
+            yield
+        finally:
+            with self._channel_lock:
+                self.in_use -= 1
+            if limited:
+                self._channel_slots.release()
+
+    @contextmanager
+    def sftp_channel(self):
+        """
+        借用一个SFTP会话，用完归还；并发请求会在同一transport上打开多个SFTP通道
+        """
+        with self.channel_slot():
+            with self._channel_lock:
+                sftp = self._idle_sftp.pop() if self._idle_sftp else None
+            if sftp is None:
+                if not self.is_alive():
+                    self.reconnect()
+                sftp = self.client.open_sftp()
+            try:
+                yield sftp
+                self.mark_used()
+            finally:
+                channel = sftp.get_channel()
+                if channel is not None and not channel.closed and self.client is not None:
+                    with self._channel_lock:
+                        self._idle_sftp.append(sftp)
+                else:
+                    try:
+                        sftp.close()
+                    except Exception:
+                        pass
+
+    @contextmanager
+    def exec_channel(self, command: str, limited: bool = True):
+        """
+        打开一个执行命令的通道，由调用方直接读写标准输入输出，退出时关闭通道
+        :param command: 要执行的命令
+        :param limited: 是否占用通道名额，长时间保持的通道传False并由调用方限制数量
+        """
+        with self.channel_slot(limited):
+            if not self.is_alive():
+                self.reconnect()
+            channel = self.client.get_transport().open_session(timeout=self.timeout)
+            try:
+                channel.exec_command(command)
+                yield channel
+                self.mark_used()
+            finally:
+                channel.close()
+
+    def open_shell(self, term: str = 'xterm', width: int = 80, height: int = 24) -> paramiko.Channel:
+        """
+        打开交互式PTY shell通道，用于长时间保持的终端会话；不占用通道名额但计入in_use，
+        调用方负责限制数量并用close_shell关闭
+        :param term: 终端类型
+        :param width: 终端列数
+        :param height: 终端行数
+        :return: 已启动shell的通道
+        """
+        if not self.is_alive():
+            self.reconnect()
+        channel = self.client.get_transport().open_session(timeout=self.timeout)
+        try:
+            channel.get_pty(term=term, width=width, height=height)
+            channel.invoke_shell()
+        except Exception:
+            channel.close()
+            raise
+        with self._channel_lock:
+            self.in_use += 1
+        self.mark_used()
+        return channel
+
+    def close_shell(self, channel: paramiko.Channel) -> None:
+        """
+        关闭open_shell打开的通道
+        :param channel: shell通道
+        """
+        try:
+            channel.close()
+        finally:
+            with self._channel_lock:
+                self.in_use -= 1
+
     def is_active(self) -> bool:
         """
         检查连接是否活跃
+        优先使用transport状态和最近使用时间判断，只有空闲超过health_check_interval时
+        才打开一个会话通道做主动探测（探测通道用完即关闭）
         :return: 如果连接活跃返回True，否则返回False
         """
         if not self.client:
@@ -110,14 +243,15 @@ class SSHClient:
 
         try:
             transport = self.client.get_transport()
-            if transport and transport.is_active():
-                # 发送一个简单命令测试连接
-                try:
-                    self.client.exec_command('echo 1', timeout=5)
-                    return True
-                except Exception:
-                    return False
-            return False
+            if not transport or not transport.is_active():
+                return False
+            if time.monotonic() - self.last_used < self.health_check_interval:
+                return True
+            # 空闲时间过长，主动探测一次
+            channel = transport.open_session(timeout=self.probe_timeout)
+            channel.close()
+            self.mark_used()
+            return True
         except Exception:
             return False
 
@@ -126,23 +260,34 @@ class SSHClient:
         重新连接到服务器
         :return: 如果重连成功返回True，否则返回False
         """
-        try:
-            self.close()
-            self._connect()
-            return True
-        except Exception as e:
-            logger.error(f"重新连接失败: {str(e)}")
-            return False
-
-    def close(self) -> None:
-        """关闭连接"""
-        if self.sftp:
+        generation = self._reconnects
+        with self._reconnect_lock:
+            # 等待期间其他线程已重连成功，直接复用新连接
+            if self._reconnects != generation and self.is_alive():
+                return True
             try:
-                self.sftp.close()
+                # 只关闭底层连接，保留在连接池中
+                self._disconnect()
+                self._connect()
+                self._reconnects += 1
+                return True
+            except Exception as e:
+                logger.error(f"重新连接失败: {str(e)}")
+                return False
+
+    def _disconnect(self) -> None:
+        """关闭SFTP会话和SSH连接"""
+        with self._channel_lock:
+            sftp_clients = list(self._idle_sftp)
+            self._idle_sftp = []
+        if self.sftp and self.sftp not in sftp_clients:
+            sftp_clients.append(self.sftp)
+        for sftp in sftp_clients:
+            try:
+                sftp.close()
             except Exception as e:
                 logger.warning(f"关闭SFTP连接时出错: {str(e)}")
-            finally:
-                self.sftp = None
+        self.sftp = None
 
         if self.client:
             try:
@@ -151,11 +296,13 @@ class SSHClient:
                 logger.warning(f"关闭SSH连接时出错: {str(e)}")
             finally:
                 self.client = None
+
+    def close(self) -> None:
+        """关闭连接"""
+        self._disconnect()
         # 从连接池中移除
         conn_key = f"{self.username}@{self.host}:{self.port}"
-        with self._lock:
-            if conn_key in self._connections:
-                del self._connections[conn_key]
+        self._pool.discard(conn_key, self)
 
         logger.info(f"已关闭与服务器 {self.username}@{self.host}:{self.port} 的连接")
 
@@ -172,11 +319,20 @@ class SSHClient:
             self.reconnect()
 
         try:
-            stdin, stdout, stderr = self.client.exec_command(command, timeout=timeout)
-            exit_status = stdout.channel.recv_exit_status()
-            output = stdout.read().decode('utf-8')
-            error = stderr.read().decode('utf-8')
-
+            stdout_chunks, stderr_chunks = [], []
+            exit_status = -1
+            # 边执行边读取输出，避免输出超过通道窗口时阻塞
+            for stream, data in self.stream_command(command, timeout):
+                if stream == 'stdout':
+                    stdout_chunks.append(data)
+                elif stream == 'stderr':
+                    stderr_chunks.append(data)
+                elif stream == 'exit':
+                    exit_status = data
+            output = b''.join(stdout_chunks).decode('utf-8')
+            error = b''.join(stderr_chunks).decode('utf-8')
+
+            self.mark_used()
             if exit_status != 0:
                 logger.warning(f"命令执行返回非零状态: {exit_status}, 错误: {error}")
             else:
@@ -188,6 +344,78 @@ class SSHClient:
             logger.error(f"执行命令失败: {str(e)}")
             return "", str(e), -1
 
+    def stream_command(
+            self, command: str, timeout: Optional[int] = 60,
+            max_bytes: Optional[int] = None, chunk_size: int = 32768, stdin: Optional[bytes] = None,
+            limited: bool = True
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        流式执行远程命令，按到达顺序交替产出标准输出和标准错误
+        通道窗口由paramiko控制，调用方读取变慢时远端会被限流，内存占用有上限
+        :param command: 要执行的命令
+        :param timeout: 命令超时时间（秒），None表示不限制
+        :param max_bytes: 输出总字节数上限，超过后截断并关闭通道
+        :param chunk_size: 每次读取的最大字节数
+        :param stdin: 写入远程标准输入的数据，与读取输出交替进行，写完后关闭标准输入
+        :param limited: 是否占用通道名额，长时间运行的后台任务传False并由调用方限制数量
+        :return: 生成器，产出 ('stdout', bytes)、('stderr', bytes)、('truncated', 字节数)，最后产出 ('exit', 退出码)
+        """
+        with self.channel_slot(limited):
+            channel = self.client.get_transport().open_session(timeout=self.timeout)
+            try:
+                channel.exec_command(command)
+                pending = memoryview(stdin or b'')
+                if not pending:
+                    channel.shutdown_write()
+                deadline = time.monotonic() + timeout if timeout else None
+                total = 0
+                while True:
+                    received = False
+                    # 只在发送窗口可用时写入，避免远端输出填满窗口时双方互相等待
+                    if pending and channel.exit_status_ready():
+                        # 远端已退出，未读取的输入直接丢弃
+                        pending = memoryview(b'')
+                    elif pending and channel.send_ready():
+                        pending = pending[channel.send(pending[:chunk_size]):]
+                        received = True
+                        if not pending:
+                            channel.shutdown_write()
+                    for stream, ready, recv in (
+                            ('stdout', channel.recv_ready, channel.recv),
+                            ('stderr', channel.recv_stderr_ready, channel.recv_stderr)
+                    ):
+                        if not ready():
+                            continue
+                        data = recv(chunk_size)
+                        if not data:
+                            continue
+                        received = True
+                        if max_bytes is not None and total + len(data) > max_bytes:
+                            yield stream, data[:max_bytes - total]
+                            yield 'truncated', max_bytes
+                            logger.warning(f"命令输出超过{max_bytes}字节，已截断: '{command}'")
+                            yield 'exit', -1
+                            return
+                        total += len(data)
+                        yield stream, data
+
+                    if received:
+                        continue
+                    if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                        break
+                    if deadline is not None and time.monotonic() > deadline:
+                        logger.warning(f"命令执行超时: '{command}'")
+                        yield 'stderr', f"命令执行超时({timeout}秒)".encode('utf-8')
+                        yield 'exit', -1
+                        return
+                    # 等待任一输出流有数据或通道关闭
+                    select.select([channel], [], [], 0.5)
+
+                self.mark_used()
+                yield 'exit', channel.recv_exit_status()
+            finally:
+                channel.close()
+
     def __enter__(self):
         """支持上下文管理器"""
         return self
@@ -196,6 +424,35 @@ class SSHClient:
         """退出上下文时关闭连接"""
         self.close()
 
+    @classmethod
+    def pool_stats(cls) -> dict:
+        """
+        获取连接池指标，包含所有连接的元数据缓存命中情况
+        :return: 指标字典
+        """
+        data = cls._pool.stats()
+        metadata = {'hits': 0, 'misses': 0, 'size': 0}
+        for conn in cls._pool.connections():
+            conn_stats = conn.metadata.stats()
+            for key in metadata:
+                metadata[key] += conn_stats[key]
+        lookups = metadata['hits'] + metadata['misses']
+        metadata['hit_rate'] = round(metadata['hits'] / lookups, 4) if lookups else 0.0
+        data['metadata_cache'] = metadata
+        return data
+
+    @classmethod
+    def invalidate_metadata(cls, conn_key: str, path: str, recursive: bool = False) -> None:
+        """
+        使连接池中该连接的元数据缓存失效，供不经过该连接的写入（如asyncssh后端）调用
+        :param conn_key: 连接键 user@host:port
+        :param path: 被修改的远程路径
+        :param recursive: 是否同时使路径下所有子项失效
+        """
+        conn = cls._pool.get(conn_key)
+        if conn is not None:
+            conn.metadata.invalidate(path, recursive)
+
     @classmethod
     def test_connection(
             cls, host: str, username: str, password: str = None,
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 05:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : ssh_dispatcher.py
+# @Software: PyCharm
+# @desc    : SSH操作分发器，所有接口经由它调用连接池中的SSH操作实例，并按操作统计调用耗时
+import asyncio
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Sequence, Tuple
+from plugin.module_ssh.core.ssh_operations import SSHOperations
+from plugin.module_ssh.core.ssh_executor import ssh_executor
+from plugin.module_ssh.core.async_ssh_client import AsyncSSHOperations
+from plugin.module_ssh.core.ssh_backend import SSH_BACKEND, test_connection
+
+
+class SSHDispatcher:
+    """
+    SSH操作分发器
+    target为get_ssh_connection_details返回的 (host, username, password, port)。
+    asyncssh后端实现了的操作直接在事件循环中执行，其余操作在执行层线程池中调用连接池里的SSHOperations，
+    两种方式都复用已建立的连接和SFTP会话。
+    """
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    async def operations(target: Sequence[Any]) -> SSHOperations:
+        """
+        获取连接池中的SSHOperations实例，供需要直接持有句柄的接口使用（如流式上传、日志跟踪）
+        :param target: (host, username, password, port)
+        :return: SSHOperations实例
+        """
+        host, username, password, port = target
+        return await ssh_executor.run(
+            host, SSHOperations.from_credentials,
+            host=host,
+            username=username,
+            password=password,
+            port=port
+        )
+
+    async def call(self, target: Sequence[Any], operation: str, *args, **kwargs) -> Any:
+        """
+        执行一个SSH操作
+        :param target: (host, username, password, port)
+        :param operation: 操作名，即SSHOperations/AsyncSSHOperations的方法名
+        :return: 操作的返回值
+        """
+        host, username, password, port = target
+        start = time.perf_counter()
+        ok = False
+        try:
+            if SSH_BACKEND == 'asyncssh' and hasattr(AsyncSSHOperations, operation):
+                ssh_ops = await AsyncSSHOperations.from_credentials(host, username, password, port)
+                result = await getattr(ssh_ops, operation)(*args, **kwargs)
+            else:
+                ssh_ops = await self.operations(target)
+                result = await ssh_executor.run(host, getattr(ssh_ops, operation), *args, **kwargs)
+            ok = True
+            return result
+        finally:
+            self._record(operation, time.perf_counter() - start, ok)
+
+    async def stream(self, target: Sequence[Any], operation: str, *args, **kwargs) -> AsyncIterator[Any]:
+        """
+        执行一个返回生成器的SSH操作，返回可在事件循环中迭代的异步迭代器
+        :param target: (host, username, password, port)
+        :param operation: 操作名，即SSHOperations中的生成器方法名；调用本身在事件循环中进行，
+                          连接检查等阻塞工作必须放在生成器内部，在执行层线程中随第一次next()执行
+        :return: 异步迭代器
+        """
+        start = time.perf_counter()
+        ok = False
+        try:
+            ssh_ops = await self.operations(target)
+            items = getattr(ssh_ops, operation)(*args, **kwargs)
+            ok = True
+        finally:
+            # 只统计建立流之前的耗时，流的持续时间取决于客户端
+            self._record(operation, time.perf_counter() - start, ok)
+        return ssh_executor.iterate(target[0], items)
+
+    async def _batch_target(
+            self, target: Dict[str, Any], command: str, timeout: int,
+            limiter: asyncio.Semaphore, started: set
+    ) -> Dict[str, Any]:
+        """
+        在一台主机上执行批量命令，结果中不抛出异常
+        :param target: 包含id/host/username/password/port的目标主机
+        :param command: 要执行的命令
+        :param timeout: 命令超时时间（秒）
+        :param limiter: 批量执行的并行主机数限制
+        :param started: 远程命令已开始执行的目标（id(target)）集合
+        :return: 结果字典
+        """
+        host = target['host']
+        result = {'id': target.get('id'), 'host': host}
+        async with limiter:
+            start = time.monotonic()
+            try:
+                connection = (host, target['username'], target.get('password'), target.get('port', 22))
+                if SSH_BACKEND == 'asyncssh':
+                    ssh_ops = await AsyncSSHOperations.from_credentials(*connection)
+                    started.add(id(target))
+                    output, error, exit_code = await ssh_ops.execute_command(command, timeout)
+                else:
+                    ssh_ops = await self.operations(connection)
+
+                    def execute() -> Tuple[str, str, int]:
+                        # 在执行层线程中标记，排队等待单主机名额时取消的主机不算已开始
+                        started.add(id(target))
+                        return ssh_ops.execute_command(command, timeout)
+
+                    output, error, exit_code = await ssh_executor.run(host, execute)
+                result.update({
+                    'status': 'success' if exit_code == 0 else 'failed',
+                    'output': output, 'error': error, 'exit_code': exit_code
+                })
+            except Exception as e:
+                result.update({'status': 'error', 'output': '', 'error': str(e), 'exit_code': -1})
+            result['elapsed'] = round(time.monotonic() - start, 3)
+            self._record('execute_batch', result['elapsed'], result['status'] != 'error')
+            return result
+
+    async def batch(
+            self, targets: List[Dict[str, Any]], command: str, timeout: int = 60,
+            parallelism: int = 20, fail_fast: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        在多台主机上并行执行同一命令，按完成顺序逐个产出结果；每台主机经由执行层执行，受单主机并发限制
+        :param targets: 目标主机列表，每项包含id/host/username/password/port
+        :param command: 要执行的命令
+        :param timeout: 单台主机的命令超时时间（秒）
+        :param parallelism: 最大并行主机数
+        :param fail_fast: 为True时任一主机失败（异常或非零退出码）即停止其余主机
+        :return: 异步迭代器，产出包含id/host/status/output/error/exit_code/elapsed的结果字典；
+                 快速失败时尚未开始的主机status为cancelled，远程命令已在执行的主机status为abandoned
+        """
+        limiter = asyncio.Semaphore(max(1, parallelism))
+        started = set()
+        tasks = {
+            asyncio.ensure_future(self._batch_target(target, command, timeout, limiter, started)): target
+            for target in targets
+        }
+        pending = set(tasks)
+        try:
+            failed = False
+            while pending and not failed:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    failed = failed or (fail_fast and result['status'] != 'success')
+                    yield result
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        for task, target in tasks.items():
+            if task not in pending:
+                continue
+            if id(target) in started:
+                # 阻塞的执行通道无法中断，远程命令会继续运行到结束或超时，只是不再等待其结果
+                status, error = 'abandoned', '其他主机失败，已停止等待结果，远程命令可能仍在运行'
+            else:
+                status, error = 'cancelled', '其他主机失败，未开始执行'
+            yield {
+                'id': target.get('id'), 'host': target['host'], 'status': status,
+                'output': '', 'error': error, 'exit_code': -1, 'elapsed': 0
+            }
+
+    async def test_connection(self, target: Sequence[Any]) -> Tuple[bool, str]:
+        """
+        按当前后端测试SSH连接
+        :param target: (host, username, password, port)
+        :return: 元组 (是否成功, 错误信息)
+        """
+        host, username, password, port = target
+        start = time.perf_counter()
+        success, error = await test_connection(host=host, username=username, password=password, port=port)
+        self._record('test_connection', time.perf_counter() - start, success)
+        return success, error
+
+    def _record(self, operation: str, elapsed: float, ok: bool) -> None:
+        """记录一次调用的耗时"""
+        with self._stats_lock:
+            stats = self._stats.setdefault(operation, {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stats['calls'] += 1
+            stats['errors'] += 0 if ok else 1
+            stats['total_ms'] += elapsed * 1000
+            stats['max_ms'] = max(stats['max_ms'], elapsed * 1000)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取各操作的调用次数、失败次数和平均/最大耗时
+        :return: 操作名 -> 统计信息
+        """
+        with self._stats_lock:
+            return {
+                operation: {
+                    'calls': int(stats['calls']),
+                    'errors': int(stats['errors']),
+                    'avg_ms': round(stats['total_ms'] / stats['calls'], 2),
+                    'max_ms': round(stats['max_ms'], 2),
+                }
+                for operation, stats in sorted(self._stats.items())
+            }
+
+
+# 全局分发器
+ssh_dispatcher = SSHDispatcher()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/16 09:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : ssh_executor.py
+# @Software: PyCharm
+# @desc    : SSH执行层，将阻塞的SSH/SFTP调用放到独立线程池中执行
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+from utils.log_util import logger
+
+
+class SSHExecutor:
+    """
+    SSH执行器
+    所有paramiko调用都是阻塞的，直接在async接口中调用会卡住整个事件循环。
+    该类将调用提交到有界线程池，并对每台主机做并发限制，同时记录队列深度等指标。
+    """
+
+    def __init__(self, max_workers: int = 32, per_host_limit: int = 4):
+        """
+        初始化执行器
+        :param max_workers: 线程池最大线程数
+        :param per_host_limit: 单台主机最大并发数
+        """
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ssh-worker")
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        # 每台主机正在等待或占用名额的任务数，归零时删除该主机的信号量
+        self._host_users: Dict[str, int] = {}
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'timeout': 0,
+            'waiting': 0,
+            'running': 0,
+            'streaming': 0,
+            'pool_queue': 0,
+        }
+        self._host_waiting: Dict[str, int] = {}
+
+    def _enter_host(self, host_key: str) -> asyncio.Semaphore:
+        """
+        获取主机对应的并发信号量并登记一个使用者，用完后必须调用_leave_host
+        :param host_key: 主机标识
+        :return: 信号量
+        """
+        semaphore = self._host_semaphores.get(host_key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_limit)
+            self._host_semaphores[host_key] = semaphore
+        self._host_users[host_key] = self._host_users.get(host_key, 0) + 1
+        return semaphore
+
+    def _leave_host(self, host_key: str, release: bool = True) -> None:
+        """
+        注销一个使用者（在事件循环线程中调用），主机空闲后删除其信号量
+        :param host_key: 主机标识
+        :param release: 是否归还已获取的并发名额
+        """
+        if release:
+            self._host_semaphores[host_key].release()
+        users = self._host_users[host_key] - 1
+        if users > 0:
+            self._host_users[host_key] = users
+        else:
+            del self._host_users[host_key]
+            del self._host_semaphores[host_key]
+
+    def _leave_host_threadsafe(self, loop: asyncio.AbstractEventLoop, host_key: str) -> None:
+        """
+        从任意线程归还主机并发名额
+        :param loop: 信号量所属的事件循环
+        :param host_key: 主机标识
+        """
+        try:
+            loop.call_soon_threadsafe(self._leave_host, host_key)
+        except RuntimeError:
+            # 事件循环已关闭，信号量随之失效
+            pass
+
+    def _incr(self, name: str, value: int = 1) -> None:
+        """更新指标"""
+        with self._metrics_lock:
+            self._metrics[name] += value
+
+    def _incr_host(self, host_key: str, value: int) -> None:
+        """更新主机排队数"""
+        with self._metrics_lock:
+            self._metrics['waiting'] += value
+            waiting = self._host_waiting.get(host_key, 0) + value
+            if waiting > 0:
+                self._host_waiting[host_key] = waiting
+            else:
+                self._host_waiting.pop(host_key, None)
+
+    def _submit(self, func: Callable, *args, **kwargs) -> Future:
+        """
+        提交到线程池，记录已提交但尚未开始执行的任务数
+        :param func: 要执行的阻塞函数
+        :return: concurrent.futures.Future
+        """
+
+        def runner():
+            self._incr('pool_queue', -1)
+            self._incr('running')
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._incr('running', -1)
+
+        def on_done(done: Future) -> None:
+            # 开始执行前被取消的任务不会进入runner
+            if done.cancelled():
+                self._incr('pool_queue', -1)
+
+        self._incr('pool_queue')
+        future = self._pool.submit(runner)
+        future.add_done_callback(on_done)
+        return future
+
+    async def run(
+            self, host_key: str, func: Callable, *args,
+            wait_timeout: Optional[float] = None, **kwargs
+    ) -> Any:
+        """
+        在线程池中执行阻塞函数
+        :param host_key: 主机标识，用于单主机并发限制
+        :param func: 要执行的阻塞函数
+        :param args: 位置参数
+        :param wait_timeout: 等待超时时间（秒），超时后取消等待
+        :param kwargs: 关键字参数
+        :return: 函数返回值
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._enter_host(host_key)
+        self._incr('submitted')
+        self._incr_host(host_key, 1)
+        acquired = False
+        submitted = None
+        future = None
+        try:
+            await semaphore.acquire()
+            self._incr_host(host_key, -1)
+            acquired = True
+            submitted = self._submit(func, *args, **kwargs)
+            # 名额在线程池任务结束（完成或被取消）后才归还：超时或取消等待时阻塞调用仍在执行，继续占用名额
+            submitted.add_done_callback(lambda _: self._leave_host_threadsafe(loop, host_key))
+            future = asyncio.wrap_future(submitted)
+            result = await asyncio.wait_for(future, timeout=wait_timeout)
+            self._incr('completed')
+            return result
+        except asyncio.TimeoutError:
+            self._incr('timeout')
+            logger.warning(f"SSH任务执行超时: {host_key}, {getattr(func, '__name__', func)}")
+            raise
+        except asyncio.CancelledError:
+            # 尚未开始执行的任务会从线程池队列中移除；已在执行的阻塞调用无法中断，只放弃等待结果
+            self._incr('cancelled')
+            if future is not None:
+                future.cancel()
+            raise
+        except Exception:
+            self._incr('failed')
+            raise
+        finally:
+            if not acquired:
+                # 在获取信号量之前被取消，任务从未进入线程池
+                self._incr_host(host_key, -1)
+                self._leave_host(host_key, release=False)
+            elif submitted is None:
+                # 线程池已关闭，提交失败
+                self._leave_host(host_key)
+
+    async def iterate(self, host_key: str, iterator: Iterator) -> AsyncIterator:
+        """
+        在线程池中逐个拉取阻塞迭代器的元素，转换为异步迭代器
+        整个迭代期间占用该主机的一个并发名额，直到迭代器在线程池中关闭后才归还
+        :param host_key: 主机标识，用于单主机并发限制
+        :param iterator: 阻塞迭代器（如SSHClient.stream_command返回的生成器）
+        :return: 异步迭代器
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._enter_host(host_key)
+        sentinel = object()
+        self._incr('submitted')
+        self._incr_host(host_key, 1)
+        acquired = False
+        try:
+            await semaphore.acquire()
+            self._incr_host(host_key, -1)
+            acquired = True
+            self._incr('streaming')
+            pending = None
+            try:
+                while True:
+                    pending = self._submit(next, iterator, sentinel)
+                    item = await asyncio.wrap_future(pending)
+                    if item is sentinel:
+                        break
+                    yield item
+                self._incr('completed')
+            except (asyncio.CancelledError, GeneratorExit):
+                self._incr('cancelled')
+                raise
+            except Exception:
+                self._incr('failed')
+                raise
+            finally:
+                self._incr('streaming', -1)
+                await self._close_iterator(
+                    iterator, pending, lambda: self._leave_host_threadsafe(loop, host_key)
+                )
+        finally:
+            if not acquired:
+                self._incr_host(host_key, -1)
+                self._leave_host(host_key, release=False)
+
+    async def _close_iterator(
+            self, iterator: Iterator, pending: Optional[Future], on_closed: Callable[[], None]
+    ) -> None:
+        """
+        关闭阻塞迭代器。取消时工作线程可能仍在执行next()，此时直接close会抛出"generator already executing"，
+        生成器及其占用的通道要等到被垃圾回收才释放，因此先等待这次next()返回再关闭
+        :param iterator: 阻塞迭代器
+        :param pending: 最近一次提交的next()任务
+        :param on_closed: 迭代器关闭后调用（任意线程），用于归还并发名额
+        """
+        close = getattr(iterator, 'close', None)
+
+        def close_quietly(_=None) -> None:
+            try:
+                if close is not None:
+                    close()
+            except Exception as e:
+                logger.warning(f"关闭SSH迭代器失败: {str(e)}")
+            finally:
+                on_closed()
+
+        if pending is not None and not pending.done():
+            try:
+                # asyncio.wait不会因next()任务被取消而抛出异常，只在当前任务再次被取消时抛出
+                await asyncio.wait([asyncio.wrap_future(pending)])
+            except asyncio.CancelledError:
+                # 不再等待，由执行next()的工作线程在其返回后关闭
+                pending.add_done_callback(close_quietly)
+                raise
+        if close is None:
+            on_closed()
+            return
+        try:
+            closing = self._submit(close_quietly)
+        except RuntimeError:
+            # 线程池已关闭，直接在当前线程关闭
+            close_quietly()
+            return
+        # 关闭任务开始前被取消时不会执行close_quietly，同样要归还名额
+        closing.add_done_callback(lambda done: on_closed() if done.cancelled() else None)
+        # 当前任务被取消时不取消关闭任务，迭代器仍会在线程池中关闭
+        await asyncio.shield(asyncio.wrap_future(closing))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取执行器指标
+        :return: 指标字典
+        """
+        with self._metrics_lock:
+            data = dict(self._metrics)
+            data['host_waiting'] = dict(self._host_waiting)
+        data['max_workers'] = self.max_workers
+        data['per_host_limit'] = self.per_host_limit
+        data['timestamp'] = time.time()
+        return data
+
+    def shutdown(self, wait: bool = False) -> None:
+        """关闭线程池"""
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+# 全局执行器实例
+ssh_executor = SSHExecutor()
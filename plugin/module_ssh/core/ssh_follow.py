@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 03:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : ssh_follow.py
+# @Software: PyCharm
+# @desc    : 远程日志跟踪，同一文件只保持一个tail -F通道，追加的内容分发给所有订阅者
+import asyncio
+import select
+import shlex
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+from utils.log_util import logger
+
+# 每个订阅者最多缓存的消息数，写满后丢弃新数据并在恢复后通知丢弃的字节数
+FOLLOW_QUEUE_SIZE = 256
+# 最后一个订阅者离开后保持远程tail的秒数，期间重新订阅可直接复用
+FOLLOW_LINGER = 10
+# 单个连接上最多同时跟踪的文件数（跟踪通道不占用SSHClient的通道名额）
+MAX_FOLLOWERS_PER_CONNECTION = 8
+# 单次读取的最大字节数
+FOLLOW_READ_SIZE = 32768
+# tail -F在文件被截断或替换时输出到标准错误的提示
+FOLLOW_RESET_MARKERS = ('file truncated', 'has been replaced', 'has appeared')
+
+
+class FollowSubscriber:
+    """单个订阅者，消息通过所在事件循环的有界队列传递"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue_size: int = FOLLOW_QUEUE_SIZE):
+        """
+        初始化订阅者
+        :param loop: 订阅者所在的事件循环
+        :param queue_size: 队列长度
+        """
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, kind: str, data: Any) -> None:
+        """
+        投递消息（在订阅者的事件循环中调用），队列将满时丢弃数据而不是阻塞远程读取；
+        预留的位置保证丢弃通知和结束消息总能送达
+        :param kind: data/event/end
+        :param data: 消息内容
+        """
+        if kind == 'end':
+            if self.queue.full():
+                self.queue.get_nowait()
+            self.queue.put_nowait((kind, data))
+            return
+        if self.queue.qsize() >= self.queue.maxsize - 2:
+            if kind == 'data':
+                self.dropped += len(data)
+            return
+        if self.dropped:
+            self.queue.put_nowait(('dropped', self.dropped))
+            self.dropped = 0
+        self.queue.put_nowait((kind, data))
+
+
+class LogFollower:
+    """跟踪单个远程文件：后台线程读取tail -F的输出并分发给订阅者"""
+
+    def __init__(self, ssh_ops, remote_path: str, offset: int):
+        """
+        初始化跟踪器
+        :param ssh_ops: SSHOperations实例
+        :param remote_path: 远程文件路径
+        :param offset: 开始跟踪的字节偏移（通常为当前文件大小）
+        """
+        self.ssh_ops = ssh_ops
+        self.remote_path = remote_path
+        self.key = (ssh_ops.conn_key, remote_path)
+        # 已分发内容在文件中的结束位置，与订阅者集合在同一把锁下修改，新订阅者据此读取快照
+        self.position = offset
+        self.subscribers: List[FollowSubscriber] = []
+        self.started_at = time.time()
+        self.idle_since = time.monotonic()
+        self.bytes_read = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        # 后台线程决定退出后置位（与订阅者集合在同一把锁下），之后不再接受新订阅者
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, args=(offset,), name=f"ssh-follow-{remote_path}", daemon=True
+        )
+
+    def start(self) -> None:
+        """启动后台读取线程"""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """请求停止跟踪，后台线程会在下一次轮询时关闭通道"""
+        self._stopping.set()
+
+    def subscribe(self, subscriber: FollowSubscriber) -> Optional[int]:
+        """
+        加入订阅者
+        :param subscriber: 订阅者
+        :return: 加入时已分发内容的结束位置，订阅者之后收到的数据都从这里开始；跟踪器已结束或正在停止时返回None
+        """
+        with self._lock:
+            if self._closed or self._stopping.is_set():
+                return None
+            self.subscribers.append(subscriber)
+            return self.position
+
+    def unsubscribe(self, subscriber: FollowSubscriber) -> None:
+        """
+        移除订阅者，最后一个订阅者离开后开始计算空闲时间
+        :param subscriber: 订阅者
+        """
+        with self._lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            if not self.subscribers:
+                self.idle_since = time.monotonic()
+
+    def _publish(self, kind: str, data: Any, reset: bool = False) -> None:
+        """
+        向所有订阅者分发消息
+        :param kind: data/event/end
+        :param data: 消息内容
+        :param reset: 文件被截断或替换，之后的数据从新文件开头开始
+        """
+        with self._lock:
+            if reset:
+                self.position = 0
+            if kind == 'data':
+                self.position += len(data)
+                self.bytes_read += len(data)
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, kind, data)
+            except RuntimeError:
+                # 订阅者的事件循环已关闭
+                self.unsubscribe(subscriber)
+
+    def _close_if_idle(self) -> bool:
+        """没有订阅者且超过保持时间时标记为已结束，判断和标记在同一把锁下，不会与新订阅者交错"""
+        with self._lock:
+            if not self.subscribers and time.monotonic() - self.idle_since > FOLLOW_LINGER:
+                self._closed = True
+            return self._closed
+
+    def _close(self) -> None:
+        """标记为已结束，之后的订阅由注册表启动新的跟踪器"""
+        with self._lock:
+            self._closed = True
+
+    def _run(self, offset: int) -> None:
+        """后台线程：读取tail -F的输出直到被停止、空闲超时或远程命令退出"""
+        command = f"tail -F -c +{offset + 1} {shlex.quote(self.remote_path)}"
+        reason = "已停止"
+        try:
+            with self.ssh_ops.ssh_client.exec_channel(command, limited=False) as channel:
+                while not self._stopping.is_set():
+                    # 先处理标准错误：截断提示先于新文件内容输出，据此重置位置
+                    if channel.recv_stderr_ready():
+                        message = channel.recv_stderr(FOLLOW_READ_SIZE).decode('utf-8', errors='replace').strip()
+                        if message:
+                            reset = any(marker in message for marker in FOLLOW_RESET_MARKERS)
+                            self._publish('event', message, reset=reset)
+                        continue
+                    if channel.recv_ready():
+                        data = channel.recv(FOLLOW_READ_SIZE)
+                        if data:
+                            self._publish('data', data)
+                        continue
+                    if channel.exit_status_ready():
+                        reason = f"远程tail已退出({channel.recv_exit_status()})"
+                        break
+                    if self._close_if_idle():
+                        reason = "没有订阅者"
+                        break
+                    select.select([channel], [], [], 0.5)
+        except Exception as e:
+            reason = f"跟踪失败: {str(e)}"
+            logger.error(f"跟踪远程文件失败: {self.remote_path}, {str(e)}")
+        finally:
+            # 先标记结束再从注册表移除，标记之前加入的订阅者都会收到结束消息
+            self._close()
+            log_followers.remove(self)
+            self._publish('end', reason)
+            logger.info(f"停止跟踪远程文件: {self.remote_path}, {reason}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取跟踪器信息
+        :return: 信息字典
+        """
+        with self._lock:
+            return {
+                'connection': self.key[0],
+                'path': self.remote_path,
+                'subscribers': len(self.subscribers),
+                'position': self.position,
+                'bytes_read': self.bytes_read,
+                'started_at': self.started_at,
+            }
+
+
+class FollowerRegistry:
+    """按(连接键, 文件路径)管理跟踪器，同一文件的多个订阅者共享一个远程tail"""
+
+    def __init__(self, max_per_connection: int = MAX_FOLLOWERS_PER_CONNECTION):
+        """
+        初始化注册表
+        :param max_per_connection: 单个连接上最多同时跟踪的文件数
+        """
+        self.max_per_connection = max_per_connection
+        self._followers: Dict[Tuple[str, str], LogFollower] = {}
+        # 正在读取文件大小、尚未发布的键，同一文件的并发订阅者等待其结果
+        self._pending: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(
+            self, ssh_ops, remote_path: str, subscriber: FollowSubscriber
+    ) -> Tuple[LogFollower, int]:
+        """
+        订阅远程文件（阻塞调用，需在线程中执行），文件尚未被跟踪时从当前末尾开始启动远程tail
+        :param ssh_ops: SSHOperations实例
+        :param remote_path: 远程文件路径
+        :param subscriber: 订阅者
+        :return: (跟踪器, 订阅开始位置)
+        """
+        key = (ssh_ops.conn_key, remote_path)
+        while True:
+            owner = False
+            with self._lock:
+                follower = self._followers.get(key)
+                if follower is not None:
+                    position = follower.subscribe(subscriber)
+                    if position is not None:
+                        return follower, position
+                    # 跟踪器已决定退出但尚未从注册表移除，改为启动新的跟踪器
+                    del self._followers[key]
+                pending = self._pending.get(key)
+                if pending is None:
+                    # 预占的键也计入连接上限，并发订阅不同文件时不会超出
+                    in_use = sum(1 for conn_key, _ in self._followers if conn_key == key[0])
+                    in_use += sum(1 for conn_key, _ in self._pending if conn_key == key[0])
+                    if in_use >= self.max_per_connection:
+                        raise RuntimeError(f"同一服务器最多同时跟踪{self.max_per_connection}个文件")
+                    pending = Future()
+                    self._pending[key] = pending
+                    owner = True
+
+            if not owner:
+                # 其他线程正在启动同一文件的跟踪器，等待完成后重新订阅（失败时抛出同样的异常）
+                pending.result()
+                continue
+
+            # 在锁外读取文件大小，慢连接不会阻塞其他连接的订阅与stats
+            try:
+                with ssh_ops.ssh_client.sftp_channel() as sftp:
+                    size = sftp.stat(remote_path).st_size
+                follower = LogFollower(ssh_ops, remote_path, size)
+                # 先订阅再启动，新跟踪器不会在第一个订阅者加入前因空闲而退出
+                position = follower.subscribe(subscriber)
+            except BaseException as e:
+                with self._lock:
+                    self._pending.pop(key, None)
+                pending.set_exception(e)
+                raise
+
+            with self._lock:
+                self._followers[key] = follower
+                self._pending.pop(key, None)
+            follower.start()
+            pending.set_result(follower)
+            logger.info(f"开始跟踪远程文件: {ssh_ops.conn_key}:{remote_path}")
+            return follower, position
+
+    def remove(self, follower: LogFollower) -> None:
+        """
+        移除已结束的跟踪器
+        :param follower: 跟踪器
+        """
+        with self._lock:
+            if self._followers.get(follower.key) is follower:
+                del self._followers[follower.key]
+
+    def stop_all(self) -> None:
+        """停止所有跟踪器"""
+        with self._lock:
+            followers = list(self._followers.values())
+        for follower in followers:
+            follower.stop()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """
+        获取所有跟踪器信息
+        :return: 信息列表
+        """
+        with self._lock:
+            followers = list(self._followers.values())
+        return [follower.stats() for follower in followers]
+
+
+# 全局跟踪器注册表
+log_followers = FollowerRegistry()
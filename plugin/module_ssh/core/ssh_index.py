@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 01:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : ssh_index.py
+# @Software: PyCharm
+# @desc    : 远程文件路径索引，由服务端find构建并增量刷新，重复搜索直接在内存中完成
+import fnmatch
+import posixpath
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+from plugin.module_ssh.core.ssh_cache import TTLCache
+
+
+def match_entry(entry: Dict[str, Any], predicates: Dict[str, Any]) -> bool:
+    """
+    判断条目是否满足搜索条件，条件含义与SSHOperations.search_files的参数一致
+    :param entry: {'path', 'type', 'size', 'mtime'}
+    :param predicates: 搜索条件
+    :return: 满足返回True
+    """
+    name = predicates.get('name')
+    if name:
+        basename = posixpath.basename(entry['path'])
+        if predicates.get('ignore_case'):
+            if not fnmatch.fnmatchcase(basename.lower(), name.lower()):
+                return False
+        elif not fnmatch.fnmatchcase(basename, name):
+            return False
+    if predicates.get('file_type') and entry['type'] != predicates['file_type']:
+        return False
+    if predicates.get('min_size') is not None and entry['size'] < predicates['min_size']:
+        return False
+    if predicates.get('max_size') is not None and entry['size'] > predicates['max_size']:
+        return False
+    if predicates.get('modified_after') is not None and entry['mtime'] <= predicates['modified_after']:
+        return False
+    if predicates.get('modified_before') is not None and entry['mtime'] > predicates['modified_before']:
+        return False
+    return True
+
+
+class RemotePathIndex:
+    """单个主机上某个根目录的路径索引"""
+
+    def __init__(self, root: str):
+        """
+        初始化路径索引
+        :param root: 索引的根目录
+        """
+        self.root = root
+        # 路径 -> {'path', 'type', 'size', 'mtime'}
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        # 最近一次扫描开始时的远程时间，增量刷新只查找此后修改过的条目
+        self.scanned_at: Optional[float] = None
+        self.refreshed_at = 0.0
+        self.lock = threading.Lock()
+
+    def age(self) -> float:
+        """距离最近一次刷新的秒数"""
+        return time.monotonic() - self.refreshed_at
+
+    def replace(self, entries: Iterable[Dict[str, Any]], scanned_at: float) -> None:
+        """
+        用全量扫描结果替换索引
+        :param entries: 条目
+        :param scanned_at: 扫描开始时的远程时间
+        """
+        self.entries = {entry['path']: entry for entry in entries}
+        self.scanned_at = scanned_at
+        self.refreshed_at = time.monotonic()
+
+    def update(self, entries: Iterable[Dict[str, Any]]) -> None:
+        """
+        写入新增或修改的条目
+        :param entries: 条目
+        """
+        for entry in entries:
+            self.entries[entry['path']] = entry
+
+    def children(self, directory: str) -> Set[str]:
+        """
+        获取索引中目录的直接子项
+        :param directory: 目录路径
+        :return: 子项路径集合
+        """
+        prefix = directory.rstrip('/') + '/'
+        return {path for path in self.entries if path.startswith(prefix) and '/' not in path[len(prefix):]}
+
+    def remove_tree(self, path: str) -> None:
+        """
+        删除路径及其下所有条目
+        :param path: 路径
+        """
+        prefix = path.rstrip('/') + '/'
+        for key in [key for key in self.entries if key == path or key.startswith(prefix)]:
+            del self.entries[key]
+
+    def mark_refreshed(self, scanned_at: float) -> None:
+        """
+        记录一次增量刷新
+        :param scanned_at: 刷新开始时的远程时间
+        """
+        self.scanned_at = scanned_at
+        self.refreshed_at = time.monotonic()
+
+    def search(self, predicates: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        在索引中搜索
+        :param predicates: 搜索条件
+        :return: 生成器，按路径顺序产出满足条件的条目
+        """
+        max_depth = predicates.get('max_depth')
+        base_depth = self.root.rstrip('/').count('/')
+        for path in sorted(self.entries):
+            entry = self.entries[path]
+            if max_depth is not None and path.count('/') - base_depth > max_depth:
+                continue
+            if match_entry(entry, predicates):
+                yield entry
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取索引信息
+        :return: 信息字典
+        """
+        return {'root': self.root, 'entries': len(self.entries), 'age': round(self.age(), 1)}
+
+
+# 按(连接键, 根目录)保存的路径索引，长时间未使用的索引自动淘汰
+path_indexes = TTLCache(max_size=32, ttl=3600)
+_indexes_lock = threading.Lock()
+
+
+def get_path_index(conn_key: str, root: str) -> RemotePathIndex:
+    """
+    获取或创建路径索引（新建的索引为空，由调用方构建）
+    :param conn_key: 连接键
+    :param root: 根目录
+    :return: RemotePathIndex
+    """
+    with _indexes_lock:
+        index = path_indexes.get((conn_key, root))
+        if index is None:
+            index = RemotePathIndex(root)
+        # 每次使用都重新写入以延长保留时间
+        path_indexes.set((conn_key, root), index)
+        return index
+
+
+def list_path_indexes() -> List[Dict[str, Any]]:
+    """
+    列出当前内存中的路径索引
+    :return: 索引信息列表
+    """
+    result = []
+    for key, index in path_indexes.items():
+        info = index.stats()
+        info['connection'] = key[0]
+        result.append(info)
+    return result
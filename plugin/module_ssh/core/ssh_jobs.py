@@ -0,0 +1,560 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 09:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : ssh_jobs.py
+# @Software: PyCharm
+# @desc    : 后台任务队列，长时间运行的远程命令/脚本提交后立即返回任务ID，输出写入本地磁盘
+import json
+import os
+import shlex
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+from utils.log_util import logger
+from plugin.module_ssh.core.ssh_operations import SSHOperations
+
+# 任务输出目录，可通过环境变量SSH_JOB_SPOOL_DIR修改
+JOB_SPOOL_DIR = os.environ.get(
+    'SSH_JOB_SPOOL_DIR', os.path.join(os.path.expanduser('~'), '.ssh_job_spool')
+)
+# 同时运行的任务总数（每个运行中的任务占用一个线程）
+MAX_RUNNING_JOBS = 64
+# 单个连接上同时运行的任务数（任务通道不占用SSHClient的通道名额）
+PER_HOST_JOB_LIMIT = 4
+# 排队任务数上限
+MAX_QUEUED_JOBS = 1000
+# 单个任务保存的标准输出/标准错误各自的字节数上限，超过后只计数
+JOB_OUTPUT_MAX_BYTES = 256 * 1024 * 1024
+# 任务结束后保留结果的默认秒数
+JOB_RETENTION = 86400
+# 发送SIGTERM后等待多少秒仍未退出则发送SIGKILL
+JOB_KILL_GRACE = 10
+# 清理过期结果的间隔（秒）
+JOB_REAP_INTERVAL = 60
+# 读写任务目录（本地磁盘）时使用的执行层主机标识，与SSH操作的单主机并发名额分开
+JOB_IO_KEY = 'local:ssh_job_spool'
+# 标准输出中进程组ID行的前缀；登录shell可能先输出其他内容，按前缀查找而不是取第一行
+JOB_PGID_MARKER = b'__PGID__'
+# 查找进程组ID行时最多缓存的输出字节数，超过后放弃查找，输出照常保存
+JOB_HEADER_MAX_BYTES = 64 * 1024
+
+# 任务状态：queued/running为未结束状态，其余为结束状态
+JOB_ACTIVE_STATES = ('queued', 'running')
+
+
+class SSHJob:
+    """单个后台任务，对外信息保存在任务目录的job.json中（不含密码和脚本内容）"""
+
+    def __init__(
+            self, target: Sequence[Any], command: str, ssh_id: Any = None, kind: str = 'command',
+            stdin: Optional[bytes] = None, timeout: Optional[int] = None, retention: int = JOB_RETENTION,
+            job_id: Optional[str] = None
+    ):
+        """
+        初始化任务
+        :param target: (host, username, password, port)
+        :param command: 远程命令（脚本任务为解释器命令，脚本内容通过标准输入传入）
+        :param ssh_id: SSH服务器ID
+        :param kind: command/script
+        :param stdin: 写入远程标准输入的内容
+        :param timeout: 超时时间（秒），None表示不限制
+        :param retention: 结束后保留结果的秒数
+        :param job_id: 任务ID，为空时自动生成
+        """
+        self.job_id = job_id or uuid.uuid4().hex
+        self.target = tuple(target) if target else None
+        self.command = command
+        self.ssh_id = ssh_id
+        self.kind = kind
+        self.stdin = stdin
+        self.timeout = timeout
+        self.retention = retention
+        self.conn_key = f"{target[1]}@{target[0]}:{target[3]}" if target else ''
+        self.status = 'queued'
+        self.exit_code: Optional[int] = None
+        self.error: Optional[str] = None
+        # 远程进程组ID，取消时向整个进程组发送信号
+        self.pgid: Optional[int] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.output_bytes = {'stdout': 0, 'stderr': 0}
+        self.truncated = {'stdout': 0, 'stderr': 0}
+        # 取消或超时的原因（cancelled/timeout），任务结束时作为最终状态
+        self.stop_reason: Optional[str] = None
+        # 运行时使用的SSHOperations实例，取消时用它发送信号
+        self.ssh_ops: Optional[SSHOperations] = None
+        # 已被删除的任务不再写入job.json，避免任务线程结束时重新创建已删除的目录
+        self.removed = False
+        self._save_lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        """任务是否已结束"""
+        return self.status not in JOB_ACTIVE_STATES
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        获取任务信息
+        :return: 信息字典
+        """
+        now = self.finished_at or time.time()
+        return {
+            'job_id': self.job_id,
+            'ssh_id': self.ssh_id,
+            'connection': self.conn_key,
+            'kind': self.kind,
+            'command': self.command,
+            'status': self.status,
+            'exit_code': self.exit_code,
+            'error': self.error,
+            'pgid': self.pgid,
+            'timeout': self.timeout,
+            'retention': self.retention,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed': round(now - self.started_at, 3) if self.started_at else None,
+            'stdout_bytes': self.output_bytes['stdout'],
+            'stderr_bytes': self.output_bytes['stderr'],
+            'truncated': dict(self.truncated),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SSHJob':
+        """
+        从job.json恢复任务信息（进程重启后只用于查询结果）
+        :param data: 信息字典
+        :return: SSHJob
+        """
+        job = cls(None, data['command'], data.get('ssh_id'), data.get('kind', 'command'),
+                  timeout=data.get('timeout'), retention=data.get('retention', JOB_RETENTION), job_id=data['job_id'])
+        job.conn_key = data.get('connection', '')
+        job.status = data['status']
+        job.exit_code = data.get('exit_code')
+        job.error = data.get('error')
+        job.pgid = data.get('pgid')
+        job.submitted_at = data.get('submitted_at', job.submitted_at)
+        job.started_at = data.get('started_at')
+        job.finished_at = data.get('finished_at')
+        job.output_bytes = {'stdout': data.get('stdout_bytes', 0), 'stderr': data.get('stderr_bytes', 0)}
+        job.truncated = data.get('truncated') or {'stdout': 0, 'stderr': 0}
+        return job
+
+
+class SSHJobManager:
+    """
+    后台任务调度器
+    任务按提交顺序排队，全局和单个连接的运行数都有上限，某台主机满载时不影响其他主机的任务启动；
+    每个运行中的任务在独立线程中读取远程输出并写入任务目录，不占用执行层线程池
+    """
+
+    def __init__(
+            self, spool_dir: str = JOB_SPOOL_DIR, max_running: int = MAX_RUNNING_JOBS,
+            per_host_limit: int = PER_HOST_JOB_LIMIT, max_queued: int = MAX_QUEUED_JOBS
+    ):
+        """
+        初始化调度器
+        :param spool_dir: 任务输出目录
+        :param max_running: 同时运行的任务总数
+        :param per_host_limit: 单个连接上同时运行的任务数
+        :param max_queued: 排队任务数上限
+        """
+        self.spool_dir = spool_dir
+        self.max_running = max_running
+        self.per_host_limit = per_host_limit
+        self.max_queued = max_queued
+        self._jobs: Dict[str, SSHJob] = {}
+        self._queue: Deque[SSHJob] = deque()
+        self._running: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._reaper = None
+        self._timers: Dict[str, threading.Timer] = {}
+
+    def _ensure_started(self) -> None:
+        """按需加载已有的任务记录并启动线程池和清理线程"""
+        if self._pool is not None:
+            return
+        with self._lock:
+            if self._pool is not None:
+                return
+            self._load()
+            self._pool = ThreadPoolExecutor(max_workers=self.max_running, thread_name_prefix="ssh-job")
+            self._reaper = threading.Thread(target=self._reap_loop, name="ssh-job-reaper", daemon=True)
+            self._reaper.start()
+
+    def _load(self) -> None:
+        """读取任务目录中的记录，上次进程退出时未结束的任务标记为interrupted"""
+        if not os.path.isdir(self.spool_dir):
+            return
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name, 'job.json')
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    job = SSHJob.from_dict(json.load(f))
+            except Exception as e:
+                logger.warning(f"任务记录损坏，已忽略: {path}, {str(e)}")
+                continue
+            if not job.finished:
+                # 任务线程在执行远程命令之前先保存running状态，仍为queued的任务从未执行
+                if job.status == 'queued':
+                    job.error = "服务重启时任务仍在排队，未执行"
+                else:
+                    job.error = "服务重启时任务未结束，远程进程可能仍在运行"
+                job.status = 'interrupted'
+                job.finished_at = time.time()
+                self._save(job)
+            self._jobs[job.job_id] = job
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.spool_dir, job_id)
+
+    def _output_path(self, job_id: str, stream: str) -> str:
+        return os.path.join(self._job_dir(job_id), f"{stream}.log")
+
+    def _save(self, job: SSHJob) -> None:
+        """保存任务信息（先写临时文件再替换），已删除的任务不再保存"""
+        path = os.path.join(self._job_dir(job.job_id), 'job.json')
+        with job._save_lock:
+            if job.removed:
+                return
+            try:
+                os.makedirs(self._job_dir(job.job_id), exist_ok=True)
+                with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                    json.dump(job.to_dict(), f, ensure_ascii=False)
+                os.replace(f"{path}.tmp", path)
+            except Exception as e:
+                logger.warning(f"保存任务记录失败: {job.job_id}, {str(e)}")
+
+    def submit(
+            self, target: Sequence[Any], command: str, ssh_id: Any = None, kind: str = 'command',
+            stdin: Optional[bytes] = None, timeout: Optional[int] = None, retention: int = JOB_RETENTION
+    ) -> SSHJob:
+        """
+        提交任务，立即返回（写入任务目录，需在线程中执行）
+        :param target: (host, username, password, port)
+        :param command: 远程命令
+        :param ssh_id: SSH服务器ID
+        :param kind: command/script
+        :param stdin: 写入远程标准输入的内容
+        :param timeout: 超时时间（秒），None表示不限制
+        :param retention: 结束后保留结果的秒数
+        :return: SSHJob
+        """
+        self._ensure_started()
+        job = SSHJob(target, command, ssh_id, kind, stdin, timeout, retention)
+        with self._lock:
+            if len(self._queue) >= self.max_queued:
+                raise RuntimeError(f"排队任务已达上限({self.max_queued})")
+            self._jobs[job.job_id] = job
+            self._queue.append(job)
+        self._save(job)
+        logger.info(f"提交后台任务: {job.conn_key} {job.job_id}")
+        self._dispatch()
+        return job
+
+    def _dispatch(self) -> None:
+        """按提交顺序启动未超过并发上限的任务"""
+        with self._lock:
+            total = sum(self._running.values())
+            for job in list(self._queue):
+                if total >= self.max_running:
+                    break
+                if self._running.get(job.conn_key, 0) >= self.per_host_limit:
+                    continue
+                self._queue.remove(job)
+                self._running[job.conn_key] = self._running.get(job.conn_key, 0) + 1
+                total += 1
+                job.status = 'running'
+                job.started_at = time.time()
+                self._pool.submit(self._run, job)
+
+    @staticmethod
+    def wrap_command(command: str) -> str:
+        """
+        将命令包装为在独立会话（进程组）中运行，并先在标准输出打印一行"__PGID__进程组ID"；
+        远程没有支持-w的setsid时直接运行，打印的是命令进程的ID，取消时只能终止该进程
+        :param command: 原始命令
+        :return: 包装后的命令
+        """
+        marker = JOB_PGID_MARKER.decode()
+        inner = f"'echo {marker}$$; exec sh -c \"$1\"' job {shlex.quote(command)}"
+        return f"if setsid -w true >/dev/null 2>&1; then exec setsid -w sh -c {inner}; else exec sh -c {inner}; fi"
+
+    @staticmethod
+    def split_pgid(header: bytes) -> Tuple[bool, Optional[int], bytes]:
+        """
+        从已收到的标准输出开头查找进程组ID行
+        :param header: 已缓存的标准输出
+        :return: (是否查找结束, 进程组ID（无法解析时为None）, 去掉进程组ID行后的输出)
+        """
+        index = header.find(JOB_PGID_MARKER)
+        end = header.find(b'\n', index) if index >= 0 else -1
+        if end < 0:
+            if len(header) <= JOB_HEADER_MAX_BYTES:
+                return False, None, b''
+            return True, None, header
+        value = header[index + len(JOB_PGID_MARKER):end].strip()
+        pgid = int(value) if value.isdigit() else None
+        return True, pgid or None, header[:index] + header[end + 1:]
+
+    def _run(self, job: SSHJob) -> None:
+        """任务线程：执行远程命令并把输出写入任务目录"""
+        self._save(job)
+        files = {}
+        timer = None
+        try:
+            host, username, password, port = job.target
+            job.ssh_ops = SSHOperations.from_credentials(host, username, password, port)
+            if job.timeout:
+                timer = threading.Timer(job.timeout, self._stop, args=(job, 'timeout'))
+                timer.daemon = True
+                timer.start()
+            files = {stream: open(self._output_path(job.job_id, stream), 'ab') for stream in ('stdout', 'stderr')}
+            header, header_done = b'', False
+            exit_code = None
+            for stream, data in job.ssh_ops.ssh_client.stream_command(
+                    self.wrap_command(job.command), timeout=None, stdin=job.stdin, limited=False
+            ):
+                if stream == 'exit':
+                    exit_code = data
+                    break
+                if stream == 'stdout' and not header_done:
+                    header += data
+                    header_done, job.pgid, data = self.split_pgid(header)
+                    if not header_done:
+                        continue
+                    header = b''
+                    if job.pgid is None:
+                        logger.warning(f"未能获取后台任务的进程组ID，取消时无法终止远程进程: {job.job_id}")
+                    self._save(job)
+                    if job.stop_reason:
+                        # 在拿到进程组ID之前已被取消
+                        self._kill(job, 'TERM')
+                    if not data:
+                        continue
+                self._write_output(job, files[stream], stream, data)
+            if header:
+                # 没有输出进程组ID行（命令在输出该行之前就已失败），已缓存的内容照常保存
+                self._write_output(job, files['stdout'], 'stdout', header)
+            job.exit_code = exit_code
+            if job.stop_reason:
+                job.status = job.stop_reason
+            else:
+                job.status = 'succeeded' if exit_code == 0 else 'failed'
+        except Exception as e:
+            job.status = job.stop_reason or 'error'
+            job.error = str(e)
+            logger.error(f"后台任务执行失败: {job.job_id}, {str(e)}")
+        finally:
+            if timer is not None:
+                timer.cancel()
+            for f in files.values():
+                f.close()
+            job.finished_at = time.time()
+            job.stdin = None
+            self._save(job)
+            with self._lock:
+                self._running[job.conn_key] -= 1
+                if not self._running[job.conn_key]:
+                    del self._running[job.conn_key]
+                grace_timer = self._timers.pop(job.job_id, None)
+            if grace_timer is not None:
+                grace_timer.cancel()
+            logger.info(f"后台任务结束: {job.conn_key} {job.job_id}, {job.status}")
+            self._dispatch()
+
+    def _write_output(self, job: SSHJob, f, stream: str, data: bytes) -> None:
+        """写入输出，超过上限的部分只计数"""
+        room = max(0, JOB_OUTPUT_MAX_BYTES - job.output_bytes[stream])
+        if room:
+            f.write(data[:room])
+            f.flush()
+            job.output_bytes[stream] += min(room, len(data))
+        job.truncated[stream] += max(0, len(data) - room)
+
+    def _kill(self, job: SSHJob, signal: str) -> None:
+        """
+        向任务的远程进程组发送信号（阻塞调用）
+        :param job: 任务
+        :param signal: TERM/KILL
+        """
+        if job.pgid is None or job.ssh_ops is None:
+            return
+        job.ssh_ops.execute_command(f"kill -{signal} -{job.pgid} 2>/dev/null || kill -{signal} {job.pgid}", timeout=10)
+
+    def _stop(self, job: SSHJob, reason: str) -> None:
+        """
+        停止运行中的任务：先发送SIGTERM，JOB_KILL_GRACE秒后仍未结束则发送SIGKILL
+        :param job: 任务
+        :param reason: cancelled/timeout
+        """
+        if job.finished or job.stop_reason:
+            return
+        job.stop_reason = reason
+        try:
+            self._kill(job, 'TERM')
+        except Exception as e:
+            logger.warning(f"终止后台任务失败: {job.job_id}, {str(e)}")
+        timer = threading.Timer(JOB_KILL_GRACE, self._force_kill, args=(job,))
+        timer.daemon = True
+        with self._lock:
+            if job.finished:
+                return
+            self._timers[job.job_id] = timer
+        timer.start()
+
+    def _force_kill(self, job: SSHJob) -> None:
+        """宽限期后仍未结束的任务发送SIGKILL"""
+        with self._lock:
+            self._timers.pop(job.job_id, None)
+        if job.finished:
+            return
+        try:
+            self._kill(job, 'KILL')
+        except Exception as e:
+            logger.warning(f"强制终止后台任务失败: {job.job_id}, {str(e)}")
+
+    def cancel(self, job_id: str) -> SSHJob:
+        """
+        取消任务（阻塞调用，需在线程中执行）：排队中的任务直接取消，运行中的任务终止远程进程组
+        :param job_id: 任务ID
+        :return: SSHJob
+        """
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(f"任务不存在: {job_id}")
+        with self._lock:
+            if job in self._queue:
+                self._queue.remove(job)
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+                job.stdin = None
+                queued = True
+            else:
+                queued = False
+        if queued:
+            self._save(job)
+        elif not job.finished:
+            self._stop(job, 'cancelled')
+        return job
+
+    def get(self, job_id: str) -> Optional[SSHJob]:
+        """
+        获取任务
+        :param job_id: 任务ID
+        :return: SSHJob，不存在时返回None
+        """
+        self._ensure_started()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, ssh_id: Any = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        列出任务，按提交时间倒序
+        :param ssh_id: 只列出该服务器的任务
+        :param status: 只列出该状态的任务
+        :return: 任务信息列表
+        """
+        self._ensure_started()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [
+            job.to_dict() for job in sorted(jobs, key=lambda item: item.submitted_at, reverse=True)
+            if (ssh_id is None or job.ssh_id == ssh_id) and (status is None or job.status == status)
+        ]
+
+    def read_output(self, job: SSHJob, stream: str, offset: int = 0, max_bytes: int = 65536) -> bytes:
+        """
+        读取任务已保存的输出（阻塞调用，需在线程中执行）
+        :param job: 任务
+        :param stream: stdout/stderr
+        :param offset: 起始偏移
+        :param max_bytes: 最多读取的字节数
+        :return: 输出内容
+        """
+        if stream not in ('stdout', 'stderr'):
+            raise ValueError(f"不支持的输出流: {stream}")
+        length = min(max_bytes, job.output_bytes[stream] - offset)
+        if length <= 0:
+            return b''
+        try:
+            with open(self._output_path(job.job_id, stream), 'rb') as f:
+                f.seek(offset)
+                return f.read(length)
+        except FileNotFoundError:
+            return b''
+
+    def remove(self, job_id: str) -> bool:
+        """
+        删除已结束任务的记录和输出（阻塞调用，需在线程中执行）
+        :param job_id: 任务ID
+        :return: 删除成功返回True，任务不存在返回False
+        """
+        job = self.get(job_id)
+        if job is None:
+            return False
+        if not job.finished:
+            raise RuntimeError("任务尚未结束，请先取消")
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        # 任务线程可能仍在结束阶段保存记录，标记后的保存会被跳过，不会重新创建目录
+        with job._save_lock:
+            job.removed = True
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+        return True
+
+    def reap(self) -> int:
+        """
+        删除超过保留时间的已结束任务
+        :return: 删除的任务数
+        """
+        now = time.time()
+        with self._lock:
+            expired = [
+                job.job_id for job in self._jobs.values()
+                if job.finished and job.finished_at and now - job.finished_at > job.retention
+            ]
+        for job_id in expired:
+            self.remove(job_id)
+        return len(expired)
+
+    def _reap_loop(self) -> None:
+        """后台清理线程"""
+        while True:
+            time.sleep(JOB_REAP_INTERVAL)
+            try:
+                count = self.reap()
+                if count:
+                    logger.info(f"已清理 {count} 个过期的后台任务")
+            except Exception as e:
+                logger.error(f"清理后台任务失败: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取调度器指标
+        :return: 指标字典
+        """
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                'queued': len(self._queue),
+                'running': sum(self._running.values()),
+                'host_running': dict(self._running),
+                'status': counts,
+                'max_running': self.max_running,
+                'per_host_limit': self.per_host_limit,
+            }
+
+
+# 全局任务调度器
+ssh_jobs = SSHJobManager()
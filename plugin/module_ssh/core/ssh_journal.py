@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/16 23:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : ssh_journal.py
+# @Software: PyCharm
+# @desc    : 断点续传日志，记录每次传输已完成的字节区间，进程重启后仍可继续
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from utils.log_util import logger
+
+# 日志目录，可通过环境变量SSH_TRANSFER_JOURNAL_DIR修改
+JOURNAL_DIR = os.environ.get(
+    'SSH_TRANSFER_JOURNAL_DIR', os.path.join(os.path.expanduser('~'), '.ssh_transfer_journal')
+)
+
+
+class TransferJournal:
+    """断点续传日志，每个传输对应目录下的一个JSON文件"""
+
+    def __init__(self, journal_dir: str = JOURNAL_DIR):
+        """
+        初始化传输日志
+        :param journal_dir: 日志目录
+        """
+        self.journal_dir = journal_dir
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(direction: str, conn_key: str, local_path: str, remote_path: str) -> str:
+        """
+        生成传输键，同一方向、同一连接、同一对路径视为同一传输
+        :param direction: upload/download
+        :param conn_key: 连接键（user@host:port）
+        :param local_path: 本地路径
+        :param remote_path: 远程路径
+        :return: 传输键
+        """
+        raw = f"{direction}|{conn_key}|{os.path.abspath(local_path)}|{remote_path}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.journal_dir, f"{key}.json")
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取传输记录
+        :param key: 传输键
+        :return: 记录字典，不存在或损坏时返回None
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"传输日志损坏，已忽略: {path}, {str(e)}")
+            return None
+
+    def save(self, key: str, record: Dict[str, Any]) -> None:
+        """
+        保存传输记录（先写临时文件再替换，避免中途崩溃留下半个文件）
+        :param key: 传输键
+        :param record: 记录字典
+        """
+        record['updated_at'] = time.time()
+        path = self._path(key)
+        with self._lock:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+    def delete(self, key: str) -> None:
+        """
+        删除传输记录
+        :param key: 传输键
+        """
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """
+        列出所有未完成的传输记录
+        :return: 记录列表
+        """
+        if not os.path.isdir(self.journal_dir):
+            return []
+        records = []
+        for name in sorted(os.listdir(self.journal_dir)):
+            if name.endswith('.json'):
+                record = self.load(name[:-len('.json')])
+                if record:
+                    records.append(record)
+        return records
+
+    @staticmethod
+    def add_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+        """
+        向已完成区间列表中加入[start, end)并合并相邻区间
+        :param ranges: 已完成区间列表
+        :param start: 起始偏移
+        :param end: 结束偏移（不含）
+        :return: 合并后的区间列表
+        """
+        merged = []
+        for current in sorted(ranges + [[start, end]]):
+            if merged and current[0] <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], current[1])
+            else:
+                merged.append(list(current))
+        return merged
+
+    @staticmethod
+    def committed(ranges: List[List[int]]) -> int:
+        """
+        获取从0开始连续完成的字节数
+        :param ranges: 已完成区间列表
+        :return: 连续完成的字节数
+        """
+        return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+
+# 全局传输日志
+transfer_journal = TransferJournal()
@@ -6,10 +6,171 @@
 # @File    : ssh_operations.py
 # @Software: PyCharm
 # @desc    : SSH操作类，提供文件传输等功能
+import base64
+import fnmatch
+import functools
+import hashlib
+import json
 import os
+import posixpath
+import shlex
+import stat as stat_module
+import tarfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
 from utils.log_util import logger
-from typing import List, Optional, Callable, Dict, Any, Tuple
+from typing import List, Optional, Callable, Dict, Any, Tuple, Iterator, BinaryIO
+from plugin.module_ssh.core.ssh_cache import RemoteMetadataCache, TTLCache
 from plugin.module_ssh.core.ssh_client import SSHClient
+from plugin.module_ssh.core.ssh_index import RemotePathIndex, get_path_index
+from plugin.module_ssh.core.ssh_journal import TransferJournal, transfer_journal
+from plugin.module_ssh.core.ssh_result_cache import result_cache
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 可选依赖
+    zstandard = None
+
+
+# 流式传输的默认分块大小
+TRANSFER_CHUNK_SIZE = 256 * 1024
+# 单个SFTP读请求的大小（多数服务器上限为32KB）
+SFTP_READ_SIZE = 32768
+# 流式读取时同时在途的读请求数，限制预读占用的内存
+SFTP_READ_AHEAD = 16
+# 分段并行传输的默认分段大小与并行度
+SEGMENT_SIZE = 8 * 1024 * 1024
+SEGMENT_PARALLELISM = 4
+# 目录同步时每条sha256sum命令最多校验的文件数
+SYNC_HASH_BATCH = 100
+# 按块增量同步的最小块大小，块过小时摘要列表的体积和比对开销会超过节省的传输量
+SYNC_MIN_BLOCK_SIZE = 64 * 1024
+# 远程没有支持--filter的split时，用python3按块计算SHA256（参数：文件路径、块大小）
+BLOCK_HASH_SCRIPT = (
+    "import hashlib, sys\n"
+    "f = open(sys.argv[1], 'rb')\n"
+    "for block in iter(lambda: f.read(int(sys.argv[2])), b''):\n"
+    "    print(hashlib.sha256(block).hexdigest())\n"
+)
+# tar打包传输支持的压缩方式
+TAR_COMPRESSIONS = ('zstd', 'gzip', None)
+# 目录列表支持的排序字段和单页上限
+LIST_SORT_FIELDS = ('name', 'size', 'mtime', 'type')
+LIST_MAX_LIMIT = 1000
+# find输出的类型标记
+FIND_TYPES = {'f': 'file', 'd': 'dir', 'l': 'link'}
+# 每条find命令最多传入的路径数
+FIND_PATH_BATCH = 200
+# 文本读取单次返回的字节上限，以及逐块读取时的块大小
+TEXT_READ_MAX_BYTES = 4 * 1024 * 1024
+TEXT_BLOCK_SIZE = 256 * 1024
+# 按行分页单次最多返回的行数
+TEXT_MAX_LINES = 5000
+# 行偏移索引每隔多少行记录一次字节偏移
+LINE_INDEX_INTERVAL = 1000
+# 统计行偏移的超时时间（秒），在请求中同步执行，超时后请求失败
+LINE_INDEX_TIMEOUT = 60
+# 未指定编码时依次尝试的编码，均失败时用latin-1兜底（任何字节都能解码）
+TEXT_ENCODINGS = ('utf-8', 'gb18030')
+# 执行脚本支持的解释器，值为从标准输入读取脚本（其后为脚本参数）的写法
+SCRIPT_INTERPRETERS = {
+    'bash': 'bash -s --',
+    'sh': 'sh -s --',
+    'zsh': 'zsh -s --',
+    'python3': 'python3 -',
+    'python': 'python -',
+    'perl': 'perl -',
+}
+# 禁止递归删除的系统目录（所有顶层目录本身也禁止删除）
+PROTECTED_PATHS = frozenset({
+    '/usr/bin', '/usr/sbin', '/usr/lib', '/usr/lib64', '/usr/local', '/usr/share', '/usr/include',
+    '/var/lib', '/var/log', '/var/spool', '/var/cache', '/etc/ssh', '/etc/systemd', '/boot/grub', '/boot/efi',
+})
+# 允许使用服务端rm -rf快速删除的目录前缀，可通过环境变量SSH_RM_ALLOWED_PATHS（逗号分隔）修改
+RM_ALLOWED_PATHS = tuple(
+    path.rstrip('/') for path in
+    os.environ.get('SSH_RM_ALLOWED_PATHS', '/tmp,/var/tmp,/data,/home,/opt,/srv').split(',') if path.strip()
+)
+
+# 按(连接键, 文件路径)缓存的行偏移索引
+line_indexes = TTLCache(max_size=64, ttl=600)
+
+
+class RemoteUpload:
+    """远程文件流式写入句柄，数据分块直接写入SFTP文件，不经过本地临时文件"""
+
+    def __init__(self, ssh_client: SSHClient, remote_path: str):
+        """
+        打开远程文件准备写入（会占用一个SFTP通道直到close/abort）
+        :param ssh_client: SSHClient实例
+        :param remote_path: 远程文件路径
+        """
+        self.remote_path = remote_path
+        self.transferred = 0
+        self._metadata = ssh_client.metadata
+        self._stack = ExitStack()
+        try:
+            self._sftp = self._stack.enter_context(ssh_client.sftp_channel())
+            remote_dir = os.path.dirname(remote_path)
+            if remote_dir:
+                SSHOperations.mkdir_p(self._sftp, remote_dir, self._metadata)
+            self._file = self._stack.enter_context(self._sftp.open(remote_path, 'wb'))
+            # 流水线写入：不等待每个写请求的响应，关闭时统一检查
+            self._file.set_pipelined(True)
+        except BaseException:
+            self._stack.close()
+            raise
+
+    def write(self, data: bytes) -> int:
+        """
+        写入一个数据块
+        :param data: 数据
+        :return: 累计已写入字节数
+        """
+        self._file.write(data)
+        self.transferred += len(data)
+        return self.transferred
+
+    def close(self) -> None:
+        """完成写入并释放通道"""
+        try:
+            self._stack.close()
+        finally:
+            self._metadata.invalidate(self.remote_path)
+
+    def abort(self) -> None:
+        """放弃写入，删除不完整的远程文件并释放通道"""
+        # 先关闭文件，在仍占用SFTP会话时删除，最后再归还会话
+        try:
+            self._file.close()
+        except Exception:
+            pass
+        try:
+            self._sftp.remove(self.remote_path)
+        except Exception:
+            pass
+        try:
+            self._stack.close()
+        except Exception:
+            pass
+        self._metadata.invalidate(self.remote_path)
+
+
+class _ChannelWriter:
+    """把SSH通道包装成只写文件对象，供tarfile流式写入"""
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def write(self, data: bytes) -> int:
+        self.channel.sendall(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
 
 
 class SSHOperations:
@@ -40,6 +201,16 @@ class SSHOperations:
         )
         return cls(ssh_client)
 
+    @property
+    def metadata(self) -> RemoteMetadataCache:
+        """当前连接的远程元数据缓存"""
+        return self.ssh_client.metadata
+
+    @property
+    def conn_key(self) -> str:
+        """连接键（user@host:port）"""
+        return f"{self.ssh_client.username}@{self.ssh_client.host}:{self.ssh_client.port}"
+
     def upload_file(
             self, local_path: str, remote_path: str,
             callback: Optional[Callable[[int, int], None]] = None
@@ -67,16 +238,17 @@ class SSHOperations:
                 # 如果不是以斜杠结尾，假设用户已提供完整路径
                 full_remote_path = remote_path
 
-            # 确保远程目录存在
-            remote_dir = os.path.dirname(full_remote_path)
-            try:
-                self.ssh_client.sftp.stat(remote_dir)
-            except FileNotFoundError:
-                # 目录不存在，创建它
-                self._mkdir_p(remote_dir)
+            with self.ssh_client.sftp_channel() as sftp:
+                # 确保远程目录存在（目录状态取自元数据缓存）
+                remote_dir = os.path.dirname(full_remote_path)
+                if remote_dir:
+                    self.mkdir_p(sftp, remote_dir, self.metadata)
 
-            # 执行上传
-            self.ssh_client.sftp.put(local_path, full_remote_path, callback=callback)
+                # 执行上传
+                try:
+                    sftp.put(local_path, full_remote_path, callback=callback)
+                finally:
+                    self.metadata.invalidate(full_remote_path)
             logger.info(f"文件已成功上传: {local_path} -> {full_remote_path}")
             return True
 
@@ -84,6 +256,62 @@ class SSHOperations:
             logger.error(f"上传文件失败: {str(e)}")
             return False
 
+    @staticmethod
+    def resolve_remote_path(remote_path: str, filename: str) -> str:
+        """
+        远程路径以斜杠结尾时视为目录，在末尾拼接文件名
+        :param remote_path: 远程路径
+        :param filename: 文件名
+        :return: 完整远程文件路径
+        """
+        if remote_path.endswith('/') and filename:
+            return os.path.join(remote_path, os.path.basename(filename))
+        return remote_path
+
+    def open_upload(self, remote_path: str, filename: str = None) -> RemoteUpload:
+        """
+        打开流式上传句柄，由调用方分块写入
+        :param remote_path: 远程路径（以斜杠结尾时拼接filename）
+        :param filename: 文件名
+        :return: RemoteUpload实例
+        """
+        return RemoteUpload(self.ssh_client, self.resolve_remote_path(remote_path, filename))
+
+    def upload_fileobj(
+            self, fileobj: BinaryIO, remote_path: str, filename: str = None,
+            callback: Optional[Callable[[int, int], None]] = None, total: int = None,
+            chunk_size: int = TRANSFER_CHUNK_SIZE
+    ) -> bool:
+        """
+        从文件对象分块上传到远程服务器，内存占用只与分块大小有关
+        :param fileobj: 可读的二进制文件对象
+        :param remote_path: 远程路径（以斜杠结尾时拼接filename）
+        :param filename: 文件名
+        :param callback: 进度回调函数，参数为(已传输字节数, 总字节数)
+        :param total: 总字节数（用于进度回调，未知时为0）
+        :param chunk_size: 分块大小
+        :return: 成功返回True，失败返回False
+        """
+        upload = None
+        try:
+            upload = self.open_upload(remote_path, filename)
+            while True:
+                chunk = fileobj.read(chunk_size)
+                if not chunk:
+                    break
+                transferred = upload.write(chunk)
+                if callback:
+                    callback(transferred, total or 0)
+            upload.close()
+            logger.info(f"文件已成功上传: {upload.remote_path}")
+            return True
+
+        except Exception as e:
+            if upload is not None:
+                upload.abort()
+            logger.error(f"上传文件失败: {str(e)}")
+            return False
+
     def download_file(
             self, remote_path: str, local_path: str,
             callback: Optional[Callable[[int, int], None]] = None
@@ -101,7 +329,8 @@ class SSHOperations:
             if local_dir and not os.path.exists(local_dir):
                 os.makedirs(local_dir)
 
-            self.ssh_client.sftp.get(remote_path, local_path, callback=callback)
+            with self.ssh_client.sftp_channel() as sftp:
+                sftp.get(remote_path, local_path, callback=callback)
             logger.info(f"文件已成功下载: {remote_path} -> {local_path}")
             return True
 
@@ -109,6 +338,1226 @@ class SSHOperations:
             logger.error(f"下载文件失败: {str(e)}")
             return False
 
+    @staticmethod
+    def split_segments(size: int, segment_size: int = SEGMENT_SIZE) -> List[Tuple[int, int]]:
+        """
+        将文件按字节区间切分为多个分段
+        :param size: 文件大小
+        :param segment_size: 分段大小
+        :return: [(起始偏移, 长度), ...]
+        """
+        return [(offset, min(segment_size, size - offset)) for offset in range(0, size, segment_size)]
+
+    def _run_segments(
+            self, segments: List[Tuple[int, int]], worker: Callable[[int, int, Callable[[int], None]], None],
+            total: int, parallelism: int, callback: Optional[Callable[[int, int], None]] = None
+    ) -> None:
+        """
+        并行执行分段传输，任一分段失败则抛出异常
+        :param segments: 分段列表
+        :param worker: 分段处理函数，参数为(起始偏移, 长度, 进度累加函数)
+        :param total: 总字节数
+        :param parallelism: 并行度（受SSHClient.max_channels限制）
+        :param callback: 进度回调函数，参数为(已传输字节数, 总字节数)
+        """
+        lock = threading.Lock()
+        transferred = [0]
+
+        def advance(count: int) -> None:
+            with lock:
+                transferred[0] += count
+                current = transferred[0]
+            if callback:
+                callback(current, total)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(parallelism, len(segments) or 1))) as pool:
+            futures = [pool.submit(worker, offset, length, advance) for offset, length in segments]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    @staticmethod
+    def local_sha256(local_path: str, length: Optional[int] = None) -> str:
+        """
+        计算本地文件的SHA256（可只计算前length个字节）
+        :param local_path: 本地文件路径
+        :param length: 只计算前length个字节，None表示整个文件
+        :return: 十六进制摘要
+        """
+        digest = hashlib.sha256()
+        remaining = length
+        with open(local_path, 'rb') as f:
+            while remaining is None or remaining > 0:
+                chunk = f.read(TRANSFER_CHUNK_SIZE if remaining is None else min(TRANSFER_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+        return digest.hexdigest()
+
+    def remote_sha256(self, remote_path: str, length: Optional[int] = None) -> Optional[str]:
+        """
+        在远程服务器上计算文件的SHA256（可只计算前length个字节）
+        :param remote_path: 远程文件路径
+        :param length: 只计算前length个字节，None表示整个文件
+        :return: 十六进制摘要，失败时返回None
+        """
+        quoted = shlex.quote(remote_path)
+        if length is None:
+            command = f"sha256sum {quoted}"
+        else:
+            command = f"head -c {int(length)} {quoted} | sha256sum"
+        output, _, exit_code = self.execute_command(command)
+        if exit_code != 0 or not output:
+            return None
+        return output.split()[0]
+
+    def upload_file_parallel(
+            self, local_path: str, remote_path: str,
+            segment_size: int = SEGMENT_SIZE, parallelism: int = SEGMENT_PARALLELISM,
+            checksum: bool = False, callback: Optional[Callable[[int, int], None]] = None
+    ) -> bool:
+        """
+        分段并行上传大文件：文件按字节区间切分，多个SFTP通道同时写入同一远程文件的不同区间
+        :param local_path: 本地文件路径
+        :param remote_path: 远程文件路径（以斜杠结尾时拼接本地文件名）
+        :param segment_size: 分段大小
+        :param parallelism: 并行通道数
+        :param checksum: 传输完成后是否比对SHA256（需要远程支持sha256sum）
+        :param callback: 进度回调函数，参数为(已传输字节数, 总字节数)
+        :return: 成功返回True，失败返回False
+        """
+        try:
+            if not os.path.exists(local_path):
+                logger.error(f"本地文件不存在: {local_path}")
+                return False
+
+            full_remote_path = self.resolve_remote_path(remote_path, os.path.basename(local_path))
+            size = os.path.getsize(local_path)
+
+            # 先创建远程文件并预设大小，各分段再按偏移写入
+            with self.ssh_client.sftp_channel() as sftp:
+                remote_dir = os.path.dirname(full_remote_path)
+                if remote_dir:
+                    self.mkdir_p(sftp, remote_dir, self.metadata)
+                with sftp.open(full_remote_path, 'wb') as f:
+                    f.truncate(size)
+
+            def upload_segment(offset: int, length: int, advance: Callable[[int], None]) -> None:
+                with open(local_path, 'rb') as local_file, self.ssh_client.sftp_channel() as sftp:
+                    local_file.seek(offset)
+                    with sftp.open(full_remote_path, 'r+b') as remote_file:
+                        remote_file.seek(offset)
+                        remote_file.set_pipelined(True)
+                        remaining = length
+                        while remaining > 0:
+                            chunk = local_file.read(min(TRANSFER_CHUNK_SIZE, remaining))
+                            if not chunk:
+                                raise IOError(f"本地文件在传输过程中被截断: {local_path}")
+                            remote_file.write(chunk)
+                            remaining -= len(chunk)
+                            advance(len(chunk))
+
+            try:
+                self._run_segments(self.split_segments(size, segment_size), upload_segment, size, parallelism, callback)
+            finally:
+                self.metadata.invalidate(full_remote_path)
+
+            if not self._verify_transfer(local_path, full_remote_path, size, checksum):
+                return False
+            logger.info(f"文件已成功分段上传: {local_path} -> {full_remote_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"分段上传文件失败: {str(e)}")
+            return False
+
+    def download_file_parallel(
+            self, remote_path: str, local_path: str,
+            segment_size: int = SEGMENT_SIZE, parallelism: int = SEGMENT_PARALLELISM,
+            checksum: bool = False, callback: Optional[Callable[[int, int], None]] = None
+    ) -> bool:
+        """
+        分段并行下载大文件：多个SFTP通道同时读取远程文件的不同区间，写入本地文件对应偏移
+        :param remote_path: 远程文件路径
+        :param local_path: 本地文件路径
+        :param segment_size: 分段大小
+        :param parallelism: 并行通道数
+        :param checksum: 传输完成后是否比对SHA256（需要远程支持sha256sum）
+        :param callback: 进度回调函数，参数为(已传输字节数, 总字节数)
+        :return: 成功返回True，失败返回False
+        """
+        part_path = f"{local_path}.part"
+        try:
+            local_dir = os.path.dirname(local_path)
+            if local_dir and not os.path.exists(local_dir):
+                os.makedirs(local_dir)
+
+            with self.ssh_client.sftp_channel() as sftp:
+                size = sftp.stat(remote_path).st_size
+
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+
+            def download_segment(offset: int, length: int, advance: Callable[[int], None]) -> None:
+                with open(part_path, 'r+b') as local_file, self.ssh_client.sftp_channel() as sftp:
+                    local_file.seek(offset)
+                    with sftp.open(remote_path, 'rb') as remote_file:
+                        position, end = offset, offset + length
+                        while position < end:
+                            batch = []
+                            while position < end and len(batch) < SFTP_READ_AHEAD:
+                                read_size = min(SFTP_READ_SIZE, end - position)
+                                batch.append((position, read_size))
+                                position += read_size
+                            for data in remote_file.readv(batch):
+                                local_file.write(data)
+                                advance(len(data))
+
+            self._run_segments(self.split_segments(size, segment_size), download_segment, size, parallelism, callback)
+
+            if not self._verify_transfer(part_path, remote_path, size, checksum):
+                os.remove(part_path)
+                return False
+            os.replace(part_path, local_path)
+            logger.info(f"文件已成功分段下载: {remote_path} -> {local_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"分段下载文件失败: {str(e)}")
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return False
+
+    def _verify_transfer(self, local_path: str, remote_path: str, size: int, checksum: bool) -> bool:
+        """
+        校验传输结果：比较大小，可选比较SHA256
+        :param local_path: 本地文件路径
+        :param remote_path: 远程文件路径
+        :param size: 期望大小
+        :param checksum: 是否比较SHA256
+        :return: 一致返回True
+        """
+        with self.ssh_client.sftp_channel() as sftp:
+            remote_size = sftp.stat(remote_path).st_size
+        local_size = os.path.getsize(local_path)
+        if remote_size != size or local_size != size:
+            logger.error(f"传输校验失败，大小不一致: 本地={local_size}, 远程={remote_size}, 期望={size}")
+            return False
+        if checksum:
+            local_digest = self.local_sha256(local_path)
+            remote_digest = self.remote_sha256(remote_path)
+            if local_digest != remote_digest:
+                logger.error(f"传输校验失败，SHA256不一致: 本地={local_digest}, 远程={remote_digest}")
+                return False
+        return True
+
+    def upload_file_resumable(
+            self, local_path: str, remote_path: str, checksum: bool = False, retries: int = 3,
+            callback: Optional[Callable[[int, int], None]] = None,
+            journal: TransferJournal = transfer_journal, checkpoint_size: int = SEGMENT_SIZE
+    ) -> bool:
+        """
+        可断点续传的上传：已完成的字节区间记录在本地传输日志中，连接中断后自动重连续传，
+        进程重启后再次调用同一对路径也会从断点继续
+        :param local_path: 本地文件路径
+        :param remote_path: 远程文件路径（以斜杠结尾时拼接本地文件名）
+        :param checksum: 续传前校验已传部分、完成后校验整个文件的SHA256（需要远程支持sha256sum）
+        :param retries: 单次调用内的最大重试次数
+        :param callback: 进度回调函数，参数为(已传输字节数, 总字节数)
+        :param journal: 传输日志
+        :param checkpoint_size: 每传输多少字节写一次日志
+        :return: 成功返回True，失败返回False
+        """
+        if not os.path.exists(local_path):
+            logger.error(f"本地文件不存在: {local_path}")
+            return False
+
+        full_remote_path = self.resolve_remote_path(remote_path, os.path.basename(local_path))
+        stat = os.stat(local_path)
+        key = journal.make_key('upload', self.conn_key, local_path, full_remote_path)
+        record = self._load_journal(journal, key, 'upload', local_path, full_remote_path,
+                                    stat.st_size, int(stat.st_mtime))
+
+        def transfer(offset: int) -> None:
+            with open(local_path, 'rb') as local_file, self.ssh_client.sftp_channel() as sftp:
+                remote_dir = os.path.dirname(full_remote_path)
+                if remote_dir:
+                    self.mkdir_p(sftp, remote_dir, self.metadata)
+                if offset:
+                    sftp.truncate(full_remote_path, offset)
+                else:
+                    sftp.open(full_remote_path, 'wb').close()
+                local_file.seek(offset)
+                position = offset
+                # 每个检查点单独打开一次远程文件，关闭时等待所有流水线写请求确认后再记入日志
+                while position < stat.st_size:
+                    checkpoint = position
+                    with sftp.open(full_remote_path, 'r+b') as remote_file:
+                        remote_file.seek(position)
+                        remote_file.set_pipelined(True)
+                        while position - checkpoint < checkpoint_size:
+                            chunk = local_file.read(TRANSFER_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            remote_file.write(chunk)
+                            position += len(chunk)
+                            if callback:
+                                callback(position, stat.st_size)
+                    self._checkpoint(journal, key, record, checkpoint, position)
+                    self.metadata.invalidate(full_remote_path)
+                    if position == checkpoint:
+                        raise IOError(f"本地文件在传输过程中被截断: {local_path}")
+
+        def resume_offset() -> int:
+            committed = TransferJournal.committed(record['ranges'])
+            if not committed:
+                return 0
+            with self.ssh_client.sftp_channel() as sftp:
+                try:
+                    remote_size = sftp.stat(full_remote_path).st_size
+                except FileNotFoundError:
+                    remote_size = 0
+            committed = min(committed, remote_size)
+            if committed and checksum and \
+                    self.local_sha256(local_path, committed) != self.remote_sha256(full_remote_path, committed):
+                logger.warning(f"远程已传部分校验不一致，从头开始上传: {full_remote_path}")
+                committed = 0
+            return committed
+
+        return self._run_resumable(journal, key, record, resume_offset, transfer, retries,
+                                   local_path, full_remote_path, checksum, '上传')
+
+    def download_file_resumable(
+            self, remote_path: str, local_path: str, checksum: bool = False, retries: int = 3,
+            callback: Optional[Callable[[int, int], None]] = None,
+            journal: TransferJournal = transfer_journal, checkpoint_size: int = SEGMENT_SIZE
+    ) -> bool:
+        """
+        可断点续传的下载：数据先写入local_path.part，已完成的字节区间记录在本地传输日志中，
+        连接中断后自动重连续传，完成后重命名为local_path
+        :param remote_path: 远程文件路径
+        :param local_path: 本地文件路径
+        :param checksum: 续传前校验已下载部分、完成后校验整个文件的SHA256（需要远程支持sha256sum）
+        :param retries: 单次调用内的最大重试次数
+        :param callback: 进度回调函数，参数为(已传输字节数, 总字节数)
+        :param journal: 传输日志
+        :param checkpoint_size: 每传输多少字节写一次日志
+        :return: 成功返回True，失败返回False
+        """
+        part_path = f"{local_path}.part"
+        try:
+            local_dir = os.path.dirname(local_path)
+            if local_dir and not os.path.exists(local_dir):
+                os.makedirs(local_dir)
+            with self.ssh_client.sftp_channel() as sftp:
+                stat = sftp.stat(remote_path)
+        except Exception as e:
+            logger.error(f"下载文件失败: {str(e)}")
+            return False
+
+        key = journal.make_key('download', self.conn_key, local_path, remote_path)
+        record = self._load_journal(journal, key, 'download', local_path, remote_path,
+                                    stat.st_size, int(stat.st_mtime or 0))
+
+        def transfer(offset: int) -> None:
+            with open(part_path, 'r+b' if offset else 'wb') as local_file:
+                local_file.truncate(offset)
+                local_file.seek(offset)
+                position, checkpoint = offset, offset
+                for data in self.iter_remote_file(remote_path, offset, stat.st_size - offset):
+                    local_file.write(data)
+                    position += len(data)
+                    if callback:
+                        callback(position, stat.st_size)
+                    if position - checkpoint >= checkpoint_size:
+                        local_file.flush()
+                        os.fsync(local_file.fileno())
+                        self._checkpoint(journal, key, record, checkpoint, position)
+                        checkpoint = position
+            self._checkpoint(journal, key, record, checkpoint, position)
+
+        def resume_offset() -> int:
+            committed = TransferJournal.committed(record['ranges'])
+            if not committed or not os.path.exists(part_path):
+                return 0
+            committed = min(committed, os.path.getsize(part_path))
+            if committed and checksum and \
+                    self.local_sha256(part_path, committed) != self.remote_sha256(remote_path, committed):
+                logger.warning(f"本地已下载部分校验不一致，从头开始下载: {part_path}")
+                committed = 0
+            return committed
+
+        if not self._run_resumable(journal, key, record, resume_offset, transfer, retries,
+                                   part_path, remote_path, checksum, '下载'):
+            return False
+        os.replace(part_path, local_path)
+        return True
+
+    @staticmethod
+    def _load_journal(
+            journal: TransferJournal, key: str, direction: str, local_path: str, remote_path: str,
+            size: int, mtime: int
+    ) -> Dict[str, Any]:
+        """
+        读取传输日志，源文件大小或修改时间变化时丢弃旧记录
+        :return: 传输记录
+        """
+        record = journal.load(key)
+        if record and record.get('size') == size and record.get('mtime') == mtime:
+            logger.info(f"发现未完成的传输，已完成{TransferJournal.committed(record['ranges'])}/{size}字节: {remote_path}")
+            return record
+        return {
+            'key': key,
+            'direction': direction,
+            'local_path': os.path.abspath(local_path),
+            'remote_path': remote_path,
+            'size': size,
+            'mtime': mtime,
+            'ranges': [],
+        }
+
+    @staticmethod
+    def _checkpoint(journal: TransferJournal, key: str, record: Dict[str, Any], start: int, end: int) -> None:
+        """将[start, end)记为已完成并写入传输日志"""
+        if end > start:
+            record['ranges'] = TransferJournal.add_range(record['ranges'], start, end)
+            journal.save(key, record)
+
+    def _run_resumable(
+            self, journal: TransferJournal, key: str, record: Dict[str, Any],
+            resume_offset: Callable[[], int], transfer: Callable[[int], None], retries: int,
+            local_path: str, remote_path: str, checksum: bool, action: str
+    ) -> bool:
+        """
+        执行可续传的传输：失败时重连并从断点继续，最终校验通过后删除传输日志
+        :return: 成功返回True，失败返回False
+        """
+        for attempt in range(retries + 1):
+            try:
+                offset = resume_offset()
+                # 丢弃断点之后的记录，保证日志与实际数据一致
+                record['ranges'] = [[0, offset]] if offset else []
+                transfer(offset)
+                break
+            except Exception as e:
+                if attempt >= retries:
+                    logger.error(f"{action}文件失败，已保留传输日志以便下次续传: {str(e)}")
+                    return False
+                logger.warning(f"{action}中断，第{attempt + 1}次重试: {str(e)}")
+                time.sleep(min(2 ** attempt, 10))
+                if not self.ssh_client.is_alive():
+                    self.ssh_client.reconnect()
+
+        try:
+            verified = self._verify_transfer(local_path, remote_path, record['size'], checksum)
+        except Exception as e:
+            logger.error(f"{action}结果校验失败: {str(e)}")
+            return False
+        # 校验不通过说明已传数据不可信，删除日志使下次从头开始
+        journal.delete(key)
+        if verified:
+            logger.info(f"文件已成功{action}: {local_path} <-> {remote_path}")
+        return verified
+
+    def iter_remote_file(
+            self, remote_path: str, offset: int = 0, length: Optional[int] = None
+    ) -> Iterator[bytes]:
+        """
+        流式读取远程文件的指定区间，读请求按批流水线发送，在途数据量有上限
+        :param remote_path: 远程文件路径
+        :param offset: 起始偏移
+        :param length: 读取长度，None表示读到文件末尾
+        :return: 生成器，逐块产出文件内容
+        """
+        with self.ssh_client.sftp_channel() as sftp:
+            with sftp.open(remote_path, 'rb') as f:
+                if length is None:
+                    length = max(f.stat().st_size - offset, 0)
+                end = offset + length
+                position = offset
+                while position < end:
+                    batch = []
+                    while position < end and len(batch) < SFTP_READ_AHEAD:
+                        size = min(SFTP_READ_SIZE, end - position)
+                        batch.append((position, size))
+                        position += size
+                    for data in f.readv(batch):
+                        yield data
+
+    def sync_dir(
+            self, local_dir: str, remote_dir: str, delete: bool = False, checksum: bool = False,
+            block_size: Optional[int] = None, exclude: Optional[List[str]] = None,
+            parallelism: int = SEGMENT_PARALLELISM, dry_run: bool = False
+    ) -> Dict[str, Any]:
+        """
+        增量同步本地目录到远程目录：按大小和修改时间比较，只传输有变化的文件，
+        上传后把远程文件的修改时间设为本地修改时间，重复同步时未变化的文件直接跳过
+        :param local_dir: 本地目录
+        :param remote_dir: 远程目录
+        :param delete: 是否删除远程目录中本地已不存在的文件和目录
+        :param checksum: 大小相同但修改时间不同时比对SHA256，内容相同只更新修改时间（需要远程支持sha256sum）
+        :param block_size: 按块增量传输的块大小，为None时整文件上传，不能小于SYNC_MIN_BLOCK_SIZE；
+            设置后远程已存在的大文件只写入变化的块（需要远程支持cp，以及带--filter的split和sha256sum或python3）
+        :param exclude: 排除的文件名或相对路径通配符，如['.git', '*.pyc']
+        :param parallelism: 并行传输的文件数
+        :param dry_run: 只返回同步计划，不做任何修改
+        :return: 同步结果统计
+        """
+        start = time.perf_counter()
+        if not os.path.isdir(local_dir):
+            raise FileNotFoundError(f"本地目录不存在: {local_dir}")
+        if block_size is not None and block_size < SYNC_MIN_BLOCK_SIZE:
+            raise ValueError(f"块大小不能小于{SYNC_MIN_BLOCK_SIZE}字节")
+        remote_dir = remote_dir.rstrip('/') or '/'
+        exclude = exclude or []
+
+        local_files, local_dirs = self._scan_local_tree(local_dir, exclude)
+        with self.ssh_client.sftp_channel() as sftp:
+            remote_files, remote_dirs = self._scan_remote_tree(sftp, remote_dir, exclude)
+
+        # 生成同步计划
+        actions: Dict[str, List[str]] = {'upload': [], 'patch': [], 'touch': [], 'skip': []}
+        candidates = []
+        for rel, (size, mtime) in local_files.items():
+            remote = remote_files.get(rel)
+            if remote is None:
+                actions['upload'].append(rel)
+            elif remote == (size, mtime):
+                actions['skip'].append(rel)
+            else:
+                candidates.append(rel)
+        same_content = set()
+        if checksum:
+            same_size = [rel for rel in candidates if remote_files[rel][0] == local_files[rel][0]]
+            remote_hashes = self._remote_sha256_many([posixpath.join(remote_dir, rel) for rel in same_size])
+            same_content = {
+                rel for rel in same_size
+                if remote_hashes.get(posixpath.join(remote_dir, rel)) == self.local_sha256(os.path.join(local_dir, rel))
+            }
+        for rel in candidates:
+            if rel in same_content:
+                actions['touch'].append(rel)
+            elif block_size and remote_files[rel][0] >= block_size:
+                actions['patch'].append(rel)
+            else:
+                actions['upload'].append(rel)
+        make_dirs = sorted(local_dirs - remote_dirs, key=lambda rel: (rel.count('/'), rel))
+        delete_files = sorted(set(remote_files) - set(local_files)) if delete else []
+        delete_dirs = sorted(remote_dirs - local_dirs, key=lambda rel: rel.count('/'), reverse=True) if delete else []
+
+        result = {
+            'uploaded': len(actions['upload']),
+            'patched': len(actions['patch']),
+            'touched': len(actions['touch']),
+            'skipped': len(actions['skip']),
+            'deleted': len(delete_files) + len(delete_dirs),
+            'dirs_created': len(make_dirs),
+            'bytes_sent': 0,
+            'failed': [],
+            'dry_run': dry_run,
+        }
+        if dry_run:
+            result['plan'] = {
+                'upload': sorted(actions['upload']),
+                'patch': sorted(actions['patch']),
+                'touch': sorted(actions['touch']),
+                'make_dirs': make_dirs,
+                'delete': delete_files + delete_dirs,
+            }
+            result['elapsed'] = round(time.perf_counter() - start, 3)
+            return result
+
+        lock = threading.Lock()
+
+        def sync_file(action: str, rel: str) -> None:
+            local_path = os.path.join(local_dir, rel)
+            remote_path = posixpath.join(remote_dir, rel)
+            size, mtime = local_files[rel]
+            try:
+                sent = 0
+                if action == 'patch':
+                    sent = self._patch_remote_file(local_path, remote_path, block_size)
+                    if sent is None:
+                        action = 'upload'
+                with self.ssh_client.sftp_channel() as sftp:
+                    if action == 'upload':
+                        sftp.put(local_path, remote_path)
+                        sent = size
+                    sftp.utime(remote_path, (mtime, mtime))
+                with lock:
+                    result['bytes_sent'] += sent
+            except Exception as e:
+                logger.error(f"同步文件失败: {local_path} -> {remote_path}, {str(e)}")
+                with lock:
+                    result['failed'].append({'path': rel, 'error': str(e)})
+
+        with self.ssh_client.sftp_channel() as sftp:
+            self.mkdir_p(sftp, remote_dir, self.metadata)
+            for rel in make_dirs:
+                try:
+                    sftp.mkdir(posixpath.join(remote_dir, rel))
+                except Exception as e:
+                    result['failed'].append({'path': rel, 'error': str(e)})
+
+        tasks = [(action, rel) for action in ('upload', 'patch', 'touch') for rel in actions[action]]
+        if tasks:
+            with ThreadPoolExecutor(max_workers=max(1, min(parallelism, len(tasks)))) as pool:
+                list(pool.map(lambda task: sync_file(*task), tasks))
+
+        if delete_files or delete_dirs:
+            with self.ssh_client.sftp_channel() as sftp:
+                for rel in delete_files:
+                    try:
+                        sftp.remove(posixpath.join(remote_dir, rel))
+                    except Exception as e:
+                        result['failed'].append({'path': rel, 'error': str(e)})
+                for rel in delete_dirs:
+                    try:
+                        sftp.rmdir(posixpath.join(remote_dir, rel))
+                    except Exception as e:
+                        result['failed'].append({'path': rel, 'error': str(e)})
+
+        self.metadata.invalidate(remote_dir, recursive=True)
+        result['elapsed'] = round(time.perf_counter() - start, 3)
+        logger.info(
+            f"目录同步完成: {local_dir} -> {remote_dir}, 上传{result['uploaded']}个, 增量{result['patched']}个, "
+            f"跳过{result['skipped']}个, 删除{result['deleted']}个, 失败{len(result['failed'])}个"
+        )
+        return result
+
+    @staticmethod
+    def _excluded(rel: str, patterns: List[str]) -> bool:
+        """判断相对路径是否被排除（匹配文件名或相对路径）"""
+        name = rel.rsplit('/', 1)[-1]
+        return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel, pattern) for pattern in patterns)
+
+    def _scan_local_tree(self, local_dir: str, exclude: List[str]) -> Tuple[Dict[str, Tuple[int, int]], set]:
+        """
+        扫描本地目录树
+        :return: ({相对路径: (大小, 修改时间)}, {相对目录})
+        """
+        files, dirs = {}, set()
+        for root, dir_names, file_names in os.walk(local_dir):
+            rel_root = os.path.relpath(root, local_dir).replace(os.sep, '/')
+            rel_root = '' if rel_root == '.' else rel_root
+            dir_names[:] = [d for d in dir_names if not self._excluded(posixpath.join(rel_root, d), exclude)]
+            for d in dir_names:
+                dirs.add(posixpath.join(rel_root, d))
+            for name in file_names:
+                rel = posixpath.join(rel_root, name)
+                if self._excluded(rel, exclude):
+                    continue
+                st = os.stat(os.path.join(root, name))
+                files[rel] = (st.st_size, int(st.st_mtime))
+        return files, dirs
+
+    def _scan_remote_tree(self, sftp, remote_dir: str, exclude: List[str]) -> Tuple[Dict[str, Tuple[int, int]], set]:
+        """
+        扫描远程目录树，每个目录只需一次listdir_attr
+        :return: ({相对路径: (大小, 修改时间)}, {相对目录})，远程目录不存在时返回空
+        """
+        files, dirs = {}, set()
+        pending = ['']
+        while pending:
+            rel_root = pending.pop()
+            try:
+                entries = sftp.listdir_attr(posixpath.join(remote_dir, rel_root) if rel_root else remote_dir)
+            except FileNotFoundError:
+                if rel_root:
+                    raise
+                break
+            for attr in entries:
+                rel = posixpath.join(rel_root, attr.filename)
+                if self._excluded(rel, exclude):
+                    continue
+                if stat_module.S_ISDIR(attr.st_mode or 0):
+                    dirs.add(rel)
+                    pending.append(rel)
+                else:
+                    files[rel] = (attr.st_size, int(attr.st_mtime or 0))
+        return files, dirs
+
+    def _remote_sha256_many(self, remote_paths: List[str]) -> Dict[str, str]:
+        """
+        批量计算远程文件的SHA256，每条命令最多SYNC_HASH_BATCH个文件
+        :param remote_paths: 远程文件路径列表
+        :return: {远程路径: 十六进制摘要}，计算失败的文件不在结果中
+        """
+        hashes = {}
+        for i in range(0, len(remote_paths), SYNC_HASH_BATCH):
+            batch = remote_paths[i:i + SYNC_HASH_BATCH]
+            output, _, _ = self.execute_command(f"sha256sum -- {' '.join(shlex.quote(p) for p in batch)}")
+            for line in output.splitlines():
+                digest, _, path = line.partition('  ')
+                if path:
+                    hashes[path] = digest
+        return hashes
+
+    def _patch_remote_file(self, local_path: str, remote_path: str, block_size: int) -> Optional[int]:
+        """
+        按块增量更新远程文件：先在远程把原文件复制为临时文件并一次读取算出每个块的SHA256，
+        只把与本地不同的块写入临时文件，截断到本地文件大小后重命名覆盖原文件，
+        中途失败时原文件保持不变
+        :param local_path: 本地文件路径
+        :param remote_path: 远程文件路径
+        :param block_size: 块大小
+        :return: 实际发送的字节数；远程无法复制或计算块摘要时返回None，由调用方整文件上传
+        """
+        remote_dir, name = posixpath.split(remote_path)
+        temp_path = posixpath.join(remote_dir, f".{name}.part")
+        command = (
+            f"f={shlex.quote(remote_path)}; t={shlex.quote(temp_path)}; "
+            f"cp -p -- \"$f\" \"$t\" || exit 1; "
+            f"if split --help 2>/dev/null | grep -q -- --filter; "
+            f"then split -b {block_size} --filter=sha256sum -- \"$t\"; "
+            f"else python3 -c {shlex.quote(BLOCK_HASH_SCRIPT)} \"$t\" {block_size}; fi"
+        )
+        output, _, exit_code = self.execute_command(command, timeout=600)
+        if exit_code != 0:
+            self._remove_quietly(temp_path)
+            return None
+        remote_hashes = [line.split()[0] for line in output.splitlines() if line.strip()]
+
+        sent = 0
+        size = os.path.getsize(local_path)
+        try:
+            with open(local_path, 'rb') as local_file, self.ssh_client.sftp_channel() as sftp:
+                with sftp.open(temp_path, 'r+b') as remote_file:
+                    remote_file.set_pipelined(True)
+                    index = 0
+                    for block in iter(lambda: local_file.read(block_size), b''):
+                        if index >= len(remote_hashes) or hashlib.sha256(block).hexdigest() != remote_hashes[index]:
+                            remote_file.seek(index * block_size)
+                            remote_file.write(block)
+                            sent += len(block)
+                        index += 1
+                sftp.truncate(temp_path, size)
+                sftp.posix_rename(temp_path, remote_path)
+        except BaseException:
+            self._remove_quietly(temp_path)
+            raise
+        return sent
+
+    def _remove_quietly(self, remote_path: str) -> None:
+        """删除远程临时文件，忽略错误"""
+        try:
+            with self.ssh_client.sftp_channel() as sftp:
+                sftp.remove(remote_path)
+        except Exception:
+            pass
+
+    def remote_tools(self, *tools: str) -> set:
+        """
+        检查远程服务器上可用的命令
+        :param tools: 命令名
+        :return: 可用的命令集合
+        """
+        checks = '; '.join(f"command -v {shlex.quote(tool)} >/dev/null 2>&1 && echo {shlex.quote(tool)}" for tool in tools)
+        output, _, _ = self.execute_command(f"{checks}; true")
+        return set(output.split()) & set(tools)
+
+    def tar_compression(self, compression: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """
+        根据两端能力确定tar传输的压缩方式，zstd不可用时退回gzip
+        :param compression: 期望的压缩方式（zstd/gzip/None）
+        :return: (远程是否有tar, 实际使用的压缩方式)；远程没有tar时为在本地压缩可用的方式
+        """
+        if compression not in TAR_COMPRESSIONS:
+            raise ValueError(f"不支持的压缩方式: {compression}")
+        tools = self.remote_tools('tar', 'zstd', 'gzip')
+        if 'tar' not in tools:
+            return False, 'gzip' if compression == 'zstd' and zstandard is None else compression
+        if compression == 'zstd' and (zstandard is None or 'zstd' not in tools):
+            logger.info("zstd不可用，改用gzip压缩")
+            compression = 'gzip'
+        if compression == 'gzip' and 'gzip' not in tools:
+            compression = None
+        return True, compression
+
+    def upload_dir_tar(
+            self, local_dir: str, remote_dir: str, compression: Optional[str] = 'gzip',
+            exclude: Optional[List[str]] = None
+    ) -> bool:
+        """
+        以tar流的方式上传整个目录：本地边打包边通过一个执行通道发送给远程的tar -x，
+        小文件很多时比逐个文件走SFTP快得多；远程没有tar时退回SFTP逐文件上传
+        :param local_dir: 本地目录
+        :param remote_dir: 远程目录（不存在时自动创建）
+        :param compression: 压缩方式：zstd（需要安装zstandard且远程有zstd）、gzip或None
+        :param exclude: 排除的文件名或相对路径通配符
+        :return: 成功返回True，失败返回False
+        """
+        try:
+            if not os.path.isdir(local_dir):
+                logger.error(f"本地目录不存在: {local_dir}")
+                return False
+            exclude = exclude or []
+            has_tar, compression = self.tar_compression(compression)
+            if not has_tar:
+                logger.info(f"远程服务器没有tar，改用SFTP上传目录: {remote_dir}")
+                return not self.sync_dir(local_dir, remote_dir, exclude=exclude)['failed']
+
+            quoted = shlex.quote(remote_dir)
+            # -o: 不还原本地文件的属主，解包后文件归远程登录用户所有
+            extract = {
+                'zstd': f"zstd -d -q | tar -x -o -f - -C {quoted}",
+                'gzip': f"tar -x -o -z -f - -C {quoted}",
+                None: f"tar -x -o -f - -C {quoted}",
+            }[compression]
+
+            def member_filter(info: tarfile.TarInfo) -> Optional[tarfile.TarInfo]:
+                rel = info.name[2:] if info.name.startswith('./') else info.name
+                if rel not in ('', '.') and self._excluded(rel, exclude):
+                    return None
+                info.uid = info.gid = 0
+                info.uname = info.gname = ''
+                return info
+
+            with self.ssh_client.exec_channel(f"mkdir -p {quoted} && {extract}") as channel:
+                writer = _ChannelWriter(channel)
+                if compression == 'zstd':
+                    with zstandard.ZstdCompressor().stream_writer(writer, closefd=False) as compressed:
+                        with tarfile.open(fileobj=compressed, mode='w|') as tar:
+                            tar.add(local_dir, arcname='.', filter=member_filter)
+                else:
+                    with tarfile.open(fileobj=writer, mode='w|gz' if compression == 'gzip' else 'w|') as tar:
+                        tar.add(local_dir, arcname='.', filter=member_filter)
+                channel.shutdown_write()
+                # 先读完标准错误：远程输出的错误信息占满通道窗口时，不读取就等不到退出码
+                error = self._drain_stderr(channel)
+                exit_code = channel.recv_exit_status()
+
+            self.metadata.invalidate(remote_dir, recursive=True)
+            if exit_code != 0:
+                logger.error(f"tar上传目录失败: {error or exit_code}")
+                return False
+            logger.info(f"目录已通过tar上传: {local_dir} -> {remote_dir}（压缩: {compression or '无'}）")
+            return True
+
+        except Exception as e:
+            logger.error(f"上传目录失败: {str(e)}")
+            return False
+
+    def download_dir_tar(
+            self, remote_dir: str, local_dir: str, compression: Optional[str] = 'gzip',
+            exclude: Optional[List[str]] = None
+    ) -> bool:
+        """
+        以tar流的方式下载整个目录：远程tar -c的输出通过一个执行通道边接收边解包；
+        远程没有tar时退回SFTP逐文件下载
+        :param remote_dir: 远程目录
+        :param local_dir: 本地目录（不存在时自动创建）
+        :param compression: 压缩方式：zstd（需要安装zstandard且远程有zstd）、gzip或None
+        :param exclude: 排除的文件名或相对路径通配符
+        :return: 成功返回True，失败返回False
+        """
+        try:
+            exclude = exclude or []
+            os.makedirs(local_dir, exist_ok=True)
+            has_tar, compression = self.tar_compression(compression)
+            if not has_tar:
+                logger.info(f"远程服务器没有tar，改用SFTP下载目录: {remote_dir}")
+                return self._download_dir_sftp(remote_dir, local_dir, exclude)
+
+            command = self.tar_create_command(remote_dir, compression, exclude)
+            # 解包时拒绝绝对路径、..和指向目录外的链接
+            extract_kwargs = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+            with self.ssh_client.exec_channel(command) as channel:
+                channel.shutdown_write()
+                stream = channel.makefile('rb')
+                try:
+                    if compression == 'zstd':
+                        with zstandard.ZstdDecompressor().stream_reader(stream) as decompressed:
+                            with tarfile.open(fileobj=decompressed, mode='r|') as tar:
+                                tar.extractall(local_dir, **extract_kwargs)
+                    else:
+                        with tarfile.open(fileobj=stream, mode='r|gz' if compression == 'gzip' else 'r|') as tar:
+                            tar.extractall(local_dir, **extract_kwargs)
+                except tarfile.ReadError:
+                    # 远程打包失败时输出为空，以远程的错误信息为准
+                    error = self._drain_stderr(channel)
+                    if channel.recv_exit_status() == 0:
+                        raise
+                else:
+                    error = self._drain_stderr(channel)
+                exit_code = channel.recv_exit_status()
+
+            if exit_code != 0:
+                logger.error(f"tar下载目录失败: {error or exit_code}")
+                return False
+            logger.info(f"目录已通过tar下载: {remote_dir} -> {local_dir}（压缩: {compression or '无'}）")
+            return True
+
+        except Exception as e:
+            logger.error(f"下载目录失败: {str(e)}")
+            return False
+
+    @staticmethod
+    def _drain_stderr(channel, limit: int = 65536) -> str:
+        """
+        读取执行通道的标准错误直到结束，只保留前limit字节
+        :param channel: 执行通道
+        :param limit: 保留的最大字节数
+        :return: 错误信息
+        """
+        chunks, size = [], 0
+        while True:
+            data = channel.recv_stderr(32768)
+            if not data:
+                break
+            if size < limit:
+                chunks.append(data[:limit - size])
+                size += len(chunks[-1])
+        return b''.join(chunks).decode('utf-8', errors='replace').strip()
+
+    def iter_dir_tar(
+            self, remote_dir: str, compression: Optional[str] = 'gzip', exclude: Optional[List[str]] = None
+    ) -> Iterator[bytes]:
+        """
+        流式产出远程目录的tar包内容，供HTTP接口直接转发；远程打包失败时抛出异常，
+        调用方据此中断响应，客户端不会收到看似完整的残缺压缩包
+        :param remote_dir: 远程目录
+        :param compression: 压缩方式：zstd、gzip或None（需先经tar_compression确认远程可用）
+        :param exclude: 排除的通配符
+        :return: 生成器，逐块产出tar包内容
+        """
+        errors = []
+        for stream, data in self.stream_command(self.tar_create_command(remote_dir, compression, exclude), timeout=None):
+            if stream == 'stdout':
+                yield data
+            elif stream == 'stderr':
+                errors.append(data)
+            elif stream == 'exit' and data != 0:
+                message = b''.join(errors).decode('utf-8', errors='replace').strip() or f"退出码{data}"
+                logger.error(f"远程打包目录失败: {message}")
+                raise RuntimeError(f"远程打包目录失败: {message}")
+
+    @staticmethod
+    def _stream_compressor(compression: Optional[str]):
+        """
+        创建流式压缩器
+        :param compression: 压缩方式：zstd、gzip或None
+        :return: 具有compress/flush方法的压缩器，None表示不压缩
+        """
+        if compression == 'zstd':
+            return zstandard.ZstdCompressor().compressobj()
+        if compression == 'gzip':
+            return zlib.compressobj(6, zlib.DEFLATED, 31)
+        return None
+
+    def iter_dir_tar_sftp(
+            self, remote_dir: str, compression: Optional[str] = 'gzip', exclude: Optional[List[str]] = None
+    ) -> Iterator[bytes]:
+        """
+        远程没有tar时的iter_dir_tar：通过SFTP逐个读取文件，在本地生成tar流并压缩，
+        文件内容边读边产出，内存占用不超过一批读请求
+        :param remote_dir: 远程目录
+        :param compression: 压缩方式：zstd（需要安装zstandard）、gzip或None
+        :param exclude: 排除的通配符
+        :return: 生成器，逐块产出tar包内容
+        """
+        exclude = exclude or []
+        compressor = self._stream_compressor(compression)
+        written = 0
+        for data in self._iter_tar_members_sftp(remote_dir, exclude):
+            written += len(data)
+            chunk = compressor.compress(data) if compressor else data
+            if chunk:
+                yield chunk
+        # 包尾为两个空块，再补齐到tar记录大小
+        tail = bytes(2 * tarfile.BLOCKSIZE + (-(written + 2 * tarfile.BLOCKSIZE)) % tarfile.RECORDSIZE)
+        yield compressor.compress(tail) + compressor.flush() if compressor else tail
+
+    def _iter_tar_members_sftp(self, remote_dir: str, exclude: List[str]) -> Iterator[bytes]:
+        """
+        通过SFTP遍历远程目录，逐个产出tar成员的头部和内容（未压缩，不含包尾）
+        :param remote_dir: 远程目录
+        :param exclude: 排除的通配符
+        :return: 生成器
+        """
+        with self.ssh_client.sftp_channel() as sftp:
+            pending = ['']
+            while pending:
+                rel_root = pending.pop()
+                entries = sftp.listdir_attr(posixpath.join(remote_dir, rel_root) if rel_root else remote_dir)
+                for attr in sorted(entries, key=lambda entry: entry.filename):
+                    rel = posixpath.join(rel_root, attr.filename)
+                    if self._excluded(rel, exclude):
+                        continue
+                    path = posixpath.join(remote_dir, rel)
+                    mode = attr.st_mode or 0
+                    info = tarfile.TarInfo(f"./{rel}")
+                    info.mode = stat_module.S_IMODE(mode)
+                    info.mtime = int(attr.st_mtime or 0)
+                    if stat_module.S_ISDIR(mode):
+                        info.type = tarfile.DIRTYPE
+                        pending.append(rel)
+                    elif stat_module.S_ISLNK(mode):
+                        info.type = tarfile.SYMTYPE
+                        info.linkname = sftp.readlink(path)
+                    elif stat_module.S_ISREG(mode):
+                        info.size = attr.st_size or 0
+                    else:
+                        # 设备文件、管道等不打包
+                        continue
+                    yield info.tobuf(tarfile.PAX_FORMAT)
+                    if info.type != tarfile.REGTYPE:
+                        continue
+
+                    position = 0
+                    with sftp.open(path, 'rb') as f:
+                        while position < info.size:
+                            batch = []
+                            offset = position
+                            while offset < info.size and len(batch) < SFTP_READ_AHEAD:
+                                batch.append((offset, min(SFTP_READ_SIZE, info.size - offset)))
+                                offset += batch[-1][1]
+                            for data in f.readv(batch):
+                                position += len(data)
+                                yield data
+                    # 成员按512字节对齐，读取期间文件变短时补零以保持包结构完整
+                    yield bytes(info.size - position + (-info.size) % tarfile.BLOCKSIZE)
+
+    @staticmethod
+    def tar_create_command(remote_dir: str, compression: Optional[str] = 'gzip', exclude: Optional[List[str]] = None) -> str:
+        """
+        生成在远程打包目录并输出到标准输出的命令，命令的退出码为tar自身的退出码
+        :param remote_dir: 远程目录
+        :param compression: 压缩方式：zstd、gzip或None
+        :param exclude: 排除的通配符
+        :return: 命令字符串
+        """
+        excludes = ''.join(f" --exclude={shlex.quote(pattern)}" for pattern in exclude or [])
+        tar = f"tar -c -f -{excludes} ."
+        compress = {'zstd': 'zstd -q -c', 'gzip': 'gzip -c', None: None}[compression]
+        if compress is None:
+            return f"sh -c {shlex.quote(f'cd {shlex.quote(remote_dir)} && {tar}')}"
+        return SSHOperations.pipeline_keep_status(tar, compress, prefix=f"cd {shlex.quote(remote_dir)} || exit")
+
+    @staticmethod
+    def pipeline_keep_status(producer: str, consumer: str, prefix: Optional[str] = None) -> str:
+        """
+        生成 producer | consumer 管道命令，退出码为producer的退出码（consumer失败时为consumer的退出码）；
+        普通管道的退出码只是最后一个命令的，不依赖bash的pipefail
+        :param producer: 管道前面的命令
+        :param consumer: 管道后面的命令
+        :param prefix: 在管道之前执行的命令
+        :return: 交给sh执行的命令字符串
+        """
+        # producer的退出码经fd 3单独取出，consumer的输出经fd 4写到原来的标准输出
+        script = (
+            f"{{ status=$({{ {{ {producer}; echo $? >&3; }} | {consumer} >&4; }} 3>&1) || exit; "
+            f"exit \"${{status:-1}}\"; }} 4>&1"
+        )
+        if prefix:
+            script = f"{prefix}; {script}"
+        # 登录shell不一定是POSIX shell，统一交给sh执行
+        return f"sh -c {shlex.quote(script)}"
+
+    def _download_dir_sftp(self, remote_dir: str, local_dir: str, exclude: List[str]) -> bool:
+        """
+        通过SFTP逐文件下载目录，tar不可用时使用
+        :return: 全部成功返回True
+        """
+        with self.ssh_client.sftp_channel() as sftp:
+            files, dirs = self._scan_remote_tree(sftp, remote_dir, exclude)
+            for rel in sorted(dirs):
+                os.makedirs(os.path.join(local_dir, rel), exist_ok=True)
+            for rel, (_, mtime) in files.items():
+                local_path = os.path.join(local_dir, rel)
+                sftp.get(posixpath.join(remote_dir, rel), local_path)
+                os.utime(local_path, (mtime, mtime))
+        logger.info(f"目录已通过SFTP下载: {remote_dir} -> {local_dir}")
+        return True
+
+    def find_entries(
+            self, paths: List[str], predicates: Optional[Dict[str, Any]] = None,
+            min_depth: Optional[int] = None, max_depth: Optional[int] = None,
+            newer_than: Optional[float] = None, timeout: Optional[int] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        在服务端执行一次find（需要GNU find），边输出边解析
+        :param paths: 起始路径列表
+        :param predicates: 搜索条件，见search_files
+        :param min_depth: 最小深度
+        :param max_depth: 最大深度
+        :param newer_than: 只返回修改时间晚于该时间戳的条目
+        :param timeout: 超时时间（秒），None表示不限制
+        :return: 生成器，产出 ('match', {'path', 'type', 'size', 'mtime'})、('error', 错误行)，最后产出 ('exit', 退出码)
+        """
+        predicates = predicates or {}
+        args = ['find', *(shlex.quote(path) for path in paths)]
+        # 深度是全局选项，必须放在其他条件之前
+        if min_depth is not None:
+            args += ['-mindepth', str(int(min_depth))]
+        if max_depth is not None:
+            args += ['-maxdepth', str(int(max_depth))]
+        if predicates.get('name'):
+            args += ['-iname' if predicates.get('ignore_case') else '-name', shlex.quote(predicates['name'])]
+        if predicates.get('file_type'):
+            args += ['-type', {'file': 'f', 'dir': 'd', 'link': 'l'}[predicates['file_type']]]
+        if predicates.get('min_size'):
+            args += ['-size', f"+{int(predicates['min_size']) - 1}c"]
+        if predicates.get('max_size') is not None:
+            args += ['-size', f"-{int(predicates['max_size']) + 1}c"]
+        if predicates.get('modified_after') is not None:
+            args += ['-newermt', f"@{float(predicates['modified_after']):.3f}"]
+        if predicates.get('modified_before') is not None:
+            args += ['!', '-newermt', f"@{float(predicates['modified_before']):.3f}"]
+        if newer_than is not None:
+            args += ['-newermt', f"@{float(newer_than):.3f}"]
+        # 以\0分隔记录，文件名中含换行也能正确解析
+        args += ['-printf', shlex.quote('%y\\t%s\\t%T@\\t%p\\0')]
+
+        pending, errors = b'', b''
+        for stream, data in self.stream_command(' '.join(args), timeout=timeout):
+            if stream == 'stdout':
+                *records, pending = (pending + data).split(b'\0')
+                for record in records:
+                    fields = record.decode('utf-8', errors='replace').split('\t', 3)
+                    if len(fields) == 4:
+                        yield 'match', {
+                            'path': fields[3],
+                            'type': FIND_TYPES.get(fields[0], 'other'),
+                            'size': int(fields[1]),
+                            'mtime': float(fields[2]),
+                        }
+            elif stream == 'stderr':
+                *lines, errors = (errors + data).split(b'\n')
+                for line in lines:
+                    yield 'error', line.decode('utf-8', errors='replace')
+            elif stream == 'exit':
+                if errors:
+                    yield 'error', errors.decode('utf-8', errors='replace')
+                yield 'exit', data
+
+    def search_files(
+            self, root: str, name: Optional[str] = None, ignore_case: bool = False,
+            file_type: Optional[str] = None, min_size: Optional[int] = None, max_size: Optional[int] = None,
+            modified_after: Optional[float] = None, modified_before: Optional[float] = None,
+            max_depth: Optional[int] = None, limit: int = 1000, use_index: bool = False,
+            max_index_age: float = 60, timeout: Optional[int] = 300
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        搜索远程文件：默认在服务端执行一次find并流式返回结果；use_index为True时使用内存中的路径索引，
+        索引不存在时全量构建，超过max_index_age秒则先增量刷新
+        :param root: 搜索的根目录
+        :param name: 文件名通配符
+        :param ignore_case: 文件名匹配是否忽略大小写
+        :param file_type: 类型：file/dir/link
+        :param min_size: 最小字节数
+        :param max_size: 最大字节数
+        :param modified_after: 修改时间晚于该时间戳
+        :param modified_before: 修改时间不晚于该时间戳
+        :param max_depth: 最大深度
+        :param limit: 最多返回的条目数
+        :param use_index: 是否使用路径索引
+        :param max_index_age: 索引最长使用多久（秒）后需要刷新
+        :param timeout: find超时时间（秒）
+        :return: 生成器，产出 ('match', 条目)、('error', 错误行)，最后产出 ('done', {'count', 'truncated', 'source', 'elapsed'})
+        """
+        start = time.perf_counter()
+        if file_type is not None and file_type not in ('file', 'dir', 'link'):
+            raise ValueError(f"不支持的文件类型: {file_type}")
+        predicates = {
+            'name': name, 'ignore_case': ignore_case, 'file_type': file_type,
+            'min_size': min_size, 'max_size': max_size,
+            'modified_after': modified_after, 'modified_before': modified_before, 'max_depth': max_depth,
+        }
+        if use_index:
+            index = self.load_path_index(root, max_index_age)
+            results = (('match', entry) for entry in index.search(predicates))
+        else:
+            results = self.find_entries([root], predicates, max_depth=max_depth, timeout=timeout)
+
+        count, truncated = 0, False
+        for kind, data in results:
+            if kind == 'match':
+                if count >= limit:
+                    truncated = True
+                    break
+                count += 1
+                yield kind, data
+            elif kind == 'error':
+                yield kind, data
+        yield 'done', {
+            'count': count,
+            'truncated': truncated,
+            'source': 'index' if use_index else 'find',
+            'elapsed': round(time.perf_counter() - start, 3),
+        }
+
+    def load_path_index(self, root: str, max_age: float = 60, rebuild: bool = False) -> RemotePathIndex:
+        """
+        获取当前连接上root目录的路径索引，按需全量构建或增量刷新
+        :param root: 根目录
+        :param max_age: 索引最长使用多久（秒）后需要刷新
+        :param rebuild: 是否强制全量重建
+        :return: RemotePathIndex
+        """
+        root = posixpath.normpath(root)
+        index = get_path_index(self.conn_key, root)
+        with index.lock:
+            if rebuild or index.scanned_at is None:
+                scanned_at = self._remote_time()
+                entries = [data for kind, data in self.find_entries([root]) if kind == 'match']
+                index.replace(entries, scanned_at)
+                logger.info(f"路径索引已构建: {self.conn_key}:{root}, {len(index.entries)}个条目")
+            elif index.age() > max_age:
+                self._refresh_path_index(index)
+        return index
+
+    def _refresh_path_index(self, index: RemotePathIndex) -> None:
+        """
+        增量刷新路径索引：找出上次扫描后修改过的条目；内容有变化的目录重新列出直接子项，
+        以发现删除的条目和移入的目录（移入目录保留原修改时间，需要单独扫描）
+        :param index: 路径索引
+        """
+        scanned_at = self._remote_time()
+        changed = [data for kind, data in self.find_entries([index.root], newer_than=index.scanned_at) if kind == 'match']
+        index.update(changed)
+
+        changed_dirs = [entry['path'] for entry in changed if entry['type'] == 'dir']
+        moved_in = []
+        for i in range(0, len(changed_dirs), FIND_PATH_BATCH):
+            batch = changed_dirs[i:i + FIND_PATH_BATCH]
+            current = [data for kind, data in self.find_entries(batch, min_depth=1, max_depth=1) if kind == 'match']
+            present: Dict[str, set] = {}
+            for entry in current:
+                present.setdefault(posixpath.dirname(entry['path']), set()).add(entry['path'])
+                if entry['type'] == 'dir' and entry['path'] not in index.entries:
+                    moved_in.append(entry['path'])
+            for directory in batch:
+                for path in index.children(directory) - present.get(directory, set()):
+                    index.remove_tree(path)
+            index.update(current)
+
+        for i in range(0, len(moved_in), FIND_PATH_BATCH):
+            index.update(
+                data for kind, data in self.find_entries(moved_in[i:i + FIND_PATH_BATCH]) if kind == 'match'
+            )
+        index.mark_refreshed(scanned_at)
+        logger.info(
+            f"路径索引已增量刷新: {self.conn_key}:{index.root}, 修改{len(changed)}个, 移入目录{len(moved_in)}个, "
+            f"共{len(index.entries)}个条目"
+        )
+
+    def _remote_time(self) -> float:
+        """
+        获取远程服务器当前时间，留出1秒余量避免漏掉扫描期间修改的条目
+        :return: 时间戳
+        """
+        output, _, exit_code = self.execute_command("date +%s")
+        if exit_code != 0 or not output.strip().isdigit():
+            raise RuntimeError(f"获取远程时间失败: {output}")
+        return float(output.strip()) - 1
+
     def write_text(self, remote_path: str, content: str) -> bool:
         """
         写入文本到远程文件
@@ -117,16 +1566,17 @@ class SSHOperations:
         :return: 成功返回True，失败返回False
         """
         try:
-            # 确保远程目录存在
-            remote_dir = os.path.dirname(remote_path)
-            try:
-                self.ssh_client.sftp.stat(remote_dir)
-            except FileNotFoundError:
-                # 目录不存在，创建它
-                self._mkdir_p(remote_dir)
+            with self.ssh_client.sftp_channel() as sftp:
+                # 确保远程目录存在（目录状态取自元数据缓存）
+                remote_dir = os.path.dirname(remote_path)
+                if remote_dir:
+                    self.mkdir_p(sftp, remote_dir, self.metadata)
 
-            with self.ssh_client.sftp.file(remote_path, 'w') as f:
-                f.write(content)
+                try:
+                    with sftp.file(remote_path, 'w') as f:
+                        f.write(content)
+                finally:
+                    self.metadata.invalidate(remote_path)
 
             logger.info(f"文本已成功写入: {remote_path}")
             return True
@@ -135,18 +1585,45 @@ class SSHOperations:
             logger.error(f"写入文本失败: {str(e)}")
             return False
 
-    def read_text(self, remote_path: str) -> Optional[str]:
+    def _text_cache_key(self, remote_path: str, *params: Any) -> tuple:
+        """
+        文本读取结果的缓存键，包含文件的修改时间和大小：经本模块写入后元数据缓存失效，键随之变化
+        :param remote_path: 远程文件路径
+        :param params: 读取参数
+        :return: 缓存键
+        """
+        with self.ssh_client.sftp_channel() as sftp:
+            attr = self.metadata.stat(sftp, remote_path)
+        return (self.conn_key, 'text', posixpath.normpath(remote_path), attr.st_mtime, attr.st_size) + params
+
+    def read_text(
+            self, remote_path: str, max_bytes: int = TEXT_READ_MAX_BYTES, use_cache: bool = False
+    ) -> Optional[str]:
         """
-        读取远程文件内容
+        读取远程文件全部内容，超过max_bytes的文件请使用read_text_range/tail_text/read_lines分段读取
         :param remote_path: 远程文件路径
+        :param max_bytes: 允许整体读取的最大字节数
+        :param use_cache: 是否使用结果缓存（相同的并发读取只读取一次）
         :return: 文件内容或None（失败时）
         """
+        if use_cache:
+            try:
+                key = self._text_cache_key(remote_path, 'all', max_bytes)
+            except Exception as e:
+                logger.error(f"读取文件失败: {str(e)}")
+                return None
+            return result_cache.load(key, result_cache.text_ttl, lambda: self.read_text(remote_path, max_bytes))
+
         try:
-            with self.ssh_client.sftp.file(remote_path, 'r') as f:
-                content = f.read()
+            with self.ssh_client.sftp_channel() as sftp:
+                size = sftp.stat(remote_path).st_size
+                if size > max_bytes:
+                    raise ValueError(f"文件大小{size}字节超过上限{max_bytes}字节，请分段读取")
+                with sftp.file(remote_path, 'r') as f:
+                    content = f.read()
 
             if isinstance(content, bytes):
-                content = content.decode('utf-8')
+                content, _ = self.decode_text(content)
 
             logger.info(f"成功读取文件内容: {remote_path}")
             return content
@@ -155,6 +1632,296 @@ class SSHOperations:
             logger.error(f"读取文件失败: {str(e)}")
             return None
 
+    @staticmethod
+    def decode_text(data: bytes, encoding: Optional[str] = None) -> Tuple[str, str]:
+        """
+        解码文本，未指定编码时依次尝试TEXT_ENCODINGS，均失败则按latin-1解码
+        :param data: 原始字节
+        :param encoding: 指定编码，无法解码的字节替换为U+FFFD
+        :return: (文本, 实际使用的编码)
+        """
+        if encoding:
+            return data.decode(encoding, errors='replace'), encoding
+        for candidate in TEXT_ENCODINGS:
+            try:
+                return data.decode(candidate), candidate
+            except UnicodeDecodeError:
+                continue
+        return data.decode('latin-1'), 'latin-1'
+
+    @staticmethod
+    def utf8_bounds(data: bytes, at_start: bool, at_end: bool) -> Tuple[int, int]:
+        """
+        去掉按字节截取时首尾被截断的UTF-8多字节字符
+        :param data: 原始字节
+        :param at_start: 数据是否从文件开头开始
+        :param at_end: 数据是否到文件末尾为止
+        :return: 完整字符所在的区间 (start, end)
+        """
+        start, end = 0, len(data)
+        if not at_start:
+            while start < min(3, end) and 0x80 <= data[start] <= 0xBF:
+                start += 1
+        if not at_end:
+            lead = end - 1
+            while lead >= max(start, end - 4) and 0x80 <= data[lead] <= 0xBF:
+                lead -= 1
+            if lead >= start and data[lead] >= 0xC0:
+                width = 2 if data[lead] < 0xE0 else 3 if data[lead] < 0xF0 else 4
+                if end - lead < width:
+                    end = lead
+        return start, end
+
+    @staticmethod
+    def _read_block(f, offset: int, length: int) -> bytes:
+        """
+        读取文件的一个字节区间（readv会把区间拆成多个读请求流水线发送）
+        :param f: 已打开的SFTP文件
+        :param offset: 起始偏移
+        :param length: 字节数
+        :return: 数据
+        """
+        if length <= 0:
+            return b''
+        return b''.join(f.readv([(offset, length)]))
+
+    def read_text_range(
+            self, remote_path: str, offset: int = 0, length: int = TEXT_READ_MAX_BYTES, encoding: Optional[str] = None,
+            use_cache: bool = False
+    ) -> Dict[str, Any]:
+        """
+        按字节区间读取远程文本文件，内存占用不超过TEXT_READ_MAX_BYTES；
+        UTF-8文件会避开区间首尾被截断的多字节字符，next_offset可直接用于读取下一段
+        :param remote_path: 远程文件路径
+        :param offset: 起始字节偏移
+        :param length: 读取字节数（不超过TEXT_READ_MAX_BYTES）
+        :param encoding: 文本编码，为空时自动识别
+        :param use_cache: 是否使用结果缓存（相同的并发读取只读取一次）
+        :return: {'content', 'offset', 'next_offset', 'size', 'eof', 'encoding'}
+        """
+        length = max(0, min(int(length), TEXT_READ_MAX_BYTES))
+        if use_cache:
+            key = self._text_cache_key(remote_path, 'range', int(offset), length, encoding)
+            # 返回副本，调用方修改结果不影响缓存
+            return dict(result_cache.load(
+                key, result_cache.text_ttl, lambda: self.read_text_range(remote_path, offset, length, encoding)
+            ))
+        with self.ssh_client.sftp_channel() as sftp:
+            size = sftp.stat(remote_path).st_size
+            offset = max(0, min(int(offset), size))
+            with sftp.open(remote_path, 'rb') as f:
+                data = self._read_block(f, offset, min(length, size - offset))
+
+        end_offset = offset + len(data)
+        start, end = 0, len(data)
+        if encoding is None or encoding.lower().replace('_', '-') in ('utf-8', 'utf8'):
+            start, end = self.utf8_bounds(data, offset == 0, end_offset >= size)
+        content, used = self.decode_text(data[start:end], encoding)
+        return {
+            'content': content,
+            'offset': offset + start,
+            'next_offset': offset + end,
+            'size': size,
+            'eof': offset + end >= size,
+            'encoding': used,
+        }
+
+    def tail_text(
+            self, remote_path: str, lines: int = 100, encoding: Optional[str] = None, end: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        读取远程文件末尾若干行（类似tail -n），从文件末尾按块向前读取，最多读取TEXT_READ_MAX_BYTES
+        :param remote_path: 远程文件路径
+        :param lines: 行数
+        :param encoding: 文本编码，为空时自动识别
+        :param end: 视为文件末尾的字节偏移，为空时使用当前文件大小
+        :return: {'content', 'lines', 'offset', 'size', 'truncated', 'encoding'}，
+                 offset为返回内容在文件中的起始偏移，truncated表示因字节上限未能取满行数
+        """
+        lines = max(0, min(int(lines), TEXT_MAX_LINES))
+        with self.ssh_client.sftp_channel() as sftp:
+            size = sftp.stat(remote_path).st_size
+            if end is not None:
+                size = max(0, min(int(end), size))
+            blocks, position, newlines = [], size, 0
+            with sftp.open(remote_path, 'rb') as f:
+                # 末尾换行不算作新的一行，因此需要多找到一个换行符
+                while position > 0 and newlines <= lines and size - position < TEXT_READ_MAX_BYTES:
+                    length = min(TEXT_BLOCK_SIZE, position, TEXT_READ_MAX_BYTES - (size - position))
+                    position -= length
+                    block = self._read_block(f, position, length)
+                    blocks.append(block)
+                    newlines += block.count(b'\n')
+
+        data = b''.join(reversed(blocks))
+        trailing = data.endswith(b'\n')
+        parts = (data[:-1] if trailing else data).split(b'\n')
+        truncated = False
+        if len(parts) > lines:
+            parts = parts[len(parts) - lines:] if lines else []
+        elif position > 0:
+            # 字节上限内没有找到足够的行，首行可能不完整
+            truncated = True
+        raw = b'\n'.join(parts) + (b'\n' if trailing and parts else b'')
+        start, end = 0, len(raw)
+        if truncated and (encoding is None or encoding.lower().replace('_', '-') in ('utf-8', 'utf8')):
+            start, end = self.utf8_bounds(raw, False, True)
+        content, used = self.decode_text(raw[start:end], encoding)
+        return {
+            'content': content,
+            'lines': len(parts) if raw else 0,
+            'offset': size - len(raw) + start,
+            'size': size,
+            'truncated': truncated,
+            'encoding': used,
+        }
+
+    def line_index(self, remote_path: str) -> Dict[str, Any]:
+        """
+        获取远程文件的行偏移索引：每隔LINE_INDEX_INTERVAL行记录一次行首的字节偏移。
+        索引由服务端awk逐行统计生成，只传回偏移列表；文件只增长时从最后一个记录点继续统计，
+        大小变小（被截断或轮转）时重新统计
+        :param remote_path: 远程文件路径
+        :return: {'size', 'mtime', 'interval', 'offsets', 'total'}
+        """
+        with self.ssh_client.sftp_channel() as sftp:
+            stat = sftp.stat(remote_path)
+        key = (self.conn_key, remote_path)
+        index = line_indexes.get(key)
+        if index and index['size'] == stat.st_size and index['mtime'] == stat.st_mtime:
+            return index
+
+        if index and stat.st_size > index['size']:
+            offsets = index['offsets']
+            scanned, total = self._scan_line_offsets(
+                remote_path, offsets[-1], (len(offsets) - 1) * LINE_INDEX_INTERVAL, stat.st_size
+            )
+            offsets = offsets + scanned
+        else:
+            scanned, total = self._scan_line_offsets(remote_path, 0, 0, stat.st_size)
+            offsets = [0] + scanned
+        index = {
+            'size': stat.st_size, 'mtime': stat.st_mtime, 'interval': LINE_INDEX_INTERVAL,
+            'offsets': offsets, 'total': total,
+        }
+        line_indexes.set(key, index)
+        return index
+
+    def _scan_line_offsets(self, remote_path: str, offset: int, line: int, size: int) -> Tuple[List[int], int]:
+        """
+        从某个行首开始统计之后各记录点的字节偏移，远程没有tail/awk时退回SFTP分块读取统计
+        :param remote_path: 远程文件路径
+        :param offset: 起始字节偏移（必须是行首）
+        :param line: 起始偏移对应的行号（从0开始，为LINE_INDEX_INTERVAL的整数倍）
+        :param size: 统计到的文件大小，之后追加的内容留给下次增量统计
+        :return: (记录点偏移列表, 文件总行数)
+        """
+        # LC_ALL=C下awk的length按字节计算；awk不区分最后一行是否以换行结尾，
+        # 偏移超过size说明该行没有换行，其后没有新的行首，不能作为记录点
+        command = (
+            f"tail -c +{offset + 1} {shlex.quote(remote_path)} | head -c {size - offset} | "
+            f"LC_ALL=C awk -v o={offset} -v l={line} -v n={LINE_INDEX_INTERVAL} -v s={size} "
+            f"'{{o += length($0) + 1; l++}} l % n == 0 && o <= s {{print o}} END {{print \"total\", l, o}}'"
+        )
+        deadline = time.monotonic() + LINE_INDEX_TIMEOUT
+        output, error, exit_code = self.execute_command(command, timeout=LINE_INDEX_TIMEOUT)
+        values = output.split()
+        # 管道的退出码只是awk的，以awk读到的字节数确认tail/head正常读完了文件
+        if exit_code == 0 and len(values) >= 3 and values[-3] == 'total' and int(values[-1]) in (size, size + 1):
+            return [int(value) for value in values[:-3]], int(values[-2])
+        if exit_code not in (0, 127):
+            raise RuntimeError(f"统计行偏移失败: {error.strip() or f'退出码: {exit_code}'}")
+
+        logger.warning(f"服务端统计行偏移失败，改用SFTP读取: {remote_path}")
+        offsets, position, newlines, last = [], offset, line, b'\n'
+        with self.ssh_client.sftp_channel() as sftp:
+            with sftp.open(remote_path, 'rb') as f:
+                while position < size:
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"统计行偏移超过{LINE_INDEX_TIMEOUT}秒: {remote_path}")
+                    block = self._read_block(f, position, min(TEXT_BLOCK_SIZE, size - position))
+                    if not block:
+                        break
+                    start = 0
+                    while True:
+                        found = block.find(b'\n', start)
+                        if found < 0:
+                            break
+                        newlines += 1
+                        if newlines % LINE_INDEX_INTERVAL == 0:
+                            offsets.append(position + found + 1)
+                        start = found + 1
+                    position += len(block)
+                    last = block[-1:]
+        return offsets, newlines + (0 if last == b'\n' else 1)
+
+    def read_lines(
+            self, remote_path: str, start_line: int = 1, count: int = 200, encoding: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        按行分页读取远程文本文件：通过行偏移索引定位到最近的记录点，只读取所需的行
+        :param remote_path: 远程文件路径
+        :param start_line: 起始行号（从1开始）
+        :param count: 行数（不超过TEXT_MAX_LINES）
+        :param encoding: 文本编码，为空时自动识别
+        :return: {'lines', 'start_line', 'next_line', 'total_lines', 'size', 'truncated', 'encoding'}，
+                 next_line为None表示已到文件末尾，truncated表示因字节上限提前结束
+        """
+        start_line = max(1, int(start_line))
+        count = max(1, min(int(count), TEXT_MAX_LINES))
+        index = self.line_index(remote_path)
+        checkpoint = min((start_line - 1) // index['interval'], len(index['offsets']) - 1)
+        position = index['offsets'][checkpoint]
+        skip = start_line - 1 - checkpoint * index['interval']
+
+        raw_lines, pending, overflow, collected, truncated = [], b'', False, 0, False
+        with self.ssh_client.sftp_channel() as sftp:
+            with sftp.open(remote_path, 'rb') as f:
+                size = f.stat().st_size
+                while len(raw_lines) < count and collected < TEXT_READ_MAX_BYTES and position < size:
+                    block = self._read_block(f, position, min(TEXT_BLOCK_SIZE, size - position))
+                    if not block:
+                        break
+                    position += len(block)
+                    pieces = block.split(b'\n')
+                    # 超长行只保留前TEXT_READ_MAX_BYTES字节，其余部分丢弃直到遇到换行
+                    pieces[0] = pending + (b'' if overflow else pieces[0])
+                    *complete, pending = pieces
+                    if complete:
+                        overflow = False
+                    for line in complete:
+                        if skip:
+                            skip -= 1
+                            continue
+                        if len(line) > TEXT_READ_MAX_BYTES:
+                            line, truncated = line[:TEXT_READ_MAX_BYTES], True
+                            # 避免截断的UTF-8字符导致整页编码识别失败
+                            line = line[:self.utf8_bounds(line, True, False)[1]]
+                        raw_lines.append(line)
+                        collected += len(line) + 1
+                        if len(raw_lines) >= count or collected >= TEXT_READ_MAX_BYTES:
+                            break
+                    if len(pending) > TEXT_READ_MAX_BYTES:
+                        pending, overflow, truncated = pending[:TEXT_READ_MAX_BYTES], True, True
+                # 文件末尾没有换行的最后一行
+                filled = len(raw_lines) >= count or collected >= TEXT_READ_MAX_BYTES
+                if position >= size and pending and not skip and not filled:
+                    raw_lines.append(pending)
+
+        text, used = self.decode_text(b'\n'.join(raw_lines), encoding)
+        lines = [line.rstrip('\r') for line in text.split('\n')] if raw_lines else []
+        next_line = start_line + len(lines)
+        total = max(index['total'], next_line - 1)
+        return {
+            'lines': lines,
+            'start_line': start_line,
+            'next_line': next_line if next_line <= total else None,
+            'total_lines': total,
+            'size': size,
+            'truncated': truncated or collected >= TEXT_READ_MAX_BYTES,
+            'encoding': used,
+        }
+
     def list_dir(self, remote_path: str) -> List[str]:
         """
         列出远程目录内容
@@ -162,13 +1929,98 @@ class SSHOperations:
         :return: 文件和目录名列表
         """
         try:
-            files = self.ssh_client.sftp.listdir(remote_path)
+            with self.ssh_client.sftp_channel() as sftp:
+                files = [attr.filename for attr in self.metadata.listdir_attr(sftp, remote_path)]
             logger.info(f"列出目录内容: {remote_path}")
             return files
         except Exception as e:
             logger.error(f"列出目录失败: {str(e)}")
             return []
 
+    def list_dir_attr(
+            self, remote_path: str, pattern: Optional[str] = None, sort: str = 'name', reverse: bool = False,
+            dirs_first: bool = True, cursor: Optional[str] = None, limit: int = 200
+    ) -> Dict[str, Any]:
+        """
+        列出远程目录内容及属性，一次listdir_attr取得所有条目的类型、大小、权限和修改时间，支持排序、通配符过滤和游标分页
+        :param remote_path: 远程目录路径
+        :param pattern: 文件名通配符，如*.log
+        :param sort: 排序字段：name/size/mtime/type
+        :param reverse: 是否倒序
+        :param dirs_first: 目录是否排在文件前面
+        :param cursor: 上一页返回的next_cursor，为空表示第一页
+        :param limit: 每页条目数（最多LIST_MAX_LIMIT）
+        :return: {'path': 目录, 'entries': 条目列表, 'total': 过滤后的总数, 'next_cursor': 下一页游标或None}
+        """
+        with self.ssh_client.sftp_channel() as sftp:
+            attrs = self.metadata.listdir_attr(sftp, remote_path)
+        entries = [self.build_dir_entry(attr.filename, attr) for attr in attrs]
+        page = self.paginate_entries(entries, pattern, sort, reverse, dirs_first, cursor, limit)
+        page['path'] = remote_path
+        return page
+
+    @classmethod
+    def build_dir_entry(cls, name: str, stat) -> Dict[str, Any]:
+        """
+        将目录条目转换为字典，在build_file_info的基础上增加name和type
+        :param name: 文件名
+        :param stat: 带有st_size/st_uid/st_gid/st_mode/st_atime/st_mtime属性的对象
+        :return: 条目字典
+        """
+        entry = cls.build_file_info(stat)
+        mode = stat.st_mode or 0
+        if stat_module.S_ISDIR(mode):
+            entry['type'] = 'dir'
+        elif stat_module.S_ISLNK(mode):
+            entry['type'] = 'link'
+        elif stat_module.S_ISREG(mode):
+            entry['type'] = 'file'
+        else:
+            entry['type'] = 'other'
+        entry['name'] = name
+        return entry
+
+    @staticmethod
+    def paginate_entries(
+            entries: List[Dict[str, Any]], pattern: Optional[str] = None, sort: str = 'name', reverse: bool = False,
+            dirs_first: bool = True, cursor: Optional[str] = None, limit: int = 200
+    ) -> Dict[str, Any]:
+        """
+        对目录条目过滤、排序并按游标分页；游标记录上一页最后一个条目的排序字段，条目增删后翻页也不会重复或遗漏
+        :return: {'entries': 当前页条目, 'total': 过滤后的总数, 'next_cursor': 下一页游标或None}
+        """
+        if sort not in LIST_SORT_FIELDS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        limit = max(1, min(limit, LIST_MAX_LIMIT))
+
+        def compare(a: Dict[str, Any], b: Dict[str, Any]) -> int:
+            if dirs_first and (a['type'] == 'dir') != (b['type'] == 'dir'):
+                return -1 if a['type'] == 'dir' else 1
+            for field in (sort, 'name'):
+                x, y = a.get(field) or 0, b.get(field) or 0
+                if x != y:
+                    result = -1 if x < y else 1
+                    return -result if reverse else result
+            return 0
+
+        if pattern:
+            entries = [entry for entry in entries if fnmatch.fnmatchcase(entry['name'], pattern)]
+        entries.sort(key=functools.cmp_to_key(compare))
+        start = 0
+        if cursor:
+            try:
+                last = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            except Exception:
+                raise ValueError("无效的分页游标")
+            start = next((i for i, entry in enumerate(entries) if compare(entry, last) > 0), len(entries))
+
+        page = entries[start:start + limit]
+        next_cursor = None
+        if start + limit < len(entries):
+            last = {field: page[-1].get(field) for field in ('name', 'size', 'mtime', 'type')}
+            next_cursor = base64.urlsafe_b64encode(json.dumps(last).encode('utf-8')).decode('ascii')
+        return {'entries': page, 'total': len(entries), 'next_cursor': next_cursor}
+
     def get_file_info(self, remote_path: str) -> Optional[Dict[str, Any]]:
         """
         获取远程文件信息
@@ -176,39 +2028,49 @@ class SSHOperations:
         :return: 文件信息字典或None（失败时）
         """
         try:
-            stat = self.ssh_client.sftp.stat(remote_path)
-            info = {
-                'size': stat.st_size,
-                'uid': stat.st_uid,
-                'gid': stat.st_gid,
-                'mode': stat.st_mode,
-                'atime': stat.st_atime,
-                'mtime': stat.st_mtime
-            }
-            # 判断是文件还是目录
-            info['is_dir'] = bool(stat.st_mode & 0o40000)
-            info['is_file'] = bool(stat.st_mode & 0o100000)
-            # 获取权限字符串
-            mode_str = ''
-            mode_str += 'd' if info['is_dir'] else '-'
-            mode_str += 'r' if stat.st_mode & 0o400 else '-'
-            mode_str += 'w' if stat.st_mode & 0o200 else '-'
-            mode_str += 'x' if stat.st_mode & 0o100 else '-'
-            mode_str += 'r' if stat.st_mode & 0o40 else '-'
-            mode_str += 'w' if stat.st_mode & 0o20 else '-'
-            mode_str += 'x' if stat.st_mode & 0o10 else '-'
-            mode_str += 'r' if stat.st_mode & 0o4 else '-'
-            mode_str += 'w' if stat.st_mode & 0o2 else '-'
-            mode_str += 'x' if stat.st_mode & 0o1 else '-'
-
-            info['mode_str'] = mode_str
-
-            return info
+            with self.ssh_client.sftp_channel() as sftp:
+                stat = self.metadata.stat(sftp, remote_path)
+            return self.build_file_info(stat)
 
         except Exception as e:
             logger.error(f"获取文件信息失败: {str(e)}")
             return None
 
+    @staticmethod
+    def build_file_info(stat) -> Dict[str, Any]:
+        """
+        将stat结果转换为文件信息字典
+        :param stat: 带有st_size/st_uid/st_gid/st_mode/st_atime/st_mtime属性的对象
+        :return: 文件信息字典
+        """
+        info = {
+            'size': stat.st_size,
+            'uid': stat.st_uid,
+            'gid': stat.st_gid,
+            'mode': stat.st_mode,
+            'atime': stat.st_atime,
+            'mtime': stat.st_mtime
+        }
+        # 判断是文件还是目录
+        info['is_dir'] = bool(stat.st_mode & 0o40000)
+        info['is_file'] = bool(stat.st_mode & 0o100000)
+        # 获取权限字符串
+        mode_str = ''
+        mode_str += 'd' if info['is_dir'] else '-'
+        mode_str += 'r' if stat.st_mode & 0o400 else '-'
+        mode_str += 'w' if stat.st_mode & 0o200 else '-'
+        mode_str += 'x' if stat.st_mode & 0o100 else '-'
+        mode_str += 'r' if stat.st_mode & 0o40 else '-'
+        mode_str += 'w' if stat.st_mode & 0o20 else '-'
+        mode_str += 'x' if stat.st_mode & 0o10 else '-'
+        mode_str += 'r' if stat.st_mode & 0o4 else '-'
+        mode_str += 'w' if stat.st_mode & 0o2 else '-'
+        mode_str += 'x' if stat.st_mode & 0o1 else '-'
+
+        info['mode_str'] = mode_str
+
+        return info
+
     def make_dir(self, remote_path: str) -> bool:
         """
         创建远程目录
@@ -216,7 +2078,9 @@ class SSHOperations:
         :return: 成功返回True，失败返回False
         """
         try:
-            self.ssh_client.sftp.mkdir(remote_path)
+            with self.ssh_client.sftp_channel() as sftp:
+                sftp.mkdir(remote_path)
+            self.metadata.invalidate(remote_path)
             logger.info(f"成功创建目录: {remote_path}")
             return True
 
@@ -231,25 +2095,37 @@ class SSHOperations:
             logger.error(f"创建目录失败: {str(e)}")
             return False
 
-    def _mkdir_p(self, remote_path: str) -> bool:
+    @staticmethod
+    def mkdir_p(sftp, remote_path: str, metadata: Optional[RemoteMetadataCache] = None) -> bool:
         """
-        递归创建目录（类似mkdir -p）
+        在指定SFTP会话上递归创建目录（类似mkdir -p）
+        :param sftp: SFTP会话
         :param remote_path: 远程目录路径
+        :param metadata: 元数据缓存（可选），传入时目录是否存在取自缓存，创建后使缓存失效
         :return: 成功返回True，失败返回False
         """
         if remote_path == '/':
             return True
 
-        try:
-            self.ssh_client.sftp.stat(remote_path)
-            return True
-        except IOError:
-            parent = os.path.dirname(remote_path)
-            if parent and parent != '/':
-                self._mkdir_p(parent)
-            if remote_path != '/':
-                self.ssh_client.sftp.mkdir(remote_path)
+        if metadata is not None:
+            if metadata.is_dir(sftp, remote_path):
                 return True
+        else:
+            try:
+                sftp.stat(remote_path)
+                return True
+            except IOError:
+                pass
+
+        parent = os.path.dirname(remote_path)
+        if parent and parent != '/':
+            SSHOperations.mkdir_p(sftp, parent, metadata)
+        try:
+            sftp.mkdir(remote_path)
+        finally:
+            if metadata is not None:
+                metadata.invalidate(remote_path)
+        return True
 
     def remove_file(self, remote_path: str) -> bool:
         """
@@ -258,7 +2134,9 @@ class SSHOperations:
         :return: 成功返回True，失败返回False
         """
         try:
-            self.ssh_client.sftp.remove(remote_path)
+            with self.ssh_client.sftp_channel() as sftp:
+                sftp.remove(remote_path)
+            self.metadata.invalidate(remote_path)
             logger.info(f"成功删除文件: {remote_path}")
             return True
 
@@ -275,19 +2153,11 @@ class SSHOperations:
         """
         try:
             if recursive:
-                files = self.list_dir(remote_path)
-                for file in files:
-                    file_path = os.path.join(remote_path, file)
-                    file_info = self.get_file_info(file_path)
-
-                    if file_info and file_info['is_dir']:
-                        # 递归删除子目录
-                        self.remove_dir(file_path, recursive=True)
-                    else:
-                        # 删除文件
-                        self.remove_file(file_path)
+                return not self.remove_tree(remote_path)['failed']
 
-            self.ssh_client.sftp.rmdir(remote_path)
+            with self.ssh_client.sftp_channel() as sftp:
+                sftp.rmdir(remote_path)
+            self.metadata.invalidate(remote_path)
             logger.info(f"成功删除目录: {remote_path}")
             return True
 
@@ -295,23 +2165,263 @@ class SSHOperations:
             logger.error(f"删除目录失败: {str(e)}")
             return False
 
-    def execute_command(self, command: str, timeout: int = 60) -> Tuple[str, str, int]:
+    @staticmethod
+    def check_remove_path(remote_path: str, fast: bool = False) -> str:
+        """
+        检查递归删除的目标路径，拒绝根目录、所有顶层目录和PROTECTED_PATHS；fast为True时还要求路径位于RM_ALLOWED_PATHS之下
+        :param remote_path: 远程目录路径
+        :param fast: 是否用于服务端rm -rf
+        :return: 规范化后的路径
+        """
+        if not remote_path or not remote_path.startswith('/'):
+            raise ValueError(f"递归删除只接受绝对路径: {remote_path}")
+        path = posixpath.normpath(remote_path)
+        # normpath会把开头的//保留下来
+        path = '/' + path.lstrip('/')
+        if path in PROTECTED_PATHS or path.count('/') < 2:
+            raise ValueError(f"禁止递归删除系统目录: {path}")
+        if fast and not any(path.startswith(prefix + '/') for prefix in RM_ALLOWED_PATHS):
+            raise ValueError(f"路径不在允许快速删除的目录中: {path}")
+        return path
+
+    @staticmethod
+    def build_rm_command(remote_path: str) -> str:
+        """
+        生成服务端rm -rf命令，输出删除的文件数和目录数
+        :param remote_path: 已检查过的远程目录路径
+        :return: 命令字符串
+        """
+        # 退出码为rm的退出码，而不是awk的
+        return SSHOperations.pipeline_keep_status(
+            f"LC_ALL=C rm -rfv -- {shlex.quote(remote_path)}",
+            "awk '/^removed directory/ {d++; next} {f++} END {print f+0, d+0}'"
+        )
+
+    @staticmethod
+    def parse_rm_result(output: str, error: str, exit_code: int) -> Dict[str, Any]:
+        """
+        解析build_rm_command的执行结果
+        :return: {'files': 文件数, 'dirs': 目录数, 'failed': [{'path', 'error'}]}
+        """
+        counts = output.split()
+        files, dirs = (int(counts[0]), int(counts[1])) if len(counts) == 2 and all(c.isdigit() for c in counts) else (None, None)
+        failed = [{'path': None, 'error': line} for line in error.splitlines() if line.strip()]
+        if exit_code != 0 and not failed:
+            failed.append({'path': None, 'error': f"rm退出码: {exit_code}"})
+        return {'files': files, 'dirs': dirs, 'failed': failed}
+
+    def remove_tree(
+            self, remote_path: str, fast: bool = False, parallelism: int = SSHClient.max_channels,
+            timeout: int = 3600
+    ) -> Dict[str, Any]:
+        """
+        递归删除远程目录：每个目录只需一次listdir_attr，文件由多个SFTP通道并发删除；
+        fast为True时直接在服务端执行rm -rf（只允许RM_ALLOWED_PATHS下的路径）
+        :param remote_path: 远程目录路径
+        :param fast: 是否使用服务端rm -rf
+        :param parallelism: 并发删除的SFTP通道数
+        :param timeout: rm -rf的超时时间（秒）
+        :return: {'files': 删除的文件数, 'dirs': 删除的目录数, 'failed': [{'path', 'error'}], 'method': 'rm'|'sftp', 'elapsed': 耗时}
+        """
+        start = time.perf_counter()
+        path = self.check_remove_path(remote_path, fast)
+
+        if fast:
+            # 解析符号链接后的真实路径同样需要通过检查
+            with self.ssh_client.sftp_channel() as sftp:
+                self.check_remove_path(sftp.normalize(path), fast)
+            output, error, exit_code = self.execute_command(self.build_rm_command(path), timeout)
+            result = self.parse_rm_result(output, error, exit_code)
+            result['method'] = 'rm'
+        else:
+            result = {'files': 0, 'dirs': 0, 'failed': [], 'method': 'sftp'}
+            with self.ssh_client.sftp_channel() as sftp:
+                files, dirs = self._scan_remote_tree(sftp, path, [])
+            # 先并发删除所有文件，再从最深层开始逐层删除目录
+            self._remove_paths([posixpath.join(path, rel) for rel in files], 'remove', 'files', parallelism, result)
+            levels: Dict[int, List[str]] = {}
+            for rel in dirs:
+                levels.setdefault(rel.count('/'), []).append(posixpath.join(path, rel))
+            for depth in sorted(levels, reverse=True):
+                self._remove_paths(levels[depth], 'rmdir', 'dirs', parallelism, result)
+            if not result['failed']:
+                self._remove_paths([path], 'rmdir', 'dirs', 1, result)
+
+        self.metadata.invalidate(path, recursive=True)
+        result['elapsed'] = round(time.perf_counter() - start, 3)
+        logger.info(
+            f"递归删除目录完成({result['method']}): {path}, 文件{result['files']}个, 目录{result['dirs']}个, "
+            f"失败{len(result['failed'])}个, 耗时{result['elapsed']}秒"
+        )
+        return result
+
+    def _remove_paths(
+            self, paths: List[str], method: str, counter: str, parallelism: int, result: Dict[str, Any]
+    ) -> None:
+        """
+        多个SFTP通道并发删除路径，每个通道从共享队列中取路径
+        :param paths: 远程路径列表
+        :param method: SFTP方法名（remove/rmdir）
+        :param counter: 成功时累加的计数字段
+        :param parallelism: 并发通道数
+        :param result: 结果字典
+        """
+        if not paths:
+            return
+        lock = threading.Lock()
+        pending = list(reversed(paths))
+
+        def worker() -> None:
+            with self.ssh_client.sftp_channel() as sftp:
+                remove = getattr(sftp, method)
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        path = pending.pop()
+                    try:
+                        remove(path)
+                        with lock:
+                            result[counter] += 1
+                    except Exception as e:
+                        with lock:
+                            result['failed'].append({'path': path, 'error': str(e)})
+
+        workers = max(1, min(parallelism, len(paths)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(worker) for _ in range(workers)]:
+                future.result()
+
+    def execute_command(self, command: str, timeout: int = 60, use_cache: bool = False) -> Tuple[str, str, int]:
         """执行远程命令
         
         Args:
             command: 要执行的命令
             timeout: 命令超时时间（秒）
+            use_cache: 是否使用结果缓存，仅对result_cache允许列表中的只读命令生效，只缓存退出码为0的结果
             
         Returns:
             元组 (标准输出, 标准错误, 退出码)
         """
-        return self.ssh_client.execute_command(command, timeout)
+        ttl = result_cache.command_ttl(command) if use_cache else None
+        if ttl is None:
+            return self.ssh_client.execute_command(command, timeout)
+        return result_cache.load(
+            (self.conn_key, 'command', command.strip()), ttl,
+            lambda: self.ssh_client.execute_command(command, timeout),
+            cacheable=lambda result: result[2] == 0
+        )
+
+    def stream_command(
+            self, command: str, timeout: Optional[int] = 60, max_bytes: Optional[int] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        流式执行远程命令
+        :param command: 要执行的命令
+        :param timeout: 命令超时时间（秒），None表示不限制
+        :param max_bytes: 输出总字节数上限，超过后截断
+        :return: 生成器，产出 (流名称, 数据)，详见SSHClient.stream_command
+        """
+        # 生成器函数：连接检查和重连在第一次next()时执行，由ssh_dispatcher.stream放到执行层线程中
+        if not self.ssh_client.is_active():
+            self.ssh_client.reconnect()
+        yield from self.ssh_client.stream_command(command, timeout, max_bytes)
+
+    @staticmethod
+    def build_script_command(
+            interpreter: str = 'bash', args: Optional[List[Any]] = None,
+            env: Optional[Dict[str, Any]] = None, script_path: Optional[str] = None
+    ) -> str:
+        """
+        生成执行脚本的命令，参数和环境变量值都经过转义
+        :param interpreter: 解释器，见SCRIPT_INTERPRETERS
+        :param args: 脚本参数
+        :param env: 环境变量（通过env命令注入，不依赖sshd的AcceptEnv配置）
+        :param script_path: 远程脚本路径，为空时从标准输入读取脚本
+        :return: 命令
+        """
+        if interpreter not in SCRIPT_INTERPRETERS:
+            raise ValueError(f"不支持的解释器: {interpreter}，可选: {', '.join(SCRIPT_INTERPRETERS)}")
+        parts = []
+        if env:
+            for name, value in env.items():
+                if not (name.isidentifier() and name.isascii()):
+                    raise ValueError(f"环境变量名不合法: {name}")
+                parts.append(f"{name}={shlex.quote(str(value))}")
+            parts.insert(0, 'env')
+        parts.append(f"{interpreter} {shlex.quote(script_path)}" if script_path else SCRIPT_INTERPRETERS[interpreter])
+        parts.extend(shlex.quote(str(arg)) for arg in args or [])
+        return ' '.join(parts)
+
+    def stream_script(
+            self, script_content: str, args: Optional[List[Any]] = None, env: Optional[Dict[str, Any]] = None,
+            interpreter: str = 'bash', timeout: Optional[int] = 60, max_bytes: Optional[int] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        流式执行远程脚本：脚本内容通过标准输入交给解释器，只使用一个执行通道，不在远程落地临时文件
+        :param script_content: 脚本内容
+        :param args: 脚本参数
+        :param env: 环境变量
+        :param interpreter: 解释器，见SCRIPT_INTERPRETERS
+        :param timeout: 超时时间（秒），None表示不限制
+        :param max_bytes: 输出总字节数上限，超过后截断
+        :return: 生成器，产出 (流名称, 数据)，详见SSHClient.stream_command
+        """
+        command = self.build_script_command(interpreter, args, env)
+        # 末行没有换行时解释器要等到输入结束才执行它，补上换行让脚本与结束标记一起送达
+        if not script_content.endswith('\n'):
+            script_content += '\n'
+        if not self.ssh_client.is_active():
+            self.ssh_client.reconnect()
+        yield from self.ssh_client.stream_command(command, timeout, max_bytes, stdin=script_content.encode('utf-8'))
+
+    def execute_script(
+            self, script_content: str, timeout: int = 60, args: Optional[List[Any]] = None,
+            env: Optional[Dict[str, Any]] = None, interpreter: str = 'bash', use_temp_file: bool = False
+    ) -> Tuple[str, str, int]:
+        """
+        执行远程脚本，默认通过标准输入传入脚本
+        :param script_content: 脚本内容
+        :param timeout: 命令超时时间（秒）
+        :param args: 脚本参数
+        :param env: 环境变量
+        :param interpreter: 解释器，见SCRIPT_INTERPRETERS
+        :param use_temp_file: 是否先写入远程临时文件再执行，仅在脚本自身需要读取标准输入时使用
+        :return: 元组 (标准输出, 标准错误, 退出码)
+        """
+        if use_temp_file:
+            return self._execute_script_file(script_content, timeout, args, env, interpreter)
+
+        try:
+            stdout, stderr, exit_code = [], [], -1
+            for stream, data in self.stream_script(script_content, args, env, interpreter, timeout):
+                if stream == 'stdout':
+                    stdout.append(data)
+                elif stream == 'stderr':
+                    stderr.append(data)
+                elif stream == 'exit':
+                    exit_code = data
+            return (
+                b''.join(stdout).decode('utf-8', errors='replace'),
+                b''.join(stderr).decode('utf-8', errors='replace'),
+                exit_code
+            )
 
-    def execute_script(self, script_content: str, timeout: int = 60) -> Tuple[str, str, int]:
+        except Exception as e:
+            logger.error(f"执行脚本失败: {str(e)}")
+            return "", str(e), -1
+
+    def _execute_script_file(
+            self, script_content: str, timeout: int = 60, args: Optional[List[Any]] = None,
+            env: Optional[Dict[str, Any]] = None, interpreter: str = 'bash'
+    ) -> Tuple[str, str, int]:
         """
-        执行远程脚本
+        写入远程临时文件后执行脚本，执行完删除临时文件
         :param script_content: 脚本内容
         :param timeout: 命令超时时间（秒）
+        :param args: 脚本参数
+        :param env: 环境变量
+        :param interpreter: 解释器，见SCRIPT_INTERPRETERS
         :return: 元组 (标准输出, 标准错误, 退出码)
         """
         # 创建临时脚本文件
@@ -322,17 +2432,13 @@ class SSHOperations:
             if not self.write_text(remote_script_path, script_content):
                 return "", "无法创建临时脚本文件", -1
 
-            # 设置脚本可执行权限
-            chmod_cmd = f"chmod +x {remote_script_path}"
-            _, _, exit_code = self.ssh_client.execute_command(chmod_cmd)
-            if exit_code != 0:
-                return "", f"无法设置脚本可执行权限: {remote_script_path}", exit_code
-
-            # 执行脚本
-            execute_cmd = f"bash {remote_script_path}"
-            output, error, exit_code = self.ssh_client.execute_command(execute_cmd, timeout)
+            # 通过解释器执行脚本，不需要可执行权限
+            execute_cmd = self.build_script_command(interpreter, args, env, remote_script_path)
+            return self.ssh_client.execute_command(execute_cmd, timeout)
 
-            return output, error, exit_code
+        except Exception as e:
+            logger.error(f"执行脚本失败: {str(e)}")
+            return "", str(e), -1
 
         finally:
             # 清理临时脚本文件
@@ -341,7 +2447,6 @@ class SSHOperations:
             except Exception:
                 pass
 
-
 if __name__ == "__main__":
     # 简单测试
     try:
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/16 15:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : ssh_pool.py
+# @Software: PyCharm
+# @desc    : SSH连接池，支持最大连接数限制、LRU淘汰、空闲回收和后台清理线程
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+from utils.log_util import logger
+
+
+class SSHConnectionPool:
+    """
+    SSH连接池
+    连接对象需提供 is_active()、close()、last_used(最近使用时间，time.monotonic)、in_use(正在使用的通道数)。
+    acquire返回的连接在lease_timeout内视为已借出，调用方在此期间打开通道后由in_use继续保护，不会被淘汰或回收。
+    """
+
+    def __init__(
+            self, max_connections: int = 64, idle_timeout: int = 300,
+            reap_interval: int = 60, acquire_timeout: int = 30, lease_timeout: int = 30
+    ):
+        """
+        初始化连接池
+        :param max_connections: 全局最大连接数
+        :param idle_timeout: 空闲超时时间（秒），超过后由后台线程回收
+        :param reap_interval: 后台清理线程的运行间隔（秒）
+        :param acquire_timeout: 连接池已满时等待空位的最长时间（秒）
+        :param lease_timeout: 连接借出后不被淘汰的时间（秒）
+        """
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.acquire_timeout = acquire_timeout
+        self.lease_timeout = lease_timeout
+        # 按最近使用顺序排列，最久未使用的在最前面
+        self._connections: 'OrderedDict[str, Any]' = OrderedDict()
+        # 正在建立中的连接，同一连接键的并发调用共享同一次握手
+        self._pending: Dict[str, Future] = {}
+        # 连接键 -> 借出到期时间（time.monotonic），到期前的连接不会被淘汰
+        self._leases: Dict[str, float] = {}
+        # 只保护上面的字典和统计，握手和探测都不在锁内进行
+        self._lock = threading.Condition()
+        self._reaper = None
+        self._stats = {'created': 0, 'reused': 0, 'evicted_lru': 0, 'evicted_idle': 0, 'evicted_dead': 0}
+
+    def acquire(self, conn_key: str, factory: Callable[[], Any]) -> Any:
+        """
+        获取连接，不存在时调用factory创建
+        :param conn_key: 连接键
+        :param factory: 创建连接的函数
+        :return: 连接对象
+        """
+        self._ensure_reaper()
+        while True:
+            owner = False
+            with self._lock:
+                conn = self._connections.get(conn_key)
+                pending = self._pending.get(conn_key)
+                if conn is not None:
+                    self._connections.move_to_end(conn_key)
+                    # 在锁内借出，探测和调用方打开通道之前不会被其他键的_reserve_slot淘汰
+                    self._lease(conn_key)
+                elif pending is None:
+                    self._reserve_slot(conn_key)
+                    pending = Future()
+                    self._pending[conn_key] = pending
+                    owner = True
+
+            if conn is not None:
+                if conn.is_active():
+                    with self._lock:
+                        self._stats['reused'] += 1
+                    return conn
+                # 连接断开，关闭旧连接（同时从连接池移除）后重新获取
+                logger.info(f"连接已断开，重新创建: {conn_key}")
+                with self._lock:
+                    self._stats['evicted_dead'] += 1
+                conn.close()
+                continue
+
+            if not owner:
+                # 其他线程正在握手，等待其结果（失败时抛出同样的异常）
+                return pending.result()
+
+            try:
+                conn = factory()
+            except BaseException as e:
+                with self._lock:
+                    self._pending.pop(conn_key, None)
+                    self._lock.notify_all()
+                pending.set_exception(e)
+                raise
+
+            with self._lock:
+                self._connections[conn_key] = conn
+                self._pending.pop(conn_key, None)
+                self._lease(conn_key)
+                self._stats['created'] += 1
+            pending.set_result(conn)
+            return conn
+
+    def _lease(self, conn_key: str) -> None:
+        """标记连接已借出（需持有锁）"""
+        self._leases[conn_key] = time.monotonic() + self.lease_timeout
+
+    def _evictable(self, conn_key: str, conn: Any, now: float) -> bool:
+        """连接没有正在使用的通道且借出已到期时才可淘汰（需持有锁）"""
+        if conn.in_use:
+            return False
+        if self._leases.get(conn_key, 0) > now:
+            return False
+        self._leases.pop(conn_key, None)
+        return True
+
+    def _reserve_slot(self, conn_key: str) -> None:
+        """
+        确保有空位创建新连接（需持有锁），必要时按LRU淘汰空闲连接，仍无空位则等待
+        :param conn_key: 连接键
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        while len(self._connections) + len(self._pending) >= self.max_connections:
+            now = time.monotonic()
+            victim_key = next(
+                (key for key, conn in self._connections.items() if self._evictable(key, conn, now)), None
+            )
+            if victim_key is not None:
+                victim = self._connections.pop(victim_key)
+                self._stats['evicted_lru'] += 1
+                logger.info(f"连接池已满，淘汰最久未使用的连接: {victim_key}")
+                # 关闭操作涉及网络IO，放到后台线程，避免持锁阻塞
+                threading.Thread(target=victim.close, daemon=True).start()
+                continue
+            remaining = deadline - now
+            if remaining <= 0:
+                raise RuntimeError(f"SSH连接池已满（{self.max_connections}），无法创建连接: {conn_key}")
+            # 借出到期不会触发通知，最多等到最早的借出到期时再检查
+            lease_expiry = min(
+                (expires_at for key, expires_at in self._leases.items() if key in self._connections), default=None
+            )
+            self._lock.wait(remaining if lease_expiry is None else max(0.01, min(remaining, lease_expiry - now)))
+
+    def discard(self, conn_key: str, conn: Any) -> None:
+        """
+        从连接池中移除连接（不负责关闭）
+        :param conn_key: 连接键
+        :param conn: 连接对象，只有与池中对象相同时才移除
+        """
+        with self._lock:
+            if self._connections.get(conn_key) is conn:
+                del self._connections[conn_key]
+                self._leases.pop(conn_key, None)
+                self._lock.notify_all()
+
+    def get(self, conn_key: str) -> Any:
+        """
+        获取已存在的连接，不创建新连接
+        :param conn_key: 连接键
+        :return: 连接对象或None
+        """
+        with self._lock:
+            return self._connections.get(conn_key)
+
+    def connections(self) -> List[Any]:
+        """
+        获取当前所有连接的快照
+        :return: 连接对象列表
+        """
+        with self._lock:
+            return list(self._connections.values())
+
+    def reap(self) -> int:
+        """
+        回收空闲超时或已断开的连接
+        :return: 回收的连接数
+        """
+        now = time.monotonic()
+        victims = []
+        with self._lock:
+            for key, conn in list(self._connections.items()):
+                if not self._evictable(key, conn, now):
+                    continue
+                if now - conn.last_used > self.idle_timeout:
+                    self._stats['evicted_idle'] += 1
+                elif not conn.is_alive():
+                    self._stats['evicted_dead'] += 1
+                else:
+                    continue
+                victims.append(self._connections.pop(key))
+            if victims:
+                self._lock.notify_all()
+
+        for conn in victims:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.warning(f"回收连接时出错: {str(e)}")
+        return len(victims)
+
+    def _ensure_reaper(self) -> None:
+        """按需启动后台清理线程"""
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="ssh-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        """后台清理线程"""
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                count = self.reap()
+                if count:
+                    logger.info(f"已回收 {count} 个空闲SSH连接")
+            except Exception as e:
+                logger.error(f"清理SSH连接池失败: {str(e)}")
+
+    def close_all(self) -> None:
+        """关闭连接池中的所有连接"""
+        with self._lock:
+            conns = list(self._connections.values())
+        for conn in conns:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取连接池指标
+        :return: 指标字典
+        """
+        now = time.monotonic()
+        with self._lock:
+            connections = {key: conn.in_use for key, conn in self._connections.items()}
+            pending = len(self._pending)
+            leased = sum(1 for expires_at in self._leases.values() if expires_at > now)
+            data = dict(self._stats)
+        data.update({
+            'size': len(connections),
+            'pending': pending,
+            'leased': leased,
+            'in_use': connections,
+            'max_connections': self.max_connections,
+            'idle_timeout': self.idle_timeout,
+        })
+        return data
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 11:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : ssh_result_cache.py
+# @Software: PyCharm
+# @desc    : 只读命令和文本读取的结果缓存，相同的并发请求合并为一次远程执行
+import asyncio
+import re
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from plugin.module_ssh.core.ssh_cache import TTLCache
+
+# 允许缓存的只读命令：(完整匹配命令的正则, 缓存秒数)，可通过result_cache.allow_command追加
+DEFAULT_COMMAND_RULES: List[Tuple[str, float]] = [
+    (r"df(\s+-[a-zA-Z]+)*(\s+[\w./-]+)*", 10),
+    (r"free(\s+-[a-z]+)*", 5),
+    (r"uptime(\s+-[a-z]+)?", 5),
+    (r"cat\s+/proc/(loadavg|meminfo|cpuinfo|uptime|version)", 5),
+    (r"uname(\s+-[a-zA-Z]+)*", 300),
+    (r"hostname(\s+-[a-zA-Z]+)?", 300),
+    (r"nproc", 300),
+    (r"lscpu", 300),
+    (r"whoami", 300),
+]
+# 包含这些字符的命令一律不缓存：可能组合执行其他命令、重定向或展开变量
+UNSAFE_COMMAND_CHARS = frozenset(';|&$`<>(){}[]*?!\\\'"\n\r')
+# 缓存条目数上限，超过后淘汰最久未使用的条目
+RESULT_CACHE_SIZE = 512
+# 单个结果的字节数上限，更大的结果不缓存；缓存内存占用不超过 RESULT_CACHE_SIZE * RESULT_CACHE_ITEM_MAX_BYTES
+RESULT_CACHE_ITEM_MAX_BYTES = 256 * 1024
+# 文本读取结果的缓存秒数（缓存键包含文件的修改时间和大小）
+TEXT_CACHE_TTL = 10
+
+
+class SingleFlight:
+    """合并相同键的并发调用（线程版）：同一时刻只有一个调用真正执行，其余调用等待并共享结果或异常"""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result: Any = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self):
+        self._calls: Dict[Hashable, 'SingleFlight._Call'] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行调用，已有相同键的调用在进行时等待其结果
+        :param key: 调用键
+        :param func: 要执行的函数
+        :return: (结果, 是否与其他调用共享)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = func()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class ResultCache:
+    """
+    远程结果缓存：按(连接键, 类型, ...)缓存结果，过期时间按命令分别设置，容量有上限并按LRU淘汰；
+    未命中时相同键的并发请求只执行一次远程调用。只缓存成功的结果
+    """
+
+    def __init__(
+            self, max_size: int = RESULT_CACHE_SIZE, item_max_bytes: int = RESULT_CACHE_ITEM_MAX_BYTES,
+            rules: List[Tuple[str, float]] = None, text_ttl: float = TEXT_CACHE_TTL
+    ):
+        """
+        初始化结果缓存
+        :param max_size: 最大条目数
+        :param item_max_bytes: 单个结果的字节数上限
+        :param rules: 允许缓存的命令规则 [(正则, 缓存秒数), ...]
+        :param text_ttl: 文本读取结果的缓存秒数
+        """
+        self.item_max_bytes = item_max_bytes
+        self.text_ttl = text_ttl
+        self._cache = TTLCache(max_size=max_size, ttl=text_ttl)
+        self._rules = [(re.compile(pattern), ttl) for pattern, ttl in (DEFAULT_COMMAND_RULES if rules is None else rules)]
+        self._flight = SingleFlight()
+        # 异步后端使用的合并表，键 -> 正在执行的Future
+        self._async_flights: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {'coalesced': 0, 'loads': 0, 'oversize': 0}
+
+    def allow_command(self, pattern: str, ttl: float) -> None:
+        """
+        追加允许缓存的命令规则
+        :param pattern: 完整匹配命令的正则
+        :param ttl: 缓存秒数
+        """
+        with self._lock:
+            self._rules.append((re.compile(pattern), ttl))
+
+    def command_ttl(self, command: str) -> Optional[float]:
+        """
+        判断命令是否允许缓存
+        :param command: 命令
+        :return: 缓存秒数，不允许缓存时返回None
+        """
+        command = command.strip()
+        if not command or any(char in UNSAFE_COMMAND_CHARS for char in command):
+            return None
+        with self._lock:
+            rules = list(self._rules)
+        for pattern, ttl in rules:
+            if pattern.fullmatch(command):
+                return ttl
+        return None
+
+    @staticmethod
+    def _size(value: Any) -> int:
+        """估算结果占用的字节数"""
+        if isinstance(value, (str, bytes)):
+            return len(value)
+        if isinstance(value, dict):
+            return sum(ResultCache._size(item) for item in value.values())
+        if isinstance(value, (tuple, list)):
+            return sum(ResultCache._size(item) for item in value)
+        return 16
+
+    def _incr(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _store(self, key: Hashable, value: Any, ttl: float, cacheable: Callable[[Any], bool]) -> None:
+        """写入成功且不超过大小上限的结果"""
+        if not cacheable(value):
+            return
+        if self._size(value) > self.item_max_bytes:
+            self._incr('oversize')
+            return
+        self._cache.set(key, value, ttl)
+
+    def load(
+            self, key: Hashable, ttl: float, loader: Callable[[], Any],
+            cacheable: Callable[[Any], bool] = lambda value: value is not None
+    ) -> Any:
+        """
+        获取缓存结果，未命中时执行loader（阻塞调用，相同键的并发调用只执行一次）
+        :param key: 缓存键
+        :param ttl: 缓存秒数
+        :param loader: 获取结果的函数
+        :param cacheable: 判断结果是否可以缓存（如命令退出码为0）
+        :return: 结果
+        """
+        value = self._cache.get(key)
+        if value is not None:
+            return value
+
+        def run() -> Any:
+            self._incr('loads')
+            result = loader()
+            self._store(key, result, ttl, cacheable)
+            return result
+
+        value, shared = self._flight.do(key, run)
+        if shared:
+            self._incr('coalesced')
+        return value
+
+    async def aload(
+            self, key: Hashable, ttl: float, loader: Callable[[], Awaitable[Any]],
+            cacheable: Callable[[Any], bool] = lambda value: value is not None
+    ) -> Any:
+        """
+        load的协程版本，供asyncssh后端使用，合并发生在同一事件循环内
+        :param key: 缓存键
+        :param ttl: 缓存秒数
+        :param loader: 返回结果的协程函数
+        :param cacheable: 判断结果是否可以缓存
+        :return: 结果
+        """
+        value = self._cache.get(key)
+        if value is not None:
+            return value
+        future = self._async_flights.get(key)
+        if future is not None:
+            self._incr('coalesced')
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._async_flights[key] = future
+        try:
+            self._incr('loads')
+            result = await loader()
+            self._store(key, result, ttl, cacheable)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免"Future exception was never retrieved"警告
+            future.exception()
+            raise
+        finally:
+            del self._async_flights[key]
+
+    def invalidate(self, conn_key: Optional[str] = None) -> int:
+        """
+        使缓存失效
+        :param conn_key: 只清除该连接的结果，为空时全部清除
+        :return: 清除的条目数
+        """
+        if conn_key is None:
+            count = len(self._cache)
+            self._cache.clear()
+            return count
+        return self._cache.delete_where(lambda key: key[0] == conn_key)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存指标
+        :return: 指标字典
+        """
+        data = self._cache.stats()
+        with self._lock:
+            data.update(self._stats)
+            data['rules'] = len(self._rules)
+        data['item_max_bytes'] = self.item_max_bytes
+        return data
+
+
+# 全局结果缓存
+result_cache = ResultCache()
@@ -0,0 +1,526 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 07:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : ssh_shell.py
+# @Software: PyCharm
+# @desc    : 持久化交互式shell会话，PTY通道长期保持，支持Web终端附加、断线重连回放和顺序执行命令
+import queue
+import re
+import select
+import shlex
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from utils.log_util import logger
+from plugin.module_ssh.core.ssh_follow import FollowSubscriber
+
+# 每个会话保留的最近输出字节数，重新连接的客户端可从中回放
+SHELL_BUFFER_SIZE = 256 * 1024
+# 默认空闲超时（秒）：没有客户端附加且没有输入输出超过该时间后关闭会话
+SHELL_IDLE_TIMEOUT = 900
+# 单个连接上最多同时保持的会话数（shell通道不占用SSHClient的通道名额）
+MAX_SHELLS_PER_CONNECTION = 8
+# 单次读取的最大字节数
+SHELL_READ_SIZE = 32768
+# 待发送输入的最大条数
+SHELL_INPUT_QUEUE_SIZE = 1024
+# 会话清理间隔（秒）
+SHELL_REAP_INTERVAL = 30
+# 在会话中执行命令时输出的默认上限
+SHELL_COMMAND_MAX_BYTES = 1024 * 1024
+
+
+class OutputRingBuffer:
+    """按绝对偏移记录的输出环形缓冲区，只保留最近capacity字节"""
+
+    def __init__(self, capacity: int = SHELL_BUFFER_SIZE):
+        """
+        初始化缓冲区
+        :param capacity: 保留的字节数
+        """
+        self.capacity = capacity
+        self._data = bytearray()
+        # 会话开始以来输出的总字节数，即缓冲区末尾的绝对偏移
+        self.end = 0
+
+    @property
+    def start(self) -> int:
+        """缓冲区中最早可回放内容的绝对偏移"""
+        return max(self.end - self.capacity, self.end - len(self._data))
+
+    def append(self, data: bytes) -> None:
+        """
+        追加输出
+        :param data: 输出内容
+        """
+        self._data += data
+        self.end += len(data)
+        # 超出两倍容量时才裁剪，避免每次追加都移动整个缓冲区
+        if len(self._data) > self.capacity * 2:
+            del self._data[:len(self._data) - self.capacity]
+
+    def read_from(self, offset: Optional[int] = None) -> Tuple[int, bytes]:
+        """
+        读取从offset开始的缓冲内容
+        :param offset: 绝对偏移，为空或早于缓冲区起点时从缓冲区起点开始
+        :return: (实际起始偏移, 内容)
+        """
+        start = self.start
+        if offset is None or offset < start:
+            offset = start
+        offset = min(offset, self.end)
+        return offset, bytes(self._data[len(self._data) - (self.end - offset):])
+
+
+class _CommandCapture:
+    """从shell输出中截取一条命令的输出：内容位于开始标记和结束标记之间，结束标记带退出码"""
+
+    def __init__(self, token: str, max_bytes: int):
+        self.start_marker = f"\x1fS{token}\x1f".encode()
+        self.end_pattern = re.compile(rb"\x1fE" + token.encode() + rb":(\d+)\x1f")
+        # 结束标记的最大长度，尾部这么多字节要等后续数据到达才能确定是否属于标记
+        self.keep = len(token) + 16
+        self.max_bytes = max_bytes
+        self.pending = bytearray()
+        self.output = bytearray()
+        self.truncated = 0
+        self.started = False
+        self.exit_code: Optional[int] = None
+        self.done = threading.Event()
+
+    def feed(self, data: bytes) -> None:
+        """
+        处理新的输出（在会话读取线程中调用）
+        :param data: 输出内容
+        """
+        if self.done.is_set():
+            return
+        self.pending += data
+        if not self.started:
+            index = self.pending.find(self.start_marker)
+            if index < 0:
+                # 回显的命令行和之前的输出都丢弃
+                del self.pending[:max(0, len(self.pending) - len(self.start_marker))]
+                return
+            del self.pending[:index + len(self.start_marker)]
+            self.started = True
+        match = self.end_pattern.search(self.pending)
+        if match:
+            self.exit_code = int(match.group(1))
+            self._keep(self.pending[:match.start()])
+            self.pending.clear()
+            self.done.set()
+        elif len(self.pending) > self.keep:
+            self._keep(self.pending[:-self.keep])
+            del self.pending[:-self.keep]
+
+    def _keep(self, data: bytes) -> None:
+        """保存输出，超过上限的部分只计数"""
+        room = max(0, self.max_bytes - len(self.output))
+        self.output += data[:room]
+        self.truncated += max(0, len(data) - room)
+
+
+class ShellSession:
+    """单个持久化shell会话：后台线程读取PTY输出写入环形缓冲区并分发给附加的客户端"""
+
+    def __init__(
+            self, ssh_client, ssh_id: Any = None, term: str = 'xterm', cols: int = 80, rows: int = 24,
+            idle_timeout: int = SHELL_IDLE_TIMEOUT, buffer_size: int = SHELL_BUFFER_SIZE, owner: Any = None
+    ):
+        """
+        打开shell通道（阻塞调用，需在线程中执行）
+        :param ssh_client: SSHClient实例
+        :param ssh_id: SSH服务器ID，仅用于展示
+        :param term: 终端类型
+        :param cols: 终端列数
+        :param rows: 终端行数
+        :param idle_timeout: 空闲超时时间（秒）
+        :param buffer_size: 输出缓冲区大小
+        :param owner: 创建会话的用户ID，只有该用户可以访问会话
+        """
+        self.session_id = uuid.uuid4().hex
+        self.ssh_client = ssh_client
+        self.ssh_id = ssh_id
+        self.owner = owner
+        self.conn_key = f"{ssh_client.username}@{ssh_client.host}:{ssh_client.port}"
+        self.term = term
+        self.cols = cols
+        self.rows = rows
+        self.idle_timeout = idle_timeout
+        self.created_at = time.time()
+        self.last_active = time.monotonic()
+        self.buffer = OutputRingBuffer(buffer_size)
+        self.subscribers: List[FollowSubscriber] = []
+        # 会话结束原因，为空表示仍在运行
+        self.closed_reason: Optional[str] = None
+        self._lock = threading.Lock()
+        self._command_lock = threading.Lock()
+        self._capture: Optional[_CommandCapture] = None
+        self._input: queue.Queue = queue.Queue(maxsize=SHELL_INPUT_QUEUE_SIZE)
+        self._stopping = threading.Event()
+        self._channel = ssh_client.open_shell(term, cols, rows)
+        self._reader = threading.Thread(target=self._read_loop, name=f"ssh-shell-{self.session_id[:8]}", daemon=True)
+        self._writer = threading.Thread(target=self._write_loop, name=f"ssh-shell-in-{self.session_id[:8]}", daemon=True)
+
+    @property
+    def closed(self) -> bool:
+        """会话是否已结束"""
+        return self.closed_reason is not None
+
+    def start(self) -> None:
+        """启动读写线程"""
+        self._reader.start()
+        self._writer.start()
+
+    def stop(self) -> None:
+        """请求关闭会话，读取线程会在下一次轮询时关闭通道"""
+        self._stopping.set()
+
+    def touch(self) -> None:
+        """记录最近一次活动时间"""
+        self.last_active = time.monotonic()
+
+    def attach(self, subscriber: FollowSubscriber, since: Optional[int] = None) -> Tuple[int, bytes]:
+        """
+        附加客户端，返回需要回放的缓冲内容；回放内容与之后推送的数据首尾相接
+        :param subscriber: 订阅者
+        :param since: 客户端已收到内容的结束偏移，为空时回放整个缓冲区
+        :return: (回放内容的起始偏移, 回放内容)
+        """
+        with self._lock:
+            self.touch()
+            if not self.closed:
+                self.subscribers.append(subscriber)
+            return self.buffer.read_from(since)
+
+    def detach(self, subscriber: FollowSubscriber) -> None:
+        """
+        移除客户端，会话继续运行，直到空闲超时
+        :param subscriber: 订阅者
+        """
+        with self._lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            self.touch()
+
+    def write(self, data: bytes) -> None:
+        """
+        发送输入（不阻塞，可在事件循环中直接调用），由写入线程按顺序发送
+        :param data: 输入内容
+        """
+        if self.closed or self._stopping.is_set():
+            raise RuntimeError(f"会话已关闭: {self.closed_reason or '正在关闭'}")
+        try:
+            self._input.put_nowait(data)
+        except queue.Full:
+            raise RuntimeError("会话输入过多，远程未及时接收")
+        self.touch()
+
+    def resize(self, cols: int, rows: int) -> None:
+        """
+        调整终端大小
+        :param cols: 列数
+        :param rows: 行数
+        """
+        self._channel.resize_pty(width=cols, height=rows)
+        self.cols, self.rows = cols, rows
+
+    def run_command(
+            self, command: str, timeout: int = 60, max_bytes: int = SHELL_COMMAND_MAX_BYTES
+    ) -> Dict[str, Any]:
+        """
+        在会话中执行一条命令并等待结束（阻塞调用，需在线程中执行）
+        命令通过eval在当前shell中执行，cd、export等对之后的命令和终端保持有效；
+        PTY合并了标准输出和标准错误，超时后发送Ctrl+C中断命令
+        :param command: 要执行的命令
+        :param timeout: 超时时间（秒）
+        :param max_bytes: 输出上限，超出部分丢弃
+        :return: {'output', 'exit_code', 'truncated', 'timed_out'}
+        """
+        if not self._command_lock.acquire(timeout=timeout):
+            raise TimeoutError("会话正在执行其他命令")
+        try:
+            token = uuid.uuid4().hex[:12]
+            capture = _CommandCapture(token, max_bytes)
+            with self._lock:
+                self._capture = capture
+            self.write(
+                f"printf '\\037S%s\\037' {token}; eval {shlex.quote(command)}; "
+                f"printf '\\037E%s:%s\\037' {token} \"$?\"\n".encode()
+            )
+            finished = capture.done.wait(timeout)
+            if not finished and not self.closed:
+                self.write(b'\x03')
+            output = bytes(capture.output).replace(b'\r\n', b'\n')
+            return {
+                'output': output.decode('utf-8', errors='replace'),
+                'exit_code': capture.exit_code,
+                'truncated': capture.truncated,
+                'timed_out': not finished,
+            }
+        finally:
+            with self._lock:
+                self._capture = None
+            self._command_lock.release()
+
+    def _publish(self, kind: str, data: Any) -> None:
+        """
+        记录输出并分发给附加的客户端
+        :param kind: data/end
+        :param data: 消息内容
+        """
+        with self._lock:
+            if kind == 'data':
+                self.buffer.append(data)
+                self.touch()
+            capture = self._capture
+            subscribers = list(self.subscribers)
+            if kind == 'end':
+                self.closed_reason = data
+                self.subscribers = []
+        if capture is not None:
+            if kind == 'data':
+                capture.feed(data)
+            else:
+                capture.done.set()
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, kind, data)
+            except RuntimeError:
+                # 订阅者的事件循环已关闭
+                self.detach(subscriber)
+
+    def _read_loop(self) -> None:
+        """读取线程：读取shell输出直到被关闭、shell退出或连接断开"""
+        channel = self._channel
+        reason = "已关闭"
+        try:
+            while not self._stopping.is_set():
+                if channel.recv_ready():
+                    data = channel.recv(SHELL_READ_SIZE)
+                    if data:
+                        self._publish('data', data)
+                        continue
+                if channel.exit_status_ready():
+                    reason = f"shell已退出({channel.recv_exit_status()})"
+                    break
+                if channel.closed or channel.eof_received:
+                    reason = "通道已关闭"
+                    break
+                select.select([channel], [], [], 0.5)
+        except Exception as e:
+            reason = f"读取失败: {str(e)}"
+            logger.error(f"读取shell会话输出失败: {self.session_id}, {str(e)}")
+        finally:
+            self._stopping.set()
+            # 先关闭通道，阻塞在sendall中的写入线程随即失败退出，再通知等待输入的写入线程
+            self.ssh_client.close_shell(channel)
+            self._stop_writer()
+            self._publish('end', reason)
+            logger.info(f"shell会话结束: {self.conn_key} {self.session_id}, {reason}")
+
+    def _stop_writer(self) -> None:
+        """向写入线程发送结束标记，队列已满时丢弃未发送的输入（通道已关闭，无法再发送）"""
+        while True:
+            try:
+                self._input.put_nowait(None)
+                return
+            except queue.Full:
+                try:
+                    self._input.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _write_loop(self) -> None:
+        """写入线程：按顺序发送输入"""
+        while True:
+            data = self._input.get()
+            if data is None:
+                return
+            try:
+                self._channel.sendall(data)
+            except Exception as e:
+                logger.warning(f"发送shell会话输入失败: {self.session_id}, {str(e)}")
+                self.stop()
+                return
+
+    def idle(self) -> bool:
+        """没有附加的客户端且超过空闲超时时间"""
+        with self._lock:
+            return not self.subscribers and time.monotonic() - self.last_active > self.idle_timeout
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取会话信息
+        :return: 信息字典
+        """
+        with self._lock:
+            return {
+                'session_id': self.session_id,
+                'ssh_id': self.ssh_id,
+                'owner': self.owner,
+                'connection': self.conn_key,
+                'term': self.term,
+                'cols': self.cols,
+                'rows': self.rows,
+                'clients': len(self.subscribers),
+                'output_offset': self.buffer.end,
+                'buffer_start': self.buffer.start,
+                'idle_seconds': round(time.monotonic() - self.last_active, 1),
+                'idle_timeout': self.idle_timeout,
+                'created_at': self.created_at,
+                'closed': self.closed_reason,
+            }
+
+
+class ShellRegistry:
+    """按会话ID管理shell会话，后台线程关闭空闲会话并移除已结束的会话"""
+
+    def __init__(self, max_per_connection: int = MAX_SHELLS_PER_CONNECTION, reap_interval: int = SHELL_REAP_INTERVAL):
+        """
+        初始化注册表
+        :param max_per_connection: 单个连接上最多同时保持的会话数
+        :param reap_interval: 清理间隔（秒）
+        """
+        self.max_per_connection = max_per_connection
+        self.reap_interval = reap_interval
+        self._sessions: Dict[str, ShellSession] = {}
+        # 正在打开的会话数，连接键 -> 数量；打开PTY不持有锁，先在锁内占用名额
+        self._opening: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def create(self, ssh_ops, ssh_id: Any = None, term: str = 'xterm', cols: int = 80, rows: int = 24,
+               idle_timeout: int = SHELL_IDLE_TIMEOUT, owner: Any = None) -> ShellSession:
+        """
+        创建会话（阻塞调用，需在线程中执行）
+        :param ssh_ops: SSHOperations实例
+        :param ssh_id: SSH服务器ID
+        :param term: 终端类型
+        :param cols: 终端列数
+        :param rows: 终端行数
+        :param idle_timeout: 空闲超时时间（秒）
+        :param owner: 创建会话的用户ID
+        :return: ShellSession
+        """
+        conn_key = ssh_ops.conn_key
+        with self._lock:
+            active = sum(
+                1 for session in self._sessions.values()
+                if session.conn_key == conn_key and not session.closed
+            ) + self._opening.get(conn_key, 0)
+            if active >= self.max_per_connection:
+                raise RuntimeError(f"同一服务器最多同时保持{self.max_per_connection}个shell会话")
+            self._opening[conn_key] = self._opening.get(conn_key, 0) + 1
+        try:
+            session = ShellSession(ssh_ops.ssh_client, ssh_id, term, cols, rows, idle_timeout, owner=owner)
+        finally:
+            with self._lock:
+                self._opening[conn_key] -= 1
+                if not self._opening[conn_key]:
+                    del self._opening[conn_key]
+        with self._lock:
+            self._sessions[session.session_id] = session
+        session.start()
+        self._ensure_reaper()
+        logger.info(f"创建shell会话: {session.conn_key} {session.session_id}")
+        return session
+
+    def get(self, session_id: str, owner: Any) -> Optional[ShellSession]:
+        """
+        获取会话
+        :param session_id: 会话ID
+        :param owner: 当前用户ID
+        :return: ShellSession，不存在或不属于该用户时返回None
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+        return session if session is not None and session.owner == owner else None
+
+    def close(self, session_id: str, owner: Any) -> bool:
+        """
+        关闭并移除会话
+        :param session_id: 会话ID
+        :param owner: 当前用户ID
+        :return: 会话存在且属于该用户返回True
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.owner != owner:
+                return False
+            del self._sessions[session_id]
+        session.stop()
+        return True
+
+    def reap(self) -> int:
+        """
+        关闭空闲会话，移除已结束且没有客户端附加的会话
+        :return: 处理的会话数
+        """
+        with self._lock:
+            victims = [
+                session for session in self._sessions.values()
+                if session.closed or session.idle()
+            ]
+            for session in victims:
+                del self._sessions[session.session_id]
+        for session in victims:
+            session.stop()
+        return len(victims)
+
+    def _ensure_reaper(self) -> None:
+        """按需启动后台清理线程"""
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="ssh-shell-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        """后台清理线程"""
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                count = self.reap()
+                if count:
+                    logger.info(f"已清理 {count} 个shell会话")
+            except Exception as e:
+                logger.error(f"清理shell会话失败: {str(e)}")
+
+    def stop_all(self) -> None:
+        """关闭所有会话"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.stop()
+
+    def list(self, owner: Any) -> List[Dict[str, Any]]:
+        """
+        获取用户自己的会话信息
+        :param owner: 当前用户ID
+        :return: 信息列表
+        """
+        with self._lock:
+            sessions = [session for session in self._sessions.values() if session.owner == owner]
+        return [session.stats() for session in sessions]
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """
+        获取所有会话信息，用于运行指标；会话ID即访问凭证，不包含在内
+        :return: 信息列表
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return [
+            {key: value for key, value in session.stats().items() if key != 'session_id'}
+            for session in sessions
+        ]
+
+
+# 全局shell会话注册表
+shell_sessions = ShellRegistry()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/16 18:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : ssh_transfer.py
+# @Software: PyCharm
+# @desc    : 文件传输进度登记，供前端按传输ID查询进度
+import time
+from typing import Any, Dict, Optional
+from plugin.module_ssh.core.ssh_cache import TTLCache
+
+
+class TransferProgress:
+    """传输进度登记表，条目在最后一次更新后保留一段时间供查询"""
+
+    def __init__(self, max_size: int = 1024, ttl: int = 3600):
+        """
+        初始化进度登记表
+        :param max_size: 最多保留的传输记录数
+        :param ttl: 记录在最后一次更新后的保留时间（秒）
+        """
+        self._records = TTLCache(max_size=max_size, ttl=ttl)
+
+    def start(self, transfer_id: Optional[str], remote_path: str, total: Optional[int] = None) -> None:
+        """
+        登记一次传输
+        :param transfer_id: 传输ID，为空时不登记
+        :param remote_path: 远程路径
+        :param total: 总字节数（未知时为None）
+        """
+        if not transfer_id:
+            return
+        self._records.set(transfer_id, {
+            'transfer_id': transfer_id,
+            'remote_path': remote_path,
+            'transferred': 0,
+            'total': total,
+            'status': 'running',
+            'error': None,
+            'started_at': time.time(),
+            'updated_at': time.time(),
+        })
+
+    def update(self, transfer_id: Optional[str], transferred: int, total: Optional[int] = None) -> None:
+        """
+        更新已传输字节数
+        :param transfer_id: 传输ID
+        :param transferred: 已传输字节数
+        :param total: 总字节数（可选）
+        """
+        record = self._records.get(transfer_id) if transfer_id else None
+        if record is None:
+            return
+        record['transferred'] = transferred
+        if total is not None:
+            record['total'] = total
+        record['updated_at'] = time.time()
+        # 重新写入以刷新过期时间
+        self._records.set(transfer_id, record)
+
+    def finish(self, transfer_id: Optional[str], error: Optional[str] = None) -> None:
+        """
+        标记传输结束
+        :param transfer_id: 传输ID
+        :param error: 错误信息，为空表示成功
+        """
+        record = self._records.get(transfer_id) if transfer_id else None
+        if record is None:
+            return
+        record['status'] = 'failed' if error else 'success'
+        record['error'] = error
+        record['updated_at'] = time.time()
+        self._records.set(transfer_id, record)
+
+    def get(self, transfer_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询传输进度
+        :param transfer_id: 传输ID
+        :return: 进度字典或None
+        """
+        record = self._records.get(transfer_id)
+        return dict(record) if record else None
+
+
+# 全局传输进度登记表
+transfer_progress = TransferProgress()
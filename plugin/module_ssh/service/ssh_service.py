@@ -6,8 +6,16 @@
 # @Software : PyCharm
 # @Desc     : 服务器操作模块服务层
 from sqlalchemy.ext.asyncio import AsyncSession
+from utils.log_util import logger
 from module_admin.service.servermanage_service import SshService
 from utils.pwd_util import PwdUtil, hash_key
+from plugin.module_ssh.core.ssh_cache import TTLCache
+
+# 服务器记录缓存（只保存加密后的密码），减少每次请求的数据库查询
+_connection_cache = TTLCache(max_size=2048, ttl=300)
+# 解密后的密码单独缓存，过期时间更短，过期后从内存中清除；
+# 键为(ssh_id, 加密密码)，数据库中的密码修改后不会再取到旧的明文
+_secret_cache = TTLCache(max_size=2048, ttl=60)
 
 
 async def get_ssh_connection_details(query_db: AsyncSession, ssh_id: int):
@@ -18,14 +26,52 @@ async def get_ssh_connection_details(query_db: AsyncSession, ssh_id: int):
     :return:
     """
     try:
-        # 获取SSH服务器详情
-        ssh_info = await SshService.ssh_detail_services(query_db, ssh_id)
-        if not ssh_info:
-            return None
+        record = _connection_cache.get(ssh_id)
+        if record is None:
+            # 获取SSH服务器详情
+            ssh_info = await SshService.ssh_detail_services(query_db, ssh_id)
+            if not ssh_info:
+                return None
+            record = (ssh_info.ssh_host, ssh_info.ssh_username, ssh_info.ssh_password, ssh_info.ssh_port)
+            _connection_cache.set(ssh_id, record)
+
+        host, username, hashed_password, port = record
         # 解密密码
         password = None
-        if ssh_info.ssh_password:
-            password = PwdUtil.decrypt(hash_key=hash_key, hashed_password=ssh_info.ssh_password)
-        return ssh_info.ssh_host, ssh_info.ssh_username, password, ssh_info.ssh_port
+        if hashed_password:
+            password = _secret_cache.get((ssh_id, hashed_password))
+            if password is None:
+                # 顺带清理其他已过期的明文密码
+                _secret_cache.purge_expired()
+                password = PwdUtil.decrypt(hash_key=hash_key, hashed_password=hashed_password)
+                _secret_cache.set((ssh_id, hashed_password), password)
+        return host, username, password, port
     except Exception as e:
+        logger.error(f"获取SSH连接详情失败: ssh_id={ssh_id}, {str(e)}")
         return None
+
+
+def invalidate_ssh_connection_details(ssh_id: int = None) -> None:
+    """
+    使SSH连接详情缓存失效，服务器信息修改或删除后需调用
+    :param ssh_id: SSH服务器ID，为None时清空全部缓存
+    :return:
+    """
+    if ssh_id is None:
+        _connection_cache.clear()
+        _secret_cache.clear()
+    else:
+        _connection_cache.delete(ssh_id)
+        _secret_cache.delete_where(lambda key: key[0] == ssh_id)
+
+
+def get_ssh_connection_cache_stats():
+    """
+    获取SSH连接详情缓存的命中统计
+    :return: 指标字典
+    """
+    _secret_cache.purge_expired()
+    return {
+        'records': _connection_cache.stats(),
+        'secrets': _secret_cache.stats()
+    }
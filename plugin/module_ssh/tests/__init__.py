@@ -0,0 +1,8 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 14:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : __init__.py
+# @Software: PyCharm
+# @desc    : SSH模块测试
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 14:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : conftest.py
+# @Software: PyCharm
+# @desc    : 测试夹具：在进程内启动asyncssh服务端，并以同一套接口包装paramiko和asyncssh两种后端
+import asyncio
+import os
+import threading
+from typing import Any, Callable
+import asyncssh
+import pytest
+from plugin.module_ssh.core.async_ssh_client import AsyncSSHClient, AsyncSSHOperations
+from plugin.module_ssh.core.ssh_client import SSHClient
+from plugin.module_ssh.core.ssh_operations import SSHOperations
+
+SSH_USERNAME = 'tester'
+SSH_PASSWORD = 'secret'
+
+
+class _PasswordServer(asyncssh.SSHServer):
+    """只接受SSH_PASSWORD的密码认证"""
+
+    def begin_auth(self, username: str) -> bool:
+        return True
+
+    def password_auth_supported(self) -> bool:
+        return True
+
+    def validate_password(self, username: str, password: str) -> bool:
+        return password == SSH_PASSWORD
+
+
+async def _pump(reader, write: Callable[[bytes], Any], close: Callable[[], Any] = None) -> None:
+    """把reader的数据转发给write，结束时调用close"""
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            write(data)
+    except Exception:
+        pass
+    finally:
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+
+async def _handle_process(process: asyncssh.SSHServerProcess) -> None:
+    """在本机shell中执行exec请求，转发标准输入输出并返回退出码"""
+    proc = await asyncio.create_subprocess_shell(
+        process.command or 'sh', env={**os.environ, **(process.env or {})},
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        start_new_session=True
+    )
+    feeder = asyncio.ensure_future(_pump(process.stdin, proc.stdin.write, proc.stdin.close))
+    await asyncio.gather(_pump(proc.stdout, process.stdout.write), _pump(proc.stderr, process.stderr.write))
+    code = await proc.wait()
+    feeder.cancel()
+    process.exit(code if code >= 0 else 255)
+
+
+class InProcessSSHServer:
+    """运行在独立线程事件循环中的asyncssh服务端，支持exec和SFTP（直接访问本机文件系统）"""
+
+    def __init__(self, host_key_path: str):
+        self.host = '127.0.0.1'
+        self.port = 0
+        self._host_key_path = host_key_path
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='ssh-test-server', daemon=True)
+        self._server = None
+
+    async def _start(self) -> None:
+        self._server = await asyncssh.create_server(
+            _PasswordServer, self.host, 0, server_host_keys=[self._host_key_path],
+            process_factory=_handle_process, sftp_factory=True, encoding=None
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def start(self) -> 'InProcessSSHServer':
+        asyncssh.generate_private_key('ssh-ed25519').write_private_key(self._host_key_path)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result(timeout=10)
+        return self
+
+    def stop(self) -> None:
+        async def close():
+            self._server.close()
+            await self._server.wait_closed()
+            # 仍在处理已有连接的任务随事件循环一起结束
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+
+
+class BackendAdapter:
+    """
+    以同步方式调用两种后端的同名方法，测试用例只需写一次
+    paramiko后端直接调用SSHOperations；asyncssh后端在专用事件循环中运行AsyncSSHOperations的协程
+    """
+
+    def __init__(self, name: str, server: InProcessSSHServer, loop: asyncio.AbstractEventLoop):
+        self.name = name
+        self.server = server
+        self._loop = loop
+        if name == 'paramiko':
+            self.ops = SSHOperations.from_credentials(server.host, SSH_USERNAME, SSH_PASSWORD, server.port)
+        else:
+            self.ops = loop.run_until_complete(
+                AsyncSSHOperations.from_credentials(server.host, SSH_USERNAME, SSH_PASSWORD, server.port)
+            )
+
+    def __call__(self, operation: str, *args, **kwargs) -> Any:
+        result = getattr(self.ops, operation)(*args, **kwargs)
+        if asyncio.iscoroutine(result):
+            result = self._loop.run_until_complete(result)
+        return result
+
+    def test_connection(self, password: str = SSH_PASSWORD):
+        if self.name == 'paramiko':
+            return SSHClient.test_connection(self.server.host, SSH_USERNAME, password, self.server.port)
+        return self._loop.run_until_complete(
+            AsyncSSHClient.test_connection(self.server.host, SSH_USERNAME, password, self.server.port)
+        )
+
+
+@pytest.fixture(scope='session')
+def ssh_server(tmp_path_factory) -> InProcessSSHServer:
+    server = InProcessSSHServer(str(tmp_path_factory.mktemp('sshd') / 'host_key')).start()
+    yield server
+    SSHClient._pool.close_all()
+    server.stop()
+
+
+@pytest.fixture(scope='session')
+def backend_loop() -> asyncio.AbstractEventLoop:
+    # AsyncSSHClient按连接键缓存连接，所有asyncssh用例共用一个事件循环
+    loop = asyncio.new_event_loop()
+    yield loop
+    for client in list(AsyncSSHClient._connections.values()):
+        loop.run_until_complete(client.close())
+    loop.close()
+
+
+@pytest.fixture(params=['paramiko', 'asyncssh'])
+def backend(request, ssh_server, backend_loop) -> BackendAdapter:
+    return BackendAdapter(request.param, ssh_server, backend_loop)
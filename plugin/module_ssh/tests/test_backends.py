@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 14:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : test_backends.py
+# @Software: PyCharm
+# @desc    : paramiko与asyncssh后端共用的测试用例，连接conftest中启动的进程内SSH服务端
+import os
+import pytest
+from plugin.module_ssh.core import ssh_operations
+from plugin.module_ssh.core.async_ssh_client import AsyncSSHClient
+from plugin.module_ssh.core.ssh_operations import SSHOperations
+from plugin.module_ssh.tests.conftest import SSH_PASSWORD, SSH_USERNAME, BackendAdapter
+
+
+def test_connection(backend):
+    assert backend.test_connection() == (True, "")
+    success, error = backend.test_connection(password='wrong')
+    assert not success
+    assert error
+
+
+def test_execute_command(backend):
+    assert backend('execute_command', 'echo hello') == ('hello\n', '', 0)
+
+
+def test_execute_command_stderr_and_exit_code(backend):
+    output, error, exit_code = backend('execute_command', 'echo out; echo err >&2; exit 3')
+    assert output == 'out\n'
+    assert error == 'err\n'
+    assert exit_code == 3
+
+
+def test_execute_command_cached(backend):
+    first = backend('execute_command', 'uname -s', use_cache=True)
+    assert first[2] == 0
+    assert backend('execute_command', 'uname -s', use_cache=True) == first
+
+
+def test_execute_script(backend):
+    script = 'echo "$1-$FOO"\nexit 2\n'
+    output, _, exit_code = backend('execute_script', script, 60, ['a'], {'FOO': 'b'}, 'sh')
+    assert output == 'a-b\n'
+    assert exit_code == 2
+
+
+def test_write_and_read_text(backend, tmp_path):
+    remote_path = str(tmp_path / 'note.txt')
+    assert backend('write_text', remote_path, '第一行\nsecond\n')
+    assert backend('read_text', remote_path) == '第一行\nsecond\n'
+    assert backend('read_text', remote_path, use_cache=True) == '第一行\nsecond\n'
+
+    assert backend('write_text', remote_path, 'changed\n')
+    assert backend('read_text', remote_path, use_cache=True) == 'changed\n'
+
+
+def test_read_text_missing_file(backend, tmp_path):
+    assert backend('read_text', str(tmp_path / 'missing.txt')) is None
+
+
+def test_read_text_over_limit(backend, tmp_path):
+    remote_path = str(tmp_path / 'big.txt')
+    assert backend('write_text', remote_path, 'x' * 100)
+    assert backend('read_text', remote_path, 10) is None
+
+
+def test_upload_and_download_file(backend, tmp_path):
+    data = os.urandom(300 * 1024)
+    local_path = tmp_path / 'source.bin'
+    local_path.write_bytes(data)
+    remote_path = str(tmp_path / 'remote.bin')
+    download_path = tmp_path / 'download.bin'
+
+    progress = []
+    assert backend('upload_file', str(local_path), remote_path, lambda done, total: progress.append((done, total)))
+    assert progress and progress[-1] == (len(data), len(data))
+    assert backend('download_file', remote_path, str(download_path))
+    assert download_path.read_bytes() == data
+
+
+def test_directory_operations(backend, tmp_path):
+    remote_dir = str(tmp_path / 'dir')
+    assert backend('make_dir', remote_dir)
+    assert backend('make_dir', remote_dir)
+    assert backend('write_text', f"{remote_dir}/a.txt", 'a')
+    assert backend('make_dir', f"{remote_dir}/sub")
+
+    assert sorted(backend('list_dir', remote_dir)) == ['a.txt', 'sub']
+    page = backend('list_dir_attr', remote_dir)
+    assert [entry['name'] for entry in page['entries']] == ['sub', 'a.txt']
+
+    info = backend('get_file_info', f"{remote_dir}/a.txt")
+    assert info['size'] == 1
+    assert info['is_file'] and not info['is_dir']
+    assert backend('get_file_info', f"{remote_dir}/missing") is None
+
+    assert not backend('remove_dir', remote_dir)
+    assert backend('remove_file', f"{remote_dir}/a.txt")
+    assert backend('remove_dir', f"{remote_dir}/sub")
+    assert backend('remove_dir', remote_dir)
+    assert not os.path.exists(remote_dir)
+
+
+def test_remove_tree(backend, tmp_path):
+    remote_dir = str(tmp_path / 'tree')
+    for sub in ('', '/x', '/x/y'):
+        assert backend('make_dir', remote_dir + sub)
+        assert backend('write_text', f"{remote_dir}{sub}/f.txt", 'data')
+
+    result = backend('remove_tree', remote_dir)
+    assert result['files'] == 3
+    assert result['dirs'] == 3
+    assert result['failed'] == []
+    assert not os.path.exists(remote_dir)
+
+
+def test_line_index_last_line_without_newline(ssh_server, tmp_path, monkeypatch):
+    # 行偏移索引只有paramiko后端实现
+    monkeypatch.setattr(ssh_operations, 'LINE_INDEX_INTERVAL', 2)
+    ops = SSHOperations.from_credentials(ssh_server.host, SSH_USERNAME, SSH_PASSWORD, ssh_server.port)
+    remote_path = tmp_path / 'lines.txt'
+    remote_path.write_bytes(b'a\nb\nc\nd')
+    index = ops.line_index(str(remote_path))
+    assert index['offsets'] == [0, 4]
+    assert index['total'] == 4
+
+    remote_path.write_bytes(b'a\nb\nc\nd\n')
+    index = ops.line_index(str(remote_path))
+    assert index['offsets'] == [0, 4, 8]
+    assert ops.read_lines(str(remote_path), 3, 5)['lines'] == ['c', 'd']
+
+
+def test_asyncssh_write_invalidates_paramiko_cache(ssh_server, backend_loop, tmp_path):
+    # asyncssh后端下流式等操作仍经由paramiko连接，asyncssh的写入需使其缓存失效
+    paramiko_backend = BackendAdapter('paramiko', ssh_server, backend_loop)
+    asyncssh_backend = BackendAdapter('asyncssh', ssh_server, backend_loop)
+    remote_path = str(tmp_path / 'shared.txt')
+    assert paramiko_backend('write_text', remote_path, 'old\n')
+    assert paramiko_backend('read_text', remote_path, use_cache=True) == 'old\n'
+    assert paramiko_backend('get_file_info', remote_path)['size'] == 4
+
+    assert asyncssh_backend('write_text', remote_path, 'new content\n')
+    assert paramiko_backend('get_file_info', remote_path)['size'] == 12
+    assert paramiko_backend('read_text', remote_path, use_cache=True) == 'new content\n'
+
+    assert asyncssh_backend('remove_file', remote_path)
+    assert paramiko_backend('get_file_info', remote_path) is None
+
+
+
+def test_asyncssh_reconnect_keeps_registry_entry(ssh_server, backend_loop):
+    async def run():
+        conn = await AsyncSSHClient.get_connection(ssh_server.host, SSH_USERNAME, SSH_PASSWORD, ssh_server.port)
+        conn.client.close()
+        await conn.client.wait_closed()
+        assert await conn.execute_command('echo again') == ('again\n', '', 0)
+        return conn, await AsyncSSHClient.get_connection(ssh_server.host, SSH_USERNAME, SSH_PASSWORD, ssh_server.port)
+
+    conn, registered = backend_loop.run_until_complete(run())
+    # 重连只替换底层连接，注册表中仍是同一个实例，不会另建一个连接
+    assert registered is conn
+
+def test_upload_abort_removes_partial_file(ssh_server, tmp_path):
+    # 流式上传只有paramiko后端实现
+    ops = SSHOperations.from_credentials(ssh_server.host, SSH_USERNAME, SSH_PASSWORD, ssh_server.port)
+    remote_path = tmp_path / 'partial.bin'
+    upload = ops.open_upload(str(remote_path))
+    upload.write(b'x' * 1024)
+    upload.abort()
+    assert not remote_path.exists()
+    # 删除完成后才归还SFTP会话，归还的会话仍可继续使用
+    upload = ops.open_upload(str(remote_path))
+    upload.write(b'ok')
+    upload.close()
+    assert remote_path.read_bytes() == b'ok'
+
+
+def test_sync_dir_patches_changed_blocks(ssh_server, tmp_path):
+    # 目录同步只有paramiko后端实现
+    ops = SSHOperations.from_credentials(ssh_server.host, SSH_USERNAME, SSH_PASSWORD, ssh_server.port)
+    block = ssh_operations.SYNC_MIN_BLOCK_SIZE
+    local_dir, remote_dir = tmp_path / 'local', tmp_path / 'remote'
+    local_dir.mkdir()
+    remote_dir.mkdir()
+    (remote_dir / 'data.bin').write_bytes(b'a' * block + b'b' * block + b'c' * block)
+    (remote_dir / 'data.bin').chmod(0o640)
+    content = b'a' * block + b'B' * block + b'c' * (block // 2)
+    (local_dir / 'data.bin').write_bytes(content)
+
+    with pytest.raises(ValueError):
+        ops.sync_dir(str(local_dir), str(remote_dir), block_size=block - 1)
+    result = ops.sync_dir(str(local_dir), str(remote_dir), block_size=block)
+    assert result['patched'] == 1
+    # 改动的第二块和被截短的最后一块
+    assert result['bytes_sent'] == block + block // 2
+    assert (remote_dir / 'data.bin').read_bytes() == content
+    # 写入临时文件后重命名覆盖，保留原文件权限，不留下临时文件
+    assert (remote_dir / 'data.bin').stat().st_mode & 0o777 == 0o640
+    assert sorted(os.listdir(remote_dir)) == ['data.bin']
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 16:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : test_dispatcher.py
+# @Software: PyCharm
+# @desc    : ssh_dispatcher的流式操作：建立流时的阻塞工作不在事件循环线程中执行
+import asyncio
+import threading
+import pytest
+from plugin.module_ssh.core.ssh_client import SSHClient
+from plugin.module_ssh.core.ssh_dispatcher import ssh_dispatcher
+from plugin.module_ssh.tests.conftest import SSH_PASSWORD, SSH_USERNAME
+
+
+@pytest.mark.parametrize('operation, args', [
+    ('stream_command', ('echo hello',)),
+    ('stream_script', ('echo hello',)),
+])
+def test_stream_checks_connection_off_loop(ssh_server, monkeypatch, operation, args):
+    threads = []
+    is_active = SSHClient.is_active
+
+    def record(self):
+        threads.append(threading.current_thread())
+        return is_active(self)
+
+    monkeypatch.setattr(SSHClient, 'is_active', record)
+    target = (ssh_server.host, SSH_USERNAME, SSH_PASSWORD, ssh_server.port)
+
+    async def run():
+        chunks = await ssh_dispatcher.stream(target, operation, *args)
+        return threading.current_thread(), [item async for item in chunks]
+
+    loop_thread, items = asyncio.run(run())
+    assert ('stdout', b'hello\n') in items
+    assert items[-1] == ('exit', 0)
+    assert threads and loop_thread not in threads
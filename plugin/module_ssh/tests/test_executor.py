@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 18:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : test_executor.py
+# @Software: PyCharm
+# @desc    : ssh_executor的主机并发名额：超时或取消后仍在执行的阻塞调用继续占用名额，主机空闲后清理信号量
+import asyncio
+import threading
+import pytest
+from plugin.module_ssh.core.ssh_executor import SSHExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = SSHExecutor(max_workers=4, per_host_limit=1)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def test_timeout_keeps_slot_until_call_returns(executor):
+    release = threading.Event()
+    order = []
+
+    def blocking():
+        release.wait(5)
+        order.append('blocking')
+
+    def quick():
+        order.append('quick')
+        return 'done'
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.run('host', blocking, wait_timeout=0.05)
+        # 阻塞调用仍在执行，同一主机的下一个任务必须排队
+        second = asyncio.ensure_future(executor.run('host', quick))
+        await asyncio.sleep(0.1)
+        assert not second.done()
+        assert executor.stats()['host_waiting'] == {'host': 1}
+        release.set()
+        assert await second == 'done'
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert order == ['blocking', 'quick']
+    assert executor._host_semaphores == {}
+    assert executor._host_users == {}
+
+
+def test_cancelled_stream_keeps_slot_until_closed(executor):
+    release = threading.Event()
+    closed = threading.Event()
+
+    def produce():
+        try:
+            yield 1
+            release.wait(5)
+            yield 2
+        finally:
+            closed.set()
+
+    async def run():
+        async def consume():
+            async for _ in executor.iterate('host', produce()):
+                pass
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        # 第一次取消进入关闭流程等待next()返回，第二次取消放弃等待
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # 工作线程仍卡在next()中，名额未归还
+        assert executor._host_semaphores['host'].locked()
+        release.set()
+        assert await executor.run('host', lambda: 'next') == 'next'
+        assert closed.is_set()
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert executor._host_semaphores == {}
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 19:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : test_jobs.py
+# @Software: PyCharm
+# @desc    : 后台任务：进程组ID行的解析与setsid兜底、拿到进程组ID前取消、结束阶段删除任务
+import os
+import subprocess
+import time
+import pytest
+from plugin.module_ssh.core import ssh_jobs
+from plugin.module_ssh.core.ssh_jobs import JOB_HEADER_MAX_BYTES, SSHJobManager
+from plugin.module_ssh.tests.conftest import SSH_PASSWORD, SSH_USERNAME
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return SSHJobManager(spool_dir=str(tmp_path / 'spool'))
+
+
+@pytest.fixture
+def target(ssh_server):
+    return ssh_server.host, SSH_USERNAME, SSH_PASSWORD, ssh_server.port
+
+
+def wait_finished(job, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not job.finished and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert job.finished
+
+
+def test_split_pgid():
+    # 登录shell在进程组ID行之前的输出保留
+    assert SSHJobManager.split_pgid(b'motd\n__PGID__123\nout') == (True, 123, b'motd\nout')
+    # 进程组ID行尚未完整，继续缓存
+    assert SSHJobManager.split_pgid(b'__PGID__12') == (False, None, b'')
+    assert SSHJobManager.split_pgid(b'__PGID__abc\nout') == (True, None, b'out')
+    # 超过缓存上限仍未找到时放弃，输出原样返回
+    header = b'x' * (JOB_HEADER_MAX_BYTES + 1)
+    assert SSHJobManager.split_pgid(header) == (True, None, header)
+
+
+def test_wrap_command_without_setsid(tmp_path):
+    fake_bin = tmp_path / 'bin'
+    fake_bin.mkdir()
+    (fake_bin / 'setsid').write_text('#!/bin/sh\nexit 1\n')
+    (fake_bin / 'setsid').chmod(0o755)
+    env = dict(os.environ, PATH=f"{fake_bin}:{os.environ['PATH']}")
+    wrapped = SSHJobManager.wrap_command("echo 'a b'; exit 4")
+    process = subprocess.run(['sh', '-c', wrapped], capture_output=True, env=env)
+    done, pgid, output = SSHJobManager.split_pgid(process.stdout)
+    assert done and pgid
+    assert output == b'a b\n'
+    assert process.returncode == 4
+
+
+def test_cancel_before_pgid_known(manager, target, monkeypatch):
+    wrap_command = SSHJobManager.wrap_command
+    # 延迟输出进程组ID行，取消请求先于进程组ID到达
+    monkeypatch.setattr(SSHJobManager, 'wrap_command', staticmethod(lambda command: f"sleep 1; {wrap_command(command)}"))
+    job = manager.submit(target, 'sleep 30')
+    while job.status != 'running':
+        time.sleep(0.01)
+    assert job.pgid is None
+    manager.cancel(job.job_id)
+    # 拿到进程组ID后立即终止，不必等待宽限期后的SIGKILL
+    wait_finished(job, ssh_jobs.JOB_KILL_GRACE - 1)
+    assert job.status == 'cancelled'
+    assert job.pgid is not None
+
+
+def test_remove_while_finishing(manager, target, monkeypatch):
+    save = manager._save
+    removed = []
+
+    def save_then_remove(job):
+        # 任务线程结束阶段的最后一次保存之前，任务已被删除
+        if job.finished_at is not None and not removed:
+            removed.append(manager.remove(job.job_id))
+        save(job)
+
+    monkeypatch.setattr(manager, '_save', save_then_remove)
+    job = manager.submit(target, 'echo done')
+    wait_finished(job)
+    time.sleep(0.2)
+    assert removed == [True]
+    assert manager.get(job.job_id) is None
+    assert not os.path.exists(os.path.join(manager.spool_dir, job.job_id))
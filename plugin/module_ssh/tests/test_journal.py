@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 21:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : test_journal.py
+# @Software: PyCharm
+# @desc    : 断点续传日志的区间合并，以及上传/下载中断后按日志续传和已传部分的SHA256校验
+import os
+import pytest
+from plugin.module_ssh.core.ssh_journal import TransferJournal
+from plugin.module_ssh.core.ssh_operations import SFTP_READ_SIZE, TRANSFER_CHUNK_SIZE, SSHOperations
+from plugin.module_ssh.tests.conftest import SSH_PASSWORD, SSH_USERNAME
+
+
+class Interrupted(Exception):
+    pass
+
+
+def interrupt_at(limit: int):
+    """进度达到limit字节时抛出异常，模拟传输中断"""
+
+    def callback(position: int, total: int) -> None:
+        if position >= limit:
+            raise Interrupted(position)
+
+    return callback
+
+
+def record_positions(positions: list):
+    return lambda position, total: positions.append(position)
+
+
+def flip_first_byte(path) -> None:
+    data = bytearray(path.read_bytes())
+    data[0] ^= 0xff
+    path.write_bytes(bytes(data))
+
+
+@pytest.fixture
+def ops(ssh_server):
+    return SSHOperations.from_credentials(ssh_server.host, SSH_USERNAME, SSH_PASSWORD, ssh_server.port)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return TransferJournal(str(tmp_path / 'journal'))
+
+
+def test_add_range_merges_overlapping_and_adjacent():
+    ranges = TransferJournal.add_range([], 30, 40)
+    ranges = TransferJournal.add_range(ranges, 10, 20)
+    assert ranges == [[10, 20], [30, 40]]
+    assert TransferJournal.add_range(ranges, 15, 35) == [[10, 40]]
+    # 首尾相接的区间同样合并
+    assert TransferJournal.add_range(ranges, 20, 30) == [[10, 40]]
+    assert TransferJournal.add_range(ranges, 0, 10) == [[0, 20], [30, 40]]
+    assert TransferJournal.add_range([[0, 100]], 10, 20) == [[0, 100]]
+    # 不修改传入的列表
+    assert ranges == [[10, 20], [30, 40]]
+
+
+def test_committed():
+    assert TransferJournal.committed([]) == 0
+    assert TransferJournal.committed([[10, 20]]) == 0
+    assert TransferJournal.committed([[0, 20], [30, 40]]) == 20
+
+
+@pytest.mark.parametrize('corrupt', [False, True])
+def test_upload_resumes_from_journal(ops, journal, tmp_path, corrupt):
+    chunk = TRANSFER_CHUNK_SIZE
+    local_path = tmp_path / 'source.bin'
+    content = os.urandom(5 * chunk + 123)
+    local_path.write_bytes(content)
+    remote_path = tmp_path / 'remote' / 'target.bin'
+
+    assert not ops.upload_file_resumable(
+        str(local_path), str(remote_path), checksum=True, retries=0,
+        callback=interrupt_at(3 * chunk), journal=journal, checkpoint_size=chunk
+    )
+    key = journal.make_key('upload', ops.conn_key, str(local_path), str(remote_path))
+    # 中断所在的检查点尚未确认，不计入日志
+    assert journal.load(key)['ranges'] == [[0, 2 * chunk]]
+    if corrupt:
+        flip_first_byte(remote_path)
+
+    positions = []
+    assert ops.upload_file_resumable(
+        str(local_path), str(remote_path), checksum=True, retries=0,
+        callback=record_positions(positions), journal=journal, checkpoint_size=chunk
+    )
+    # 已传部分校验一致时从断点继续，不一致时从头上传
+    assert positions[0] == (chunk if corrupt else 3 * chunk)
+    assert remote_path.read_bytes() == content
+    assert journal.load(key) is None
+
+
+@pytest.mark.parametrize('corrupt', [False, True])
+def test_download_resumes_from_journal(ops, journal, tmp_path, corrupt):
+    checkpoint = 2 * SFTP_READ_SIZE
+    remote_path = tmp_path / 'source.bin'
+    content = os.urandom(10 * checkpoint + 123)
+    remote_path.write_bytes(content)
+    local_path = tmp_path / 'local' / 'target.bin'
+    part_path = tmp_path / 'local' / 'target.bin.part'
+
+    assert not ops.download_file_resumable(
+        str(remote_path), str(local_path), checksum=True, retries=0,
+        callback=interrupt_at(5 * checkpoint), journal=journal, checkpoint_size=checkpoint
+    )
+    key = journal.make_key('download', ops.conn_key, str(local_path), str(remote_path))
+    committed = TransferJournal.committed(journal.load(key)['ranges'])
+    assert 0 < committed < len(content)
+    assert part_path.read_bytes()[:committed] == content[:committed]
+    assert not local_path.exists()
+    if corrupt:
+        flip_first_byte(part_path)
+
+    positions = []
+    assert ops.download_file_resumable(
+        str(remote_path), str(local_path), checksum=True, retries=0,
+        callback=record_positions(positions), journal=journal, checkpoint_size=checkpoint
+    )
+    start = 0 if corrupt else committed
+    assert start < positions[0] <= start + SFTP_READ_SIZE
+    assert local_path.read_bytes() == content
+    assert not part_path.exists()
+    assert journal.load(key) is None
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 20:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : test_pool.py
+# @Software: PyCharm
+# @desc    : SSH连接池：LRU淘汰、借出保护、同一连接键共享握手（含握手失败）和空闲回收，使用假连接对象
+import threading
+import time
+import pytest
+from plugin.module_ssh.core.ssh_pool import SSHConnectionPool
+
+
+class FakeConnection:
+    """满足连接池接口的假连接，close时和SSHClient一样把自己从连接池移除"""
+
+    def __init__(self, pool: SSHConnectionPool, conn_key: str):
+        self.pool = pool
+        self.conn_key = conn_key
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        self.alive = True
+        self.closed = threading.Event()
+
+    def is_active(self) -> bool:
+        return self.alive
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def close(self) -> None:
+        self.alive = False
+        self.pool.discard(self.conn_key, self)
+        self.closed.set()
+
+
+def make_pool(**kwargs) -> SSHConnectionPool:
+    kwargs.setdefault('reap_interval', 3600)
+    return SSHConnectionPool(**kwargs)
+
+
+def acquire(pool: SSHConnectionPool, conn_key: str) -> FakeConnection:
+    return pool.acquire(conn_key, lambda: FakeConnection(pool, conn_key))
+
+
+def test_lru_eviction():
+    pool = make_pool(max_connections=2, lease_timeout=0)
+    a = acquire(pool, 'a')
+    b = acquire(pool, 'b')
+    # 复用a后b成为最久未使用的连接
+    assert acquire(pool, 'a') is a
+    c = acquire(pool, 'c')
+    assert b.closed.wait(1)
+    assert not a.closed.is_set()
+    assert pool.get('a') is a and pool.get('c') is c and pool.get('b') is None
+    assert pool.stats()['evicted_lru'] == 1
+
+
+def test_leased_and_busy_connections_are_not_evicted():
+    pool = make_pool(max_connections=1, lease_timeout=60, acquire_timeout=0.2)
+    a = acquire(pool, 'a')
+    # 刚借出的连接在借出到期前不会被淘汰
+    with pytest.raises(RuntimeError):
+        acquire(pool, 'b')
+    assert not a.closed.is_set()
+
+    pool = make_pool(max_connections=1, lease_timeout=0, acquire_timeout=0.2)
+    a = acquire(pool, 'a')
+    a.in_use = 1
+    # 有正在使用的通道时同样不会被淘汰
+    with pytest.raises(RuntimeError):
+        acquire(pool, 'b')
+    a.in_use = 0
+    b = acquire(pool, 'b')
+    assert a.closed.wait(1)
+    assert pool.get('b') is b
+
+
+def test_concurrent_acquire_shares_failed_handshake():
+    pool = make_pool()
+    release = threading.Event()
+    calls = []
+
+    def factory():
+        calls.append(threading.current_thread())
+        release.wait(5)
+        raise ConnectionError('handshake failed')
+
+    errors = []
+
+    def worker():
+        try:
+            pool.acquire('a', factory)
+        except ConnectionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    assert pool.stats()['pending'] == 1
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    # 只握手一次，所有等待者收到同一个异常，失败的键不会残留
+    assert len(calls) == 1
+    assert len(errors) == 5 and all(e is errors[0] for e in errors)
+    assert pool.stats()['pending'] == 0
+    assert acquire(pool, 'a') is pool.get('a')
+    assert pool.stats()['created'] == 1
+
+
+def test_reap_idle_and_dead_connections():
+    pool = make_pool(idle_timeout=10, lease_timeout=0)
+    idle, dead, busy, fresh = (acquire(pool, key) for key in ('idle', 'dead', 'busy', 'fresh'))
+    idle.last_used -= 100
+    dead.alive = False
+    busy.last_used -= 100
+    busy.in_use = 1
+    assert pool.reap() == 2
+    assert idle.closed.is_set() and dead.closed.is_set()
+    assert pool.get('busy') is busy and pool.get('fresh') is fresh
+    stats = pool.stats()
+    assert stats['evicted_idle'] == 1 and stats['evicted_dead'] == 1
+
+    leased = make_pool(idle_timeout=10, lease_timeout=60)
+    conn = acquire(leased, 'a')
+    conn.last_used -= 100
+    # 借出未到期的连接即使空闲超时也不回收
+    assert leased.reap() == 0
+    assert not conn.closed.is_set()
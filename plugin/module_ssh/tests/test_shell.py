@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/17 22:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : test_shell.py
+# @Software: PyCharm
+# @desc    : shell会话的输出环形缓冲区回放偏移，以及从shell输出中截取命令输出（标记跨读取、输出截断）
+from plugin.module_ssh.core.ssh_shell import OutputRingBuffer, _CommandCapture
+
+TOKEN = 'a1b2c3'
+START = f"\x1fS{TOKEN}\x1f".encode()
+
+
+def end_marker(exit_code: int) -> bytes:
+    return f"\x1fE{TOKEN}:{exit_code}\x1f".encode()
+
+
+def feed_bytewise(capture: _CommandCapture, data: bytes) -> None:
+    for i in range(len(data)):
+        capture.feed(data[i:i + 1])
+
+
+def test_capture_markers_split_across_reads():
+    capture = _CommandCapture(TOKEN, 1024)
+    # 回显的命令行和开始标记之前的输出被丢弃
+    feed_bytewise(capture, b'$ run something\r\n' + START + b'line 1\nline 2\n' + end_marker(42) + b'$ ')
+    assert capture.done.is_set()
+    assert capture.exit_code == 42
+    assert bytes(capture.output) == b'line 1\nline 2\n'
+    assert capture.truncated == 0
+
+
+def test_capture_end_marker_split_in_two_reads():
+    capture = _CommandCapture(TOKEN, 1024)
+    data = START + b'x' * 100 + end_marker(0)
+    middle = len(data) - 5
+    capture.feed(data[:middle])
+    assert not capture.done.is_set()
+    capture.feed(data[middle:])
+    assert capture.exit_code == 0
+    assert bytes(capture.output) == b'x' * 100
+
+
+def test_capture_truncates_at_max_bytes():
+    capture = _CommandCapture(TOKEN, 5)
+    capture.feed(START + b'hello ')
+    capture.feed(b'world' + end_marker(1))
+    assert bytes(capture.output) == b'hello'
+    assert capture.truncated == 6
+    assert capture.exit_code == 1
+    # 结束后的输出不再处理
+    capture.feed(START + b'more' + end_marker(2))
+    assert capture.exit_code == 1
+    assert bytes(capture.output) == b'hello'
+
+
+def test_ring_buffer_replay_offsets():
+    buffer = OutputRingBuffer(capacity=10)
+    buffer.append(b'0123456')
+    assert buffer.read_from() == (0, b'0123456')
+    assert buffer.read_from(4) == (4, b'456')
+
+    content = b'0123456'
+    for i in range(30):
+        piece = bytes([ord('a') + i % 26]) * 3
+        buffer.append(piece)
+        content += piece
+    # 只保留最近capacity字节，早于起点的偏移从起点回放
+    assert buffer.end == len(content)
+    assert buffer.start == len(content) - 10
+    assert buffer.read_from() == (buffer.start, content[-10:])
+    assert buffer.read_from(0) == (buffer.start, content[-10:])
+    assert buffer.read_from(len(content) - 4) == (len(content) - 4, content[-4:])
+    # 晚于末尾的偏移不返回内容
+    assert buffer.read_from(len(content) + 5) == (len(content), b'')
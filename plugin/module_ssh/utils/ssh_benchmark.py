@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/16 14:00
+# @Author  : 冉勇
+# @Site    :
+# @File    : ssh_benchmark.py
+# @Software: PyCharm
+# @desc    : SSH模块基准测试，使用模拟握手延迟，不需要真实服务器
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from urllib.parse import urlsplit
+from plugin.module_ssh.core.ssh_client import SSHClient
+from plugin.module_ssh.core.ssh_operations import SSHOperations
+from plugin.module_ssh.core.ssh_pool import SSHConnectionPool
+
+
+class _FakeSSHClient(SSHClient):
+    """用sleep模拟TCP+SSH握手的客户端，不建立真实连接"""
+
+    handshake_latency = 0.2
+    # 需要模拟不可达的主机，握手耗时为slow_latency后失败
+    slow_hosts = set()
+    slow_latency = 2.0
+
+    # 使用独立的连接池，避免污染真实连接
+    _pool = SSHConnectionPool(max_connections=1024)
+
+    def _connect(self) -> None:
+        if self.host in self.slow_hosts:
+            time.sleep(self.slow_latency)
+            raise TimeoutError(f"连接超时: {self.host}")
+        time.sleep(self.handshake_latency)
+        self.mark_used()
+
+    def is_active(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self._pool.discard(f"{self.username}@{self.host}:{self.port}", self)
+
+
+def _connect_all(hosts: List[str], callers_per_host: int, serialize: bool) -> float:
+    """
+    并发获取所有主机的连接，返回耗时
+    :param hosts: 主机列表
+    :param callers_per_host: 每台主机的并发调用数
+    :param serialize: 是否模拟旧版全局锁（握手在全局锁内进行）
+    :return: 耗时（秒）
+    """
+    _FakeSSHClient._pool.close_all()
+    global_lock = threading.Lock()
+
+    def connect(host):
+        try:
+            if serialize:
+                with global_lock:
+                    return _FakeSSHClient.get_connection(host, 'root', 'pwd')
+            return _FakeSSHClient.get_connection(host, 'root', 'pwd')
+        except Exception:
+            return None
+
+    tasks = [host for host in hosts for _ in range(callers_per_host)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        list(pool.map(connect, tasks))
+    return time.perf_counter() - start
+
+
+def bench_connection_pool(host_counts=(1, 4, 16, 64), callers_per_host: int = 4) -> List[Dict]:
+    """
+    连接池握手吞吐基准：对比旧版全局锁与按连接键加锁
+    :param host_counts: 主机数量列表
+    :param callers_per_host: 每台主机的并发调用数
+    :return: 结果列表
+    """
+    results = []
+    for count in host_counts:
+        hosts = [f"10.0.0.{i}" for i in range(count)]
+        legacy = _connect_all(hosts, callers_per_host, serialize=True)
+        keyed = _connect_all(hosts, callers_per_host, serialize=False)
+        results.append({
+            'hosts': count,
+            'legacy_seconds': round(legacy, 3),
+            'legacy_conn_per_sec': round(count / legacy, 1),
+            'keyed_seconds': round(keyed, 3),
+            'keyed_conn_per_sec': round(count / keyed, 1),
+        })
+
+    # 一台不可达主机对其他主机的影响
+    _FakeSSHClient.slow_hosts = {'10.0.0.0'}
+    hosts = [f"10.0.0.{i}" for i in range(16)]
+    results.append({
+        'hosts': '16 (含1台不可达)',
+        'legacy_seconds': round(_connect_all(hosts, 1, serialize=True), 3),
+        'keyed_seconds': round(_connect_all(hosts, 1, serialize=False), 3),
+    })
+    _FakeSSHClient.slow_hosts = set()
+    return results
+
+
+def bench_transfer(host: str, username: str, password: str, port: int = 22,
+                   size_mb: int = 64, parallelism_levels=(2, 4)) -> List[Dict]:
+    """
+    大文件传输基准（需要真实服务器）：对比单通道与分段并行上传/下载的吞吐
+    :param host: 主机地址
+    :param username: 用户名
+    :param password: 密码
+    :param port: 端口
+    :param size_mb: 测试文件大小（MB）
+    :param parallelism_levels: 并行度列表
+    :return: 结果列表
+    """
+    ssh_ops = SSHOperations.from_credentials(host, username, password, port)
+    remote_path = f"/tmp/ssh_benchmark_{os.getpid()}.bin"
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        local_path = os.path.join(workdir, 'source.bin')
+        with open(local_path, 'wb') as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        def measure(mode: str, direction: str, func, *args, **kwargs) -> None:
+            start = time.perf_counter()
+            ok = func(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+            results.append({
+                'mode': mode,
+                'direction': direction,
+                'ok': ok,
+                'seconds': round(elapsed, 3),
+                'mb_per_sec': round(size_mb / elapsed, 1),
+            })
+
+        download_path = os.path.join(workdir, 'download.bin')
+        measure('single', 'upload', ssh_ops.upload_file, local_path, remote_path)
+        measure('single', 'download', ssh_ops.download_file, remote_path, download_path)
+        for parallelism in parallelism_levels:
+            measure(f'parallel x{parallelism}', 'upload', ssh_ops.upload_file_parallel,
+                    local_path, remote_path, parallelism=parallelism)
+            measure(f'parallel x{parallelism}', 'download', ssh_ops.download_file_parallel,
+                    remote_path, download_path, parallelism=parallelism)
+        ssh_ops.remove_file(remote_path)
+    return results
+
+
+class _HTTPClient:
+    """基于http.client的长连接客户端，请求经过完整的HTTP路由（认证、参数校验、响应序列化）"""
+
+    def __init__(self, base_url: str, token: str):
+        """
+        初始化客户端
+        :param base_url: 服务地址，如 http://127.0.0.1:9099
+        :param token: 登录后获取的访问令牌
+        """
+        url = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self._conn = connection_class(url.hostname, url.port)
+        self._prefix = url.path.rstrip('/')
+        self._headers = {'Authorization': f"Bearer {token}", 'Content-Type': 'application/json'}
+
+    def _request(self, method: str, path: str, payload: Dict = None) -> Dict:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        self._conn.request(method, self._prefix + path, body, self._headers)
+        response = self._conn.getresponse()
+        return json.loads(response.read())
+
+    def post(self, path: str, payload: Dict) -> Dict:
+        return self._request('POST', path, payload)
+
+    def get(self, path: str) -> Dict:
+        return self._request('GET', path)
+
+
+def bench_endpoints(
+        client, ssh_id: int, host: str, username: str, password: str, port: int = 22, rounds: int = 20
+) -> List[Dict]:
+    """
+    接口延迟基准（需要运行中的服务和真实服务器）：逐个调用HTTP接口，统计端到端的平均和P95耗时，
+    其中SSH操作本身的耗时取自/ssh/metrics（ssh_dispatcher的统计）；legacy_ms为旧版每次请求新建连接
+    （utils.ssh_operation的做法）执行同一操作的耗时，不含HTTP开销
+    :param client: 提供post(path, payload)和get(path)并返回响应JSON的客户端，如_HTTPClient
+    :param ssh_id: 服务中登记的SSH服务器ID，需与host/username/password/port指向同一台服务器
+    :param host: 主机地址
+    :param username: 用户名
+    :param password: 密码
+    :param port: 端口
+    :param rounds: 每个接口的调用次数
+    :return: 结果列表
+    """
+    remote_dir = f"/tmp/ssh_benchmark_{os.getpid()}"
+    with tempfile.TemporaryDirectory() as workdir:
+        download_path = os.path.join(workdir, 'download.bin')
+        payload = 'x' * 64 * 1024
+        # (接口, 请求体, SSHOperations方法名, 方法参数)
+        operations = [
+            ('/ssh/command/execute', {'command': 'true'}, 'execute_command', ('true',)),
+            ('/ssh/text/write', {'remote_path': f"{remote_dir}/file.txt", 'content': payload},
+             'write_text', (f"{remote_dir}/file.txt", payload)),
+            ('/ssh/text/read', {'remote_path': f"{remote_dir}/file.txt"}, 'read_text_range', (f"{remote_dir}/file.txt",)),
+            ('/ssh/dir/list', {'remote_path': remote_dir}, 'list_dir', (remote_dir,)),
+            ('/ssh/file/info', {'remote_path': f"{remote_dir}/file.txt"}, 'get_file_info', (f"{remote_dir}/file.txt",)),
+            ('/ssh/file/download', {'remote_path': f"{remote_dir}/file.txt", 'local_path': download_path},
+             'download_file', (f"{remote_dir}/file.txt", download_path)),
+            ('/ssh/dir/make', {'remote_path': f"{remote_dir}/sub"}, 'make_dir', (f"{remote_dir}/sub",)),
+            ('/ssh/dir/remove', {'remote_path': f"{remote_dir}/sub"}, 'remove_dir', (f"{remote_dir}/sub",)),
+        ]
+        http_ms: Dict[str, List[float]] = {route: [] for route, _, _, _ in operations}
+        legacy_ms: Dict[str, float] = {route: 0.0 for route, _, _, _ in operations}
+        errors: Dict[str, int] = {route: 0 for route, _, _, _ in operations}
+
+        def legacy_call(name: str, args: tuple) -> None:
+            # 旧版做法：每个请求新建连接，完成后断开
+            ssh_client = SSHClient(host, username, password, port)
+            try:
+                getattr(SSHOperations(ssh_client), name)(*args)
+            finally:
+                ssh_client._disconnect()
+
+        SSHOperations.from_credentials(host, username, password, port).make_dir(remote_dir)
+        for _ in range(rounds):
+            for route, _, name, args in operations:
+                start = time.perf_counter()
+                legacy_call(name, args)
+                legacy_ms[route] += (time.perf_counter() - start) * 1000
+
+        before = client.get('/ssh/metrics')['data']['operations']
+        for _ in range(rounds):
+            for route, body, _, _ in operations:
+                start = time.perf_counter()
+                response = client.post(route, {'ssh_id': ssh_id, **body})
+                http_ms[route].append((time.perf_counter() - start) * 1000)
+                errors[route] += 0 if response.get('code') == 200 else 1
+        after = client.get('/ssh/metrics')['data']['operations']
+        SSHOperations.from_credentials(host, username, password, port).remove_tree(remote_dir)
+
+    def ssh_ms(name: str) -> float:
+        # 由调用前后的累计耗时计算本次基准的平均值
+        old, new = before.get(name, {'calls': 0, 'avg_ms': 0}), after.get(name, {'calls': 0, 'avg_ms': 0})
+        calls = new['calls'] - old['calls']
+        return round((new['avg_ms'] * new['calls'] - old['avg_ms'] * old['calls']) / calls, 1) if calls else ''
+
+    results = []
+    for route, _, name, _ in operations:
+        samples = sorted(http_ms[route])
+        average = sum(samples) / len(samples)
+        results.append({
+            'route': route,
+            'http_ms': round(average, 1),
+            'http_p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+            'ssh_ms': ssh_ms(name),
+            'legacy_ms': round(legacy_ms[route] / rounds, 1),
+            'speedup': round(legacy_ms[route] / rounds / average, 1),
+            'errors': errors[route],
+        })
+    return results
+
+
+def _print_table(title: str, rows: List[Dict]) -> None:
+    print(f"\n== {title} ==")
+    if not rows:
+        return
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    print(" | ".join(columns))
+    for row in rows:
+        print(" | ".join(str(row.get(column, '')) for column in columns))
+
+
+if __name__ == "__main__":
+    # 用法: python -m plugin.module_ssh.utils.ssh_benchmark [transfer host user password [port] [size_mb]]
+    #       python -m plugin.module_ssh.utils.ssh_benchmark endpoints base_url token ssh_id host user password [port] [rounds]
+    if len(sys.argv) >= 8 and sys.argv[1] == 'endpoints':
+        args = sys.argv[2:]
+        _print_table("接口延迟", bench_endpoints(
+            _HTTPClient(args[0], args[1]), int(args[2]), args[3], args[4], args[5],
+            int(args[6]) if len(args) > 6 else 22,
+            int(args[7]) if len(args) > 7 else 20,
+        ))
+    elif len(sys.argv) >= 5 and sys.argv[1] == 'transfer':
+        args = sys.argv[2:]
+        _print_table("大文件传输吞吐", bench_transfer(
+            args[0], args[1], args[2],
+            int(args[3]) if len(args) > 3 else 22,
+            int(args[4]) if len(args) > 4 else 64,
+        ))
+    else:
+        _print_table("连接池握手吞吐", bench_connection_pool())